@@ -0,0 +1,99 @@
+"""
+Block hashing benchmarks, run from the repository root:
+
+    python3 -m benchmarks.bench_blockutil
+"""
+import os
+import time
+from bob.blockchain import blockutil_U as B
+from bob.store import Store
+
+SIZES = [10 ** 2, 10 ** 4, 10 ** 6, 10 ** 7]
+ALGORITHMS = [B.LEGACY_HASH, "blake2b", "sha256"]
+CREATE_PAYLOADS = {
+    "dict": {"value": 1, "text": "x" * 100},
+    "ints": list(range(1000)),
+    "lists": {"k%d" % i: list(range(10)) for i in range(1000)}
+}
+
+
+def payloads(size):
+    """ Returns payloads of about [size] bytes by kind """
+    return {
+        "bytes": b"x" * size,
+        "str": "x" * size,
+        "dict": {"k%d" % i: i for i in range(max(1, size // 16))}
+    }
+
+
+def bench_hash(payload, algorithm, size):
+    """ Returns the hash_data() throughput in MB/s """
+    repeat = max(1, 10 ** 7 // size)
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        B.hash_data(payload, algorithm)
+    return size * repeat / (time.perf_counter() - started_at) / 1e6
+
+
+def bench_create(payload, algorithm, repeat=2000):
+    """ Returns the per-block cost (in µs) of create() """
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        B.create("bench", payload, algorithm=algorithm)
+    return (time.perf_counter() - started_at) * 1e6 / repeat
+
+
+def bench_journal(algorithm, count=20000):
+    """ Returns the per-add cost (in µs) of a journaled store whose
+    blocks are hashed with algorithm """
+    default = B.HASH_ALGORITHM
+    B.HASH_ALGORITHM = algorithm
+    try:
+        store = Store()
+        started_at = time.perf_counter()
+        for i in range(count):
+            store.add("bench", {"value": i, "text": "x" * 100})
+        return (time.perf_counter() - started_at) * 1e6 / count
+    finally:
+        B.HASH_ALGORITHM = default
+
+
+def bench_validate(workers, count=20000):
+    """ Returns validate_many() blocks per second on serialized blocks """
+    raws = [B.dumps(B.create("bench", {"value": i, "text": "x" * 100}))
+            for i in range(count)]
+    B.validation_cache.clear()
+    started_at = time.perf_counter()
+    B.validate_many(raws, workers=workers)
+    return count / (time.perf_counter() - started_at)
+
+
+def main():
+    print("%10s %10s" % ("kind", "bytes") +
+          "".join(" %12s" % algorithm for algorithm in ALGORITHMS) +
+          "   (MB/s)")
+    for size in SIZES:
+        for (kind, payload) in payloads(size).items():
+            print("%10s %10d" % (kind, size) +
+                  "".join(" %12.1f" % bench_hash(payload, algorithm, size)
+                          for algorithm in ALGORITHMS))
+
+    print("%10s" % "create" +
+          "".join(" %12s" % algorithm for algorithm in ALGORITHMS) +
+          "   (µs / block)")
+    for (kind, payload) in CREATE_PAYLOADS.items():
+        repeat = max(1, 20000 // len(payload))
+        print("%10s" % kind +
+              "".join(" %12.1f" % bench_create(payload, algorithm, repeat)
+                      for algorithm in ALGORITHMS))
+    print("%10s" % "journal" +
+          "".join(" %12.1f" % bench_journal(algorithm)
+                  for algorithm in ALGORITHMS) + "   (µs / add)")
+
+    print("%10s %15s" % ("workers", "blocks / s"))
+    for workers in sorted(set([1, 2, os.cpu_count() or 1])):
+        print("%10d %15d" % (workers, bench_validate(workers)))
+
+
+if __name__ == "__main__":
+    main()
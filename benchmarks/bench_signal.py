@@ -0,0 +1,49 @@
+"""
+Signal parse and encode benchmarks, run from the repository root:
+
+    python3 -m benchmarks.bench_signal
+"""
+import time
+from bob.net.Signals import Signal, WIRE_V1, WIRE_V2
+
+SIZES = [10 ** 2, 10 ** 4, 10 ** 6]
+WIRES = [WIRE_V1, WIRE_V2]
+
+
+def timed(function, size):
+    """ Returns the microseconds per call of function() """
+    repeat = max(10, 10 ** 7 // size)
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started_at) / repeat * 1e6
+
+
+def bench_parse(raw):
+    return timed(lambda: Signal.parse(raw), len(raw))
+
+
+def bench_bytes(signal, wire, size):
+    """ Encoding of a new signal, then of an already encoded one """
+    def encode():
+        Signal(id=signal.id, channel=signal.channel,
+               data=signal.data).bytes(wire)
+    return (timed(encode, size), timed(lambda: signal.bytes(wire), size))
+
+
+def main():
+    print("%6s %10s %12s %12s %12s %12s   (us)" % (
+        "wire", "bytes", "parse", "bytes()", "cached", "re-emit"))
+    for size in SIZES:
+        for wire in WIRES:
+            signal = Signal(data=b"x" * size, channel=["bench"])
+            raw = signal.bytes(wire)
+            (encode, cached) = bench_bytes(signal, wire, size)
+            parsed = Signal.parse(raw)
+            print("%6d %10d %12.2f %12.2f %12.2f %12.2f" % (
+                wire, size, bench_parse(raw), encode, cached,
+                timed(parsed.bytes, size)))
+
+
+if __name__ == "__main__":
+    main()
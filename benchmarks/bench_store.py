@@ -0,0 +1,177 @@
+"""
+Store benchmarks, run from the repository root:
+
+    python3 -m benchmarks.bench_store
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from bob.blockchain import blockutil_U as B
+from bob.store import Store, LogStore, JOURNAL_PATH
+
+SIZES = [10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+THREAD_COUNTS = [1, 2, 4, 8, 16]
+THREAD_ADDS = 20000
+
+
+class NoJournalStore(Store):
+    """ Measures the channel only, journaling has its own cost """
+    def _onUpdate(self, method, path, data):
+        pass
+
+
+def bench_add(size):
+    """ Returns the per-append cost (in µs) of filling a channel """
+    store = NoJournalStore()
+    started_at = time.perf_counter()
+    for i in range(size):
+        store.add("bench", i)
+    return (time.perf_counter() - started_at) * 1e6 / size
+
+
+def bench_journal(deferred, count=20000):
+    """ Returns the per-add cost (in µs) with synchronous or deferred
+    journaling, and the cost of flushing the deferred journal """
+    store = Store(deferred_journal=deferred)
+    started_at = time.perf_counter()
+    for i in range(count):
+        store.add("bench", {"value": i})
+    added_at = time.perf_counter()
+    store.flushJournal()
+    flushed_at = time.perf_counter()
+    return ((added_at - started_at) * 1e6 / count,
+            (flushed_at - added_at) * 1e6 / count)
+
+
+def bench_journal_retention(max_entries, count=20000):
+    """ Returns the per-add cost (in µs) once the journal is at its
+    retention cap, so every add also evicts the oldest indexed block """
+    store = Store()
+    store.setRetention(JOURNAL_PATH, max_entries=max_entries)
+    for i in range(max_entries):
+        store.add("bench", i)
+    started_at = time.perf_counter()
+    for i in range(count):
+        store.add("bench", i)
+    return (time.perf_counter() - started_at) * 1e6 / count
+
+
+def bench_typed(typecode, count=10 ** 6):
+    """ Returns the memory (in bytes per value) of a channel of [count]
+    floats, typed with [typecode] or untyped (None) """
+    store = NoJournalStore()
+    if typecode is not None:
+        store.setTyped("bench", typecode)
+    values = [i * 0.5 for i in range(count)]
+    tracemalloc.start()
+    store.addAll("bench", values)
+    (size, _) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # untyped channels keep the boxed floats, created beforehand
+    if typecode is None:
+        size += count * 24
+    return size / count
+
+
+def bench_replay(workers, count=100000):
+    """ Returns blocks per second rebuilding a Store from [count] journal
+    blocks with processBlock() (workers None) or replay() """
+    source = Store()
+    for i in range(count):
+        source.add("bench.p%d" % (i // 1000), {"value": i})
+    raws = [B.serialize(block) for block in source.get(JOURNAL_PATH)]
+    store = Store()
+    if workers is not None:
+        return store.replay(raws, workers=workers)["blocks_per_second"]
+    started_at = time.perf_counter()
+    for raw in raws:
+        store.processBlock(raw)
+    return count / (time.perf_counter() - started_at)
+
+
+def bench_logstore(count=200000):
+    """ Returns the LogStore (open, first get, size in MB) after [count]
+    add() spread over 100 paths """
+    directory = tempfile.mkdtemp()
+    try:
+        store = LogStore(directory, segment_size=4 * 1024 * 1024)
+        for i in range(count):
+            store.add("bench%d" % (i % 100), "x" * 100)
+        store.close()
+        size = sum(os.path.getsize(os.path.join(directory, name))
+                for name in os.listdir(directory))
+
+        started_at = time.perf_counter()
+        store = LogStore(directory, segment_size=4 * 1024 * 1024)
+        opened_at = time.perf_counter()
+        store.get("bench0")
+        read_at = time.perf_counter()
+        store.close()
+        return (opened_at - started_at, read_at - opened_at,
+                size / 1024.0 / 1024)
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_threads(thread_count, shared):
+    """ Returns add() per second with [thread_count] writer threads
+
+    shared: all threads write to the same top-level path (same lock)
+    """
+    store = Store()
+    adds = THREAD_ADDS // thread_count
+
+    def writer(thread_id):
+        path = "bench" if shared else "bench%d" % thread_id
+        for i in range(adds):
+            store.add(path, i)
+
+    threads = [threading.Thread(target=writer, args=(i,))
+               for i in range(thread_count)]
+    started_at = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return adds * thread_count / (time.perf_counter() - started_at)
+
+
+def main():
+    print("%10s %15s" % ("entries", "µs / add()"))
+    for size in SIZES:
+        print("%10d %15.3f" % (size, bench_add(size)))
+
+    print("%10s %15s %15s" % ("journal", "µs / add()", "µs / flush"))
+    for deferred in [False, True]:
+        print("%10s %15.3f %15.3f" % (("deferred" if deferred else "sync",) +
+                                      bench_journal(deferred)))
+
+    print("%10s %15s" % ("journal cap", "µs / add()"))
+    for max_entries in [10 ** 4, 10 ** 5, 5 * 10 ** 5]:
+        print("%10d %15.3f" % (max_entries,
+                               bench_journal_retention(max_entries)))
+
+    print("%10s %15s" % ("typecode", "bytes / value"))
+    for typecode in [None, "d", "f"]:
+        print("%10s %15.1f" % (typecode, bench_typed(typecode)))
+
+    print("%10s %15s" % ("replay", "blocks / s"))
+    for workers in [None, 1, os.cpu_count()]:
+        print("%10s %15d" % (workers or "process", bench_replay(workers)))
+
+    print("%10s %15s %15s" % ("log MB", "open (s)", "first get (s)"))
+    (opened, read, size) = bench_logstore()
+    print("%10.1f %15.4f %15.4f" % (size, opened, read))
+
+    print("%10s %15s %15s" % ("threads", "shared add/s", "split add/s"))
+    for thread_count in THREAD_COUNTS:
+        print("%10d %15d %15d" % (thread_count,
+                                  bench_threads(thread_count, True),
+                                  bench_threads(thread_count, False)))
+
+
+if __name__ == "__main__":
+    main()
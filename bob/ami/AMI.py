@@ -1,5 +1,6 @@
-from time import sleep
 from bob.store.Store import Store
+from bob.store.Cursor import Cursor
+from bob.store.SharedStore import StoreServer
 import logging
 from time import time
 import os
@@ -56,8 +57,13 @@ class AMI(object):
         in onStart() or __init__() if the self.interval is not defined, then
         this method will only be executed once. Otherwise, this method will be
         excecuted every [self.interval] milliseconds.
+        The wait in between executions ends early when the state of this
+        AMI changes or when a cursor of [self.wakeup_cursors] has new values.
+        In a process AMI, the cursors added before start() are replaced by
+        cursors of the shared store at the same position.
 
-    Store: self.store is a substore
+    Store: self.store is a substore, a process AMI (is_thread=False) shares
+           it through a StoreServer of the parent process
     """
 
     def __init__(self, tag=None, store=None, interval=None,
@@ -74,6 +80,7 @@ class AMI(object):
         self.hub = Hub(store=self.store) if enable_hub else None
         self.is_thread = is_thread
         self.is_daemon = is_daemon
+        self.wakeup_cursors = []
         self.setState(INIT)
         self._thread = None
 
@@ -117,12 +124,22 @@ class AMI(object):
         else:
             """ Starts this AMI in a new process and
             returns the unique node_id """
+            server = None
+            if isinstance(self.store, Store):
+                # the AMI process uses the store of this process
+                server = StoreServer.forStore(self.store)
             pid = os.fork()
             if pid:
                 # parent process
                 return self.TAG
             else:
                 # AMI process
+                if server is not None:
+                    self.store = server.client()
+                    self.wakeup_cursors = [
+                        self.store.cursor(cursor.path, seq=cursor.seq)
+                        if isinstance(cursor, Cursor) else cursor
+                        for cursor in self.wakeup_cursors]
                 self.__start()
 
     def __start(self):
@@ -133,12 +150,15 @@ class AMI(object):
         self.onStart()
         if self.getState() == STARTING:
             self.setState(RUNNING)
+            history = self.store.cursor(self.HISTORY_PATH, from_start=False)
             try:
                 while self.getState() == RUNNING:
                     self.onInterval()
                     if self.interval:
-                        # at interval execution
-                        sleep(self.interval or 0)
+                        # at interval execution, or earlier on store changes
+                        self.store.waitFor([history] + self.wakeup_cursors,
+                                           self.interval)
+                        history.skip()
                     else:
                         # single execution
                         break
@@ -5,20 +5,23 @@ import logging
 import sys
 from bob.ami import AMI, FORCE_STOPPING, FAILED
 from bob.ami.TCPServer import TCPServer
-from bob.net.Signals import Signal
+from bob.net.Signals import Signal, SignalDecoder, WIRE_V1, WIRE_V2
 import bob.blockchain.blockutil_U as B
 from bob.store.Store import Store, JOURNAL_PATH
 
 MAX_PEER = 50
 SEPARATOR = "\n\n".encode()
 
-BUFFER_MAX_SIZE = 8096
+RECV_SIZE = 64 * 1024  # bytes read from the socket at once
 
-HUB_VERSION = "HUB/0.1".encode()
+HUB_VERSION = "HUB/0.3".encode()
 MAX_HUB_VERSION = 0.999
+BINARY_HUB_VERSION = 0.2  # peers exchanging B.CODEC_BINARY blocks
+WIRE_V2_HUB_VERSION = 0.3  # peers exchanging WIRE_V2 signals
 
 INBOUND_PATH = "_inbound"
 OUBOUND_PATH = "_outbound"
+MAX_QUEUE_SIZE = 10000  # signals kept in _inbound and _outbound
 
 # TODO:
 #   - do network exploration by adding peers from peers
@@ -32,52 +35,79 @@ OUBOUND_PATH = "_outbound"
 
 
 class HubClient(AMI):
-    def __init__(self, clientSocket=None, ip=None, store=None, **args):
+    """ Connection to a peer
+
+    The blocks are exchanged with the binary codec (see blockutil_U) once
+    both peers announced HUB/0.2 or later, older peers receive pickled
+    blocks hashed with B.LEGACY_HASH, the only hash they validate: the
+    hash (block id) they see differs from the hash of the block in this
+    store, as well as the journal "prev" chain and checkpoints they
+    could derive from it.
+
+    Signals are queued in _outbound with the binary wire format (WIRE_V2)
+    and sent with it to HUB/0.3 peers, with the 0.11 format (WIRE_V1) to
+    older peers.
+
+    allow_pickle: False rejects the peers older than HUB/0.2, since
+                  unpickling their blocks runs arbitrary code.
+    """
+
+    def __init__(self, clientSocket=None, ip=None, store=None,
+                 allow_pickle=True, **args):
         super(HubClient, self).__init__(tag="Hub %s" % ip, is_thread=True,
                                         enable_hub=False, interval=0.1,
                                         store=store, **args)
         if not store:
             raise TypeError("a shared store is mandatory for a Hub")
-        self.buffer = ""
+        self.buffer = bytearray(RECV_SIZE)  # reused by every recv()
+        self.decoder = SignalDecoder()
         self.clientSocket = clientSocket
         self.ip = ip
-        self.last_outbound = None
+        self.allow_pickle = allow_pickle
+        self.codec = B.CODEC_BINARY
+        self.wire = WIRE_V2
+        self.outbound = self.store.cursor(OUBOUND_PATH)
+        self.wakeup_cursors.append(self.outbound)
 
     def onStart(self):
         # HUB_VERSION handshake
         self.clientSocket.send(HUB_VERSION + SEPARATOR)
 
         received = self.clientSocket.recv(64)
-        if b"HUB/" not in received:
+        # signals may be received with the handshake
+        (handshake, _, rest) = received.partition(SEPARATOR)
+        if b"HUB/" not in handshake:
             self.send(b"Invalid handshake" + SEPARATOR)
             self.fail("Invalid handshake: %s", received[:100])
             return
 
-        if float(received.split(b"HUB/")[1][:-2]) > MAX_HUB_VERSION:
+        version = float(handshake.split(b"HUB/")[1])
+        if version > MAX_HUB_VERSION or (version < BINARY_HUB_VERSION and
+                                         not self.allow_pickle):
             self.send(b"Unsupported Hub version")
             self.fail("Unsupported hub version [%s]", received)
             return
+        if version < BINARY_HUB_VERSION:
+            self.codec = B.CODEC_PICKLE
+        if version < WIRE_V2_HUB_VERSION:
+            self.wire = WIRE_V1
 
-        self.logger.debug("Handshake success [%s]", received[:-2])
+        self.__receive(rest)
+        self.logger.debug("Handshake success [%s]", handshake)
 
     def onInterval(self):
         # wait for msg
         self.recv()
 
-        outbound = []
-        if self.last_outbound is not None:
-            outbound = self.store.getSince(OUBOUND_PATH, self.last_outbound)
-        else:
-            outbound = self.store.get(OUBOUND_PATH) or []
-
-        for signal in outbound:
+        for signal in self.outbound.readNew():
+            if isinstance(signal, bytes):  # emitted by the Hub
+                parsed = Signal.parse(signal)
+                signal = parsed if isinstance(parsed, Signal) else signal
             if isinstance(signal, Signal):
-                self.send(signal.bytes())
-            elif isinstance(signal, str):
+                self.send(self.__encode(signal).bytes(self.wire))
+            elif isinstance(signal, (str, bytes)):
                 self.send(signal)
 
-            self.last_outbound = signal
-
     def onStop(self):
         self.clientSocket.shutdown(socket.SHUT_RDWR)
         self.clientSocket.close()
@@ -89,38 +119,39 @@ class HubClient(AMI):
         self.clientSocket.send(data_bytes + SEPARATOR)
 
     def recv(self):
+        """ Read the socket once, the complete signals received (in one
+        or several reads) are added to the inbound queue """
         try:
-            '''
-            May receive more than one message at once, thus if the last
-            message is invalid, we store it for the next recv iteration.
-            If a message is invalid and not the last one received, then it
-            gets discared.
-            '''
-            self.buffer = self.clientSocket.recv(8192)
-            signal = Signal.parse(self.buffer)
-            if not isinstance(signal, Signal):
-                self.logger.warning("Invalid message for reason [%d], [%s]",
-                                    int(signal), self.buffer[:100])
+            count = self.clientSocket.recv_into(self.buffer)
+        except socket.timeout:
+            return False
+        self.__receive(memoryview(self.buffer)[:count])
+        return count > 0
+
+    def __receive(self, data):
+        dropped = self.decoder.dropped
+        for signal in self.decoder.feed(data):
+            if self.codec == B.CODEC_BINARY and \
+                    not B.is_binary(signal.data):
+                self.logger.warning("Refused pickled block of signal [%s]",
+                                    signal.id)
             else:
                 self.logger.debug("Received signal with id [%s]", signal.id)
                 self.store.add(INBOUND_PATH, signal.bytes())
-
-            # data_array = filter(lambda x: x, self.buffer.split(SEPARATOR))
-            # for pos, data in enumerate(data_array):
-            #     signal = Signal.parse(data)
-
-            #     if signal:
-            #         self.store.add(INBOUND_PATH, signal)
-            #     elif pos == (len(data_array) - 1):
-            #         self.buffer = data
-            #         if len(self.buffer) > BUFFER_MAX_SIZE:
-            #             self.logger.warn("Max buffer size exceeded")
-            #             self.buffer = ""
-            #     else:
-            #         self.logger.warning("Invalid message [%s]", data[:40])
-
-        except socket.timeout:
-            return False
+        if self.decoder.dropped > dropped:
+            self.logger.debug("Skipped %d bytes out of signals",
+                              self.decoder.dropped - dropped)
+
+    def __encode(self, signal):
+        """ Return signal with its block pickled and SHA-1 hashed for
+        older peers """
+        if self.codec == B.CODEC_BINARY or not B.is_binary(signal.data):
+            return signal
+        block = B.loads(signal.data)
+        if B.hash_algorithm(block[B.HASH]) != B.LEGACY_HASH:
+            block = B.rehash(block, B.LEGACY_HASH)
+        return Signal(id=signal.id, channel=signal.channel,
+                      data=B.dumps(block, B.CODEC_PICKLE))
 
 
 class Hub(TCPServer):
@@ -131,7 +162,7 @@ class Hub(TCPServer):
     """
 
     def __init__(self, host="127.0.0.1", port=None, subscriptions=None,
-                 maxClient=MAX_PEER, store=None, **args):
+                 maxClient=MAX_PEER, store=None, allow_pickle=True, **args):
         if not store:
             raise TypeError("a shared store is mandatory for a Hub")
         args['enable_hub'] = False
@@ -139,28 +170,30 @@ class Hub(TCPServer):
         super(Hub, self).__init__(port=port, maxClient=maxClient,
                                   host=host, store=store, **args)
 
+        self.store.setRetention(INBOUND_PATH, max_entries=MAX_QUEUE_SIZE)
+        self.store.setRetention(OUBOUND_PATH, max_entries=MAX_QUEUE_SIZE)
+
         self.hub_subscriptions = set(subscriptions) if subscriptions else set()
+        self.allow_pickle = allow_pickle
         self.store_subscriptions = set()
 
         self.signal_seens = set([])
-        self.last_outbound = None
-        self.last_inbound = None
+        self.outbound = None
+        self.inbound = None
+
+    def onStart(self):
+        # cursors are created on start: self.store may have been replaced
+        self.outbound = self.store.cursor(JOURNAL_PATH)
+        self.inbound = self.store.cursor(INBOUND_PATH)
+        super(Hub, self).onStart()
 
     def onTimeout(self):
         """ This method is run every self.timeout seconds """
-        outbounds = None
-        if not self.last_outbound:
-            # first outbound processing
-            outbounds = self.store.get(JOURNAL_PATH) or []
-        else:
-            outbounds = self.store.getSince(JOURNAL_PATH,
-                                            self.last_outbound)
-
         # TODO: do filtering based on signal.data.metadata.path
-        for outbound in outbounds:
-            self.last_outbound = outbound
-
-            if not B.is_block(outbound) or not B.is_valid(outbound):
+        # blocks are validated by batches (in parallel after a partition)
+        outbounds = list(self.outbound.readNew())
+        for (outbound, valid) in zip(outbounds, B.validate_many(outbounds)):
+            if not valid:
                 self.fail("Not a block: %s", outbound)
                 raise TypeError()
 
@@ -171,24 +204,24 @@ class Hub(TCPServer):
 
             signal = Signal.parse(outbound)
             if not isinstance(signal, Signal):
-                signal = Signal(data=B.serialize(outbound), channel="X")
+                try:
+                    data = B.serialize(outbound)
+                except TypeError as error:
+                    self.logger.warning("Cannot send block of path %s: %s",
+                                        path, error)
+                    continue
+                signal = Signal(data=data, channel="X")
             self.emit(signal)
 
         # Inbound processing
-        inbounds = None
-        if not self.last_inbound:
-            inbounds = self.store.get(INBOUND_PATH) or []
-        else:
-            inbounds = self.store.getSince(INBOUND_PATH, self.last_inbound)
-
-        for signal in inbounds:
+        signals = []
+        for signal in self.inbound.readNew():
             signal = Signal.parse(signal)
 
             if not isinstance(signal, Signal):
                 self.fail("Not a signal: %s", signal)
                 raise TypeError()
 
-            self.last_inbound = signal
             # ignore exact duplicated signal
             if signal.id in self.signal_seens:
                 continue
@@ -196,7 +229,16 @@ class Hub(TCPServer):
             #TODO: truncate self.signal_seens to last 10000
             self.signal_seens.add(signal.id)
             if self.hub_subscriptions.intersection(set(signal.channel)):
+                signals.append(signal)
+
+        # valid blocks are cached, processBlock() does not hash them again
+        valids = B.validate_many([signal.data for signal in signals])
+        for (signal, valid) in zip(signals, valids):
+            if valid:
                 self.store.processBlock(signal.data)
+            else:
+                self.logger.warning("Invalid block in signal [%s]",
+                                    signal.id)
 
             # reemmit:
             # find a way to avoid sent message to be re-broadcasted
@@ -205,7 +247,8 @@ class Hub(TCPServer):
             # of peers!
 
     def createClientThread(self, clientSocket, ip):
-        client = HubClient(clientSocket=clientSocket, ip=ip, store=self.store)
+        client = HubClient(clientSocket=clientSocket, ip=ip, store=self.store,
+                           allow_pickle=self.allow_pickle)
         return client, {}
 
     def emit(self, signal):
@@ -219,7 +262,8 @@ class Hub(TCPServer):
             return False
 
         self.signal_seens.add(signal.id)
-        self.store.add(OUBOUND_PATH, signal.bytes())
+        # WIRE_V2: any data is parsed back by the HubClients
+        self.store.add(OUBOUND_PATH, signal.bytes(WIRE_V2))
 
     def addStorePath(self, path):
         self.store_subscriptions.add(path)
@@ -23,6 +23,17 @@ class DummyAMI(AMI):
         time.sleep(0.05)
 
 
+class WakeupAMI(AMI):
+    def __init__(self, **args):
+        super(WakeupAMI, self).__init__(**args)
+        self.wakeup_cursors.append(self.store.cursor("wakeup",
+                                                     from_start=False))
+
+    def onInterval(self):
+        list(self.wakeup_cursors[0].readNew())
+        self.store.add("ticks", 1)
+
+
 class Util:
     @staticmethod
     def run(ami, run_callback=None,
@@ -95,3 +106,25 @@ class TestAMI(unittest.TestCase):
         ami = DummyAMI(enable_hub=False, is_thread=False,
                        store=MockStore(), interval=0.01)
         self.assertEqual(Util.getStates(Util.run(ami)), STATE_SEQUENCE)
+
+    def test_process_sharedStore(self):
+        store = MockStore()
+        ami = DummyAMI(enable_hub=False, is_thread=False, store=store)
+        ami.start()
+        Util.waitForState(ami, [STOPPED], 1)
+        self.assertEqual(store.get(ami.HISTORY_PATH), STATE_SEQUENCE)
+
+    def test_process_wakeupCursors(self):
+        store = MockStore()
+        ami = WakeupAMI(enable_hub=False, is_thread=False, store=store,
+                        interval=1)
+        ticks = []
+
+        def wakeup(ami):
+            ticks.append(len(store.get("ticks") or []))
+            store.add("wakeup", 1)
+            time.sleep(0.5)  # less than the interval
+            ticks.append(len(store.get("ticks") or []))
+
+        Util.run(ami, run_callback=wakeup, stop_timeout=2.5)
+        self.assertEqual(ticks[1], ticks[0] + 1)
@@ -1,9 +1,11 @@
 import unittest
 from bob.ami.Hub import Hub, HubClient, HUB_VERSION, SEPARATOR, INBOUND_PATH, OUBOUND_PATH
-from bob.net.Signals import Signal
+from bob.net.Signals import Signal, WIRE_V2
 from bob.store.MockStore import MockStore, DATA
 from bob.store.Store import ADD_METHOD
 from bob.ami.tests.test_AMI import Util, STATE_SEQUENCE, FAILED_START_SEQUENCE
+import hashlib
+import pickle
 import socket
 import logging
 import tempfile
@@ -15,6 +17,22 @@ logging.basicConfig(level=logging.DEBUG)
 
 MOCKSOCKET_SEPARATOR = b"SENT#["
 
+
+def legacy_hash(data):
+    return repr(hashlib.sha1(str(data).encode("utf-8")).hexdigest())
+
+
+def legacy_deserialize(raw):
+    """ blockutil_U.deserialize() of HUB/0.1 peers """
+    block = pickle.loads(raw)
+    if legacy_hash(block[B.DATA]) != block[B.DATA_HASH]:
+        raise ValueError("block is corrupted")
+    hashes = [legacy_hash(block[key]) for key in B.KEYS
+              if key not in [B.DATA, B.HASH]]
+    if legacy_hash(' '.join(hashes)) != block[B.HASH]:
+        raise ValueError("block is corrupted")
+    return block
+
 class MockHub(Hub):
     def __init__(self, **kargs):
         super(MockHub, self).__init__(**kargs)
@@ -63,6 +81,11 @@ class MockSocket:
         else:
             return to_recv
 
+    def recv_into(self, buffer):
+        data = self.recv(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
     def send(self, data):
         self.last_sent = data
         with open(self.filename, "a+b") as file:
@@ -142,6 +165,89 @@ class TestHub(unittest.TestCase):
         inbounds = hubClient.store.get(INBOUND_PATH)
         self.assertEqual(inbounds, [signal.bytes()])
 
+    def test_HubClient_inboundStream(self):
+        signals = [Signal(data=B.serialize(B.create('a', 'p' * size)),
+                          channel="ABCDEF") for size in [10, 20000, 30]]
+        stream = b"".join(signal.bytes() + SEPARATOR for signal in signals)
+        socket = MockSocket()
+        socket.listOnRecv([
+            HUB_VERSION + SEPARATOR + stream[:100],  # with the handshake
+            stream[100:15000],
+            stream[15000:]  # coalesced
+        ])
+
+        def callback(ami):
+            time.sleep(0.3)
+
+        hubClient = HubClient(socket, "127.0.0.1", store=MockStore())
+        self.assertEqual(Util.getStates(Util.run(hubClient, callback)),
+                         STATE_SEQUENCE)
+        self.assertEqual(hubClient.store.get(INBOUND_PATH),
+                         [signal.bytes() for signal in signals])
+
+    def test_HubClient_wireV2(self):
+        signal = Signal(data=B.serialize(B.create('a', 'p')), channel="CH")
+        socket = MockSocket()
+        socket.listOnRecv([HUB_VERSION + SEPARATOR, signal.bytes(WIRE_V2)])
+
+        def callback(ami):
+            ami.store.add(OUBOUND_PATH, signal.bytes())
+            time.sleep(0.2)
+
+        hubClient = HubClient(socket, "127.0.0.1", store=MockStore())
+        self.assertEqual(Util.getStates(Util.run(hubClient, callback)),
+                         STATE_SEQUENCE)
+        self.assertEqual(hubClient.store.get(INBOUND_PATH),
+                         [signal.bytes(WIRE_V2)])
+        self.assertEqual(socket.getSent()[1], signal.bytes(WIRE_V2))
+
+    def test_HubClient_oldPeer(self):
+        block = B.create('a', {'k': [1, b'p']}, {'path': 't1'})
+        signal = Signal(data=B.serialize(block), channel="ABCDEF")
+        socket = MockSocket()
+        socket.funcOnRecv(lambda _: b"HUB/0.1" + SEPARATOR)
+
+        def callback(ami):
+            ami.store.add(OUBOUND_PATH, signal.bytes())
+            time.sleep(0.2)
+
+        hubClient = HubClient(socket, "127.0.0.1", store=MockStore())
+        self.assertEqual(Util.getStates(Util.run(hubClient, callback)),
+                         STATE_SEQUENCE)
+        sent = Signal.parse(socket.getSent()[1])
+        self.assertEqual(sent.id, signal.id)
+        self.assertFalse(B.is_binary(sent.data))
+        received = legacy_deserialize(sent.data)
+        self.assertEqual(received[B.DATA], block[B.DATA])
+        self.assertEqual(received[B.DATE], block[B.DATE])
+        self.assertNotEqual(received[B.HASH], block[B.HASH])
+
+    def test_HubClient_oldPeer_refused(self):
+        socket = MockSocket()
+        socket.funcOnRecv(lambda _: b"HUB/0.1" + SEPARATOR)
+
+        hubClient = HubClient(socket, "127.0.0.1", store=MockStore(),
+                              allow_pickle=False)
+        self.assertEqual(Util.getStates(Util.run(hubClient)),
+                         FAILED_START_SEQUENCE)
+
+    def test_HubClient_inboundPickled(self):
+        signal = Signal(data=B.serialize(B.create('a', 'p'), B.CODEC_PICKLE),
+                        channel="ABCDEF")
+        socket = MockSocket()
+        socket.listOnRecv([
+            HUB_VERSION + SEPARATOR,
+            signal.bytes()
+        ])
+
+        def callback(ami):
+            time.sleep(0.2)
+
+        hubClient = HubClient(socket, "127.0.0.1", store=MockStore())
+        self.assertEqual(Util.getStates(Util.run(hubClient, callback)),
+                         STATE_SEQUENCE)
+        self.assertEqual(hubClient.store.get(INBOUND_PATH), None)
+
     # Hub tests
 
     def test_init_port(self):
@@ -160,7 +266,41 @@ class TestHub(unittest.TestCase):
         assert(hub.store.get(OUBOUND_PATH) is None)
         signal = Signal(channel="CH1", data=B.serialize(B.create('a', 'p')))
         hub.emit(signal)
-        assert(hub.store.get(OUBOUND_PATH) == [signal.bytes()])
+        assert(hub.store.get(OUBOUND_PATH) == [signal.bytes(WIRE_V2)])
+
+    def test_emit_separatorInData(self):
+        hub = Hub(store=MockStore())
+        signal = Signal(channel="CH1",
+                        data=B.serialize(B.create('a', b")--(BOB>")))
+        hub.emit(signal)
+        socket = MockSocket()
+        socket.funcOnRecv(lambda _: HUB_VERSION + SEPARATOR)
+
+        def callback(ami):
+            time.sleep(0.2)
+
+        hubClient = HubClient(socket, "127.0.0.1", store=hub.store)
+        self.assertEqual(Util.getStates(Util.run(hubClient, callback)),
+                         STATE_SEQUENCE)
+        sent = Signal.parse(socket.getSent()[1])
+        self.assertIsInstance(sent, Signal)
+        self.assertEqual(sent.wire, WIRE_V2)
+        self.assertEqual(B.deserialize(sent.data), B.deserialize(signal.data))
+
+    def test_outbound_notEncodable(self):
+        hub = Hub(store=MockStore())
+
+        def callback(ami):
+            ami.store.add("p1", {"data": {1, 2}})  # a set
+            ami.store.add("p1", "encodable")
+            time.sleep(0.6)
+
+        self.assertEqual(Util.getStates(Util.run(hub, callback)),
+                         STATE_SEQUENCE)
+        payloads = [B.deserialize(Signal.parse(raw).data)[B.DATA]
+                    for raw in hub.store.get(OUBOUND_PATH)]
+        self.assertIn("encodable", payloads)
+        self.assertNotIn({"data": {1, 2}}, payloads)
 
     def test_startstop(self):
         hub = Hub(store=MockStore())
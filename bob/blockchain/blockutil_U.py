@@ -1,7 +1,18 @@
+import atexit
 import datetime
+import functools
 import hashlib
 import json
+import multiprocessing
+import os
 import pickle
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import chain, repeat
+from operator import add, itemgetter
 
 """
 Each block has a hash key which acts as a unique id
@@ -10,6 +21,19 @@ This id can be published publicly to verify block anywhere
 The hash_block and is_block are the main interface for users
 create_block creates valid block
 
+Hashes are prefixed with their algorithm ("blake2b:<hex>"), computed
+over a canonical binary encoding of the values (see encode()): dicts
+are hashed whatever their order and bytes are hashed as they are.
+Legacy hashes (SHA-1 of str(value), without prefix) are still verified.
+
+Valid blocks are remembered by validation_cache: validating again an
+unchanged block (or the same serialized block) does not rehash it.
+
+validate_many() validates large batches of blocks in worker processes.
+
+Blocks are serialized with a binary codec (CODEC_BINARY, see dumps()),
+or pickled (CODEC_PICKLE) for older peers. deserialize() detects the
+format, unpickling can be refused for untrusted bytes.
 """
 AUTHOR = "author"
 DATA = "payload"
@@ -30,9 +54,343 @@ KEYS = [
 # Unused
 DATA_TYPES = [str, int, float, bytes]
 
+# algorithm name -> hashlib constructor, the name prefixes the hashes
+HASH_ALGORITHMS = {
+    "blake2b": lambda: hashlib.blake2b(digest_size=32),
+    "sha256": hashlib.sha256
+}
+HASH_ALGORITHM = "blake2b"  # algorithm of the new hashes
+LEGACY_HASH = "sha1"  # unprefixed hashes of the first blocks
+
+LENGTH = struct.Struct(">Q")
+HEADER = struct.Struct(">cQ")  # type tag and length
+INT_ITEM = struct.Struct(">cQq")  # an int of 8 bytes with its header
+FLOAT_ITEM = struct.Struct(">cd")
+INT64 = b"I" + LENGTH.pack(8)  # header of the ints of 8 bytes
+STR_HEADERS = [HEADER.pack(b"S", length) for length in range(256)]
+COLUMN_MIN = 32  # items of the lists and dicts encoded by columns
+BUFFER_SIZE = 64 * 1024  # larger bytes and str are hashed without copy
+
+
+def _str_headers(bodies):
+    """ Return the headers of the encodings of str from their bodies """
+    lengths = list(map(len, bodies))
+    if max(lengths) < len(STR_HEADERS):
+        return list(map(STR_HEADERS.__getitem__, lengths))
+    return list(map(HEADER.pack, repeat(b"S"), lengths))
+
+
+def _column(values, code, header):
+    """ Return the encodings of values packed by a single struct call,
+    header + 8 bytes of each value, or raise struct.error """
+    packed = struct.pack(">%d%s" % (len(values), code), *values)
+    step = len(header) + 8
+    encoded = bytearray(header + bytes(8)) * len(values)
+    for byte in range(8):
+        encoded[len(header) + byte::step] = packed[byte::8]
+    return encoded
+
+
+def _encodings(values, joined=False):
+    """ Return the encodings of values as columns of parts, zip(*columns)
+    gives the parts of each value, when values are all ints of 8 bytes,
+    floats or short str, otherwise None
+
+    joined: the parts of values are not needed, numbers are returned as
+            a single part
+    """
+    kinds = set(map(type, values))
+    if kinds == {int}:
+        try:
+            if joined:
+                return [[_column(values, "q", INT64)]]
+            return [list(map(INT_ITEM.pack, repeat(b"I"), repeat(8),
+                             values))]
+        except struct.error:  # some int does not fit 8 bytes
+            return None
+    if kinds == {float}:
+        if joined:
+            return [[_column(values, "d", b"D")]]
+        return [list(map(FLOAT_ITEM.pack, repeat(b"D"), values))]
+    if kinds == {str}:
+        bodies = list(map(str.encode, values, repeat("utf-8"),
+                          repeat("surrogatepass")))
+        if max(map(len, bodies)) < BUFFER_SIZE:
+            return [_str_headers(bodies), bodies]
+    return None
+
+
+def _encoding(value):
+    """ Return the encoding of value as bytes """
+    parts = bytearray()
+    _encode(value, parts, None)
+    return bytes(parts)
+
+
+def _encode(value, out, write):
+    """ Append the encoding of value to out
+
+    write: when not None, large bytes and str are passed to write()
+           after the content of out, without being copied
+    """
+    kind = type(value)
+    if kind is str:
+        body = value.encode("utf-8", "surrogatepass")
+        out += HEADER.pack(b"S", len(body))
+        if write is not None and len(body) >= BUFFER_SIZE:
+            write(bytes(out))
+            del out[:]
+            write(body)
+        else:
+            out += body
+    elif kind is int:
+        if -2 ** 63 <= value < 2 ** 63:
+            out += INT_ITEM.pack(b"I", 8, value)
+        else:
+            body = value.to_bytes(value.bit_length() // 8 + 1, "big",
+                                  signed=True)
+            out += HEADER.pack(b"I", len(body))
+            out += body
+    elif kind is dict:
+        out += HEADER.pack(b"M", len(value))
+        if len(value) >= COLUMN_MIN and set(map(type, value)) == {str}:
+            # sorted by encoded key: by length, then by utf-8 body
+            bodies = list(map(str.encode, value, repeat("utf-8"),
+                              repeat("surrogatepass")))
+            by_body = dict(zip(bodies, value.values()))
+            bodies.sort()
+            bodies.sort(key=len)
+            headers = _str_headers(bodies)
+            items = list(map(by_body.__getitem__, bodies))
+            encodings = _encodings(items)
+            if encodings is not None:
+                out += b"".join(chain.from_iterable(
+                    zip(headers, bodies, *encodings)))
+                return
+            keys = map(add, headers, bodies)
+        else:
+            pairs = []
+            for (key, item) in value.items():
+                if type(key) is str:
+                    body = key.encode("utf-8", "surrogatepass")
+                    key = HEADER.pack(b"S", len(body)) + body
+                else:
+                    key = _encoding(key)
+                pairs.append((key, item))
+            pairs.sort(key=itemgetter(0))
+            keys = map(itemgetter(0), pairs)
+            items = map(itemgetter(1), pairs)
+        for (key, item) in zip(keys, items):
+            out += key
+            kind = type(item)  # the common items are encoded inline
+            if kind is str and len(item) < BUFFER_SIZE // 4:
+                body = item.encode("utf-8", "surrogatepass")
+                out += HEADER.pack(b"S", len(body))
+                out += body
+            elif kind is int and -2 ** 63 <= item < 2 ** 63:
+                out += INT_ITEM.pack(b"I", 8, item)
+            elif kind is float:
+                out += FLOAT_ITEM.pack(b"D", item)
+            else:
+                _encode(item, out, write)
+    elif kind in (list, tuple):
+        out += HEADER.pack(b"L", len(value))
+        if len(value) >= COLUMN_MIN:
+            encodings = _encodings(value, joined=True)
+            if encodings is not None:
+                out += b"".join(chain.from_iterable(zip(*encodings)))
+                return
+        for item in value:
+            kind = type(item)
+            if kind is str and len(item) < BUFFER_SIZE // 4:
+                body = item.encode("utf-8", "surrogatepass")
+                out += HEADER.pack(b"S", len(body))
+                out += body
+            elif kind is int and -2 ** 63 <= item < 2 ** 63:
+                out += INT_ITEM.pack(b"I", 8, item)
+            elif kind is float:
+                out += FLOAT_ITEM.pack(b"D", item)
+            else:
+                _encode(item, out, write)
+    elif kind is float:
+        out += FLOAT_ITEM.pack(b"D", value)
+    elif value is None:
+        out += b"N"
+    elif kind is bool:
+        out += b"T" if value else b"F"
+    elif kind in (bytes, bytearray, memoryview):
+        out += HEADER.pack(b"B", len(value))
+        if write is not None and len(value) >= BUFFER_SIZE:
+            write(bytes(out))
+            del out[:]
+            write(value)
+        else:
+            out += value
+    else:
+        body = repr(value).encode("utf-8", "surrogatepass")
+        out += HEADER.pack(b"R", len(body))
+        out += body
+
+
+def encode(value, write):
+    """ Write the canonical binary encoding of value with write(bytes)
+
+    Each value is a type tag followed by its length and content, dict
+    items are sorted by their encoded key. Values of other types are
+    encoded with their repr().
+    """
+    out = bytearray()
+    _encode(value, out, write)
+    if out:
+        write(bytes(out))
+
+
+# payloads which cannot change in place, cached by identity
+IMMUTABLE_TYPES = (type(None), bool, int, float, str, bytes)
+VALIDATION_CACHE_SIZE = 4096  # blocks and serialized blocks
+VALIDATION_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class ValidationCache(object):
+    """ LRU of the blocks and serialized blocks known to be valid
+
+    A block is found by its hash and the identity of its payload (the
+    cache keeps a reference to the payload, thus its id is not reused).
+    The other fields, and the payload when it is mutable, are compared
+    to a pickled copy: a block modified in place is validated again.
+    Serialized blocks are found by their bytes.
+    """
+
+    def __init__(self, max_entries=VALIDATION_CACHE_SIZE,
+                 max_bytes=VALIDATION_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # Map<key, (size, payload, fields)>
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def contains_block(self, block):
+        key = self.__key(block)
+        with self._lock:
+            entry = self.entries.get(key)
+        found = entry is not None and entry[1] is block[DATA] and \
+            entry[2] == self.__fields(block) is not None
+        self.__count(key, found)
+        return found
+
+    def add_block(self, block):
+        payload = block[DATA]
+        fields = self.__fields(block)
+        if fields is None:
+            return
+        size = len(fields)
+        if type(payload) in (str, bytes):
+            size += len(payload)
+        self.__add(self.__key(block), (size, payload, fields))
+
+    def contains_raw(self, raw):
+        key = bytes(raw)
+        with self._lock:
+            found = key in self.entries
+        self.__count(key, found)
+        return found
+
+    def add_raw(self, raw):
+        raw = bytes(raw)
+        self.__add(raw, (len(raw), None, None))
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+    def __key(self, block):
+        return (block[HASH], id(block[DATA]))
+
+    def __fields(self, block):
+        """ Pickled fields which may change without changing the key,
+        None if they cannot be pickled (the block is not cached) """
+        payload = block[DATA]
+        if type(payload) in IMMUTABLE_TYPES:
+            payload = None
+        try:
+            return pickle.dumps((block[AUTHOR], block[DATA_HASH],
+                                 block[METADATA], block[DATE], payload),
+                                pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return None
+
+    def __count(self, key, found):
+        with self._lock:
+            if not found:
+                self.misses += 1
+                return
+            self.hits += 1
+            if key in self.entries:
+                self.entries.move_to_end(key)
+
+    def __add(self, key, entry):
+        if entry[0] > self.max_bytes:
+            return
+        with self._lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[0]
+            self.entries[key] = entry
+            self.bytes += entry[0]
+            while len(self.entries) > self.max_entries or \
+                    self.bytes > self.max_bytes:
+                (_, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted[0]
+
+
+validation_cache = ValidationCache()
+
+
+def hash_algorithm(hash_value):
+    """ Return the algorithm of a hash returned by hash_data() """
+    if isinstance(hash_value, str):
+        (name, separator, _) = hash_value.partition(":")
+        if separator and name in HASH_ALGORITHMS:
+            return name
+    return LEGACY_HASH
+
+
+def hash_data(data, algorithm=None):
+    """ Return the "<algorithm>:<hex digest>" hash of data
+
+    algorithm: one of HASH_ALGORITHMS (default HASH_ALGORITHM), or
+               LEGACY_HASH
+    """
+    algorithm = algorithm or HASH_ALGORITHM
+    if algorithm == LEGACY_HASH:
+        return repr(hashlib.sha1(str(data).encode("utf-8")).hexdigest())
+    return hash_values([data], algorithm)
+
 
-def hash_data(data):
-    return repr(hashlib.sha1(str(data).encode("utf-8")).hexdigest())
+def hash_values(values, algorithm=None):
+    """ Return the hash of the encodings of values, streamed into a
+    single hasher """
+    algorithm = algorithm or HASH_ALGORITHM
+    if algorithm not in HASH_ALGORITHMS:
+        raise ValueError("unknown hash algorithm [%s]" % algorithm)
+    hasher = HASH_ALGORITHMS[algorithm]()
+    out = bytearray()
+    for value in values:
+        _encode(value, out, hasher.update)
+    hasher.update(out)
+    return "%s:%s" % (algorithm, hasher.hexdigest())
 
 
 def is_block(block, full=True):
@@ -46,41 +404,350 @@ def is_block(block, full=True):
 def is_valid(block):
     if not is_block(block):
         raise TypeError("Not a block")
-    if hash_data(block[DATA]) != block[DATA_HASH]:
+    if validation_cache.contains_block(block):
+        return True
+    if hash_data(block[DATA], hash_algorithm(block[DATA_HASH])) != \
+            block[DATA_HASH]:
         return False
-    if hash_block(block) != block[HASH]:
+    if hash_block(block, hash_algorithm(block[HASH])) != block[HASH]:
         return False
+    validation_cache.add_block(block)
     return True
 
 
 # TODO: !!! sign hash with this AMI's asymetric key
 #       this prevents anyone else from changing the block
-def hash_block(block):
+def hash_block(block, algorithm=None):
+    """ Hash the fields of block but its payload (hashed in DATA_HASH) """
     if not is_block(block, full=False):
         raise TypeError("Not a block")
 
-    hashes = [hash_data(block[key]) for key in KEYS if key not in [DATA, HASH]]
+    keys = [key for key in KEYS if key not in [DATA, HASH]]
+    algorithm = algorithm or HASH_ALGORITHM
+    if algorithm == LEGACY_HASH:
+        hashes = [hash_data(block[key], LEGACY_HASH) for key in keys]
+        return hash_data(' '.join(hashes), LEGACY_HASH)
+    return hash_values([block[key] for key in keys], algorithm)
 
-    return hash_data(' '.join(hashes))
 
+def rehash(block, algorithm=None):
+    """ Return a copy of block with its hashes computed with algorithm
 
-def serialize(block):
-    if is_block(block) and is_valid(block):
+    The hash is the id of a block: the copy is another block for the
+    journal chains, checkpoints and stores referring to block by hash.
+    """
+    copy = dict(block)
+    copy[DATA_HASH] = hash_data(copy[DATA], algorithm)
+    copy[HASH] = u''
+    copy[HASH] = hash_block(copy, algorithm)
+    return copy
+
+
+CODEC_BINARY = "binary"
+CODEC_PICKLE = "pickle"
+BINARY_MAGIC = b"\x00BLK"
+BINARY_VERSION = 1
+MAX_DEPTH = 64  # nested lists and dicts of binary blocks
+# binary fields order, the payload is last
+BINARY_KEYS = [AUTHOR, DATA_HASH, METADATA, DATE, HASH, DATA]
+
+SIZE = struct.Struct("<I")
+INT = struct.Struct("<q")
+DOUBLE = struct.Struct("<d")
+
+
+def _pack(value, parts, depth=0):
+    """ Append the binary encoding of value to parts """
+    if depth > MAX_DEPTH:
+        raise ValueError("values nested deeper than %d" % MAX_DEPTH)
+    kind = type(value)
+    if value is None:
+        parts.append(b"N")
+    elif kind is bool:
+        parts.append(b"T" if value else b"F")
+    elif kind is int:
+        if -2 ** 63 <= value < 2 ** 63:
+            parts.append(b"i" + INT.pack(value))
+        else:
+            body = value.to_bytes(value.bit_length() // 8 + 1, "little",
+                                  signed=True)
+            parts.append(b"I" + SIZE.pack(len(body)) + body)
+    elif kind is float:
+        parts.append(b"d" + DOUBLE.pack(value))
+    elif kind is str:
+        body = value.encode("utf-8", "surrogatepass")
+        parts.append(b"S" + SIZE.pack(len(body)))
+        parts.append(body)
+    elif kind in (bytes, bytearray, memoryview):
+        body = memoryview(value).cast("B")
+        parts.append(b"B" + SIZE.pack(len(body)))
+        parts.append(body)
+    elif kind in (list, tuple):
+        parts.append((b"L" if kind is list else b"U") + SIZE.pack(len(value)))
+        for item in value:
+            _pack(item, parts, depth + 1)
+    elif kind is dict:
+        parts.append(b"M" + SIZE.pack(len(value)))
+        for (key, item) in value.items():
+            _pack(key, parts, depth + 1)
+            _pack(item, parts, depth + 1)
+    else:
+        raise TypeError("cannot encode [%s]" % kind.__name__)
+
+
+def _unpack(view, offset, zero_copy, depth=0):
+    """ Return (value, next offset) of the value encoded at offset """
+    if depth > MAX_DEPTH:
+        raise ValueError("values nested deeper than %d" % MAX_DEPTH)
+    tag = chr(view[offset])
+    offset += 1
+    if tag == "N":
+        return (None, offset)
+    if tag == "T" or tag == "F":
+        return (tag == "T", offset)
+    if tag == "i":
+        return (INT.unpack_from(view, offset)[0], offset + INT.size)
+    if tag == "d":
+        return (DOUBLE.unpack_from(view, offset)[0], offset + DOUBLE.size)
+
+    (size,) = SIZE.unpack_from(view, offset)
+    offset += SIZE.size
+    if tag in ("L", "U", "M"):
+        if size > len(view) - offset:  # each value takes 1 byte at least
+            raise ValueError("truncated block")
+        if tag == "M":
+            value = {}
+            for _ in range(size):
+                (key, offset) = _unpack(view, offset, False, depth + 1)
+                (value[key], offset) = _unpack(view, offset, zero_copy,
+                                               depth + 1)
+            return (value, offset)
+        value = []
+        for _ in range(size):
+            (item, offset) = _unpack(view, offset, zero_copy, depth + 1)
+            value.append(item)
+        return (value if tag == "L" else tuple(value), offset)
+
+    end = offset + size
+    if end > len(view):
+        raise ValueError("truncated block")
+    if tag == "S":
+        return (str(view[offset:end], "utf-8", "surrogatepass"), end)
+    if tag == "B":
+        body = view[offset:end]
+        return (body if zero_copy else body.tobytes(), end)
+    if tag == "I":
+        return (int.from_bytes(view[offset:end], "little", signed=True), end)
+    raise ValueError("unknown value tag %r" % tag)
+
+
+def is_binary(raw):
+    """ Return True if raw is a block serialized with CODEC_BINARY """
+    return bytes(raw[:len(BINARY_MAGIC)]) == BINARY_MAGIC
+
+
+def dumps(block, codec=CODEC_BINARY):
+    """ Serialize block without validating it
+
+    CODEC_BINARY: magic, format version, then the fields as tagged and
+    length-prefixed values. Values of other types than None, bool, int,
+    float, str, bytes, list, tuple and dict raise TypeError: such blocks
+    can only be pickled, which the peers with the codec refuse.
+    CODEC_PICKLE: pickle protocol 2, for the peers without the codec
+    """
+    if codec == CODEC_PICKLE:
         return pickle.dumps(block, 2)
+    if codec != CODEC_BINARY:
+        raise ValueError("unknown codec [%s]" % codec)
+    parts = [BINARY_MAGIC, bytes([BINARY_VERSION])]
+    for key in BINARY_KEYS:
+        try:
+            _pack(block[key], parts)
+        except TypeError as error:
+            raise TypeError("%s of block [%s]: %s" % (key, block.get(HASH),
+                                                      error))
+    return b"".join(parts)
+
+
+def loads(raw, allow_pickle=True, zero_copy=False):
+    """ Deserialize a block without validating it
+
+    allow_pickle: False refuses pickled blocks (ValueError), pickle runs
+                  arbitrary code of untrusted bytes
+    zero_copy: bytes values of binary blocks are memoryviews of raw
+               (but when the payload hash is a legacy hash)
+    """
+    if not is_binary(raw):
+        if not allow_pickle:
+            raise ValueError("pickled blocks are not allowed")
+        return pickle.loads(raw)
+
+    view = memoryview(raw).cast("B")
+    if view[len(BINARY_MAGIC)] != BINARY_VERSION:
+        raise ValueError("unsupported block version [%d]" %
+                         view[len(BINARY_MAGIC)])
+    fields = {}
+    offset = len(BINARY_MAGIC) + 1
+    try:
+        for key in BINARY_KEYS:
+            (fields[key], offset) = _unpack(
+                view, offset, zero_copy and
+                hash_algorithm(fields.get(DATA_HASH)) != LEGACY_HASH)
+    except (struct.error, IndexError, UnicodeDecodeError, TypeError) as e:
+        raise ValueError("corrupted block: %s" % e)
+    if offset != len(view):
+        raise ValueError("corrupted block: %d trailing bytes" %
+                         (len(view) - offset))
+    return {key: fields[key] for key in KEYS}
+
+
+def serialize(block, codec=CODEC_BINARY):
+    """ Return the bytes of a valid block, see dumps() """
+    if is_block(block) and is_valid(block):
+        raw = dumps(block, codec)
+        validation_cache.add_raw(raw)
+        return raw
     else:
         raise ValueError("not a  block or invalid block")
 
 
-def deserialize(raw):
-    block = pickle.loads(raw)
+def deserialize(raw, allow_pickle=True, zero_copy=False):
+    """ Return the valid block of raw, see loads() """
+    block = loads(raw, allow_pickle, zero_copy)
     if not is_block(block):
         raise TypeError("invalid block structure")
+    if validation_cache.contains_raw(raw):
+        return block
     if not is_valid(block):
         raise ValueError("block is corrupted")
+    validation_cache.add_raw(raw)
     return block
 
 
-def create(author, payload, metadata=None):
+PARALLEL_MIN_BLOCKS = 1000  # smaller batches are validated inline
+VALIDATION_CHUNK = 250  # blocks per worker task
+_executors = {}  # Map<workers, ProcessPoolExecutor>
+_executors_lock = threading.Lock()
+_executors_pid = os.getpid()  # process owning _executors
+
+
+def _is_valid_item(item, allow_pickle=True):
+    """ is_valid() of a block or of a serialized block, False when item
+    is not a (serialized) block """
+    try:
+        if isinstance(item, (bytes, bytearray, memoryview)):
+            deserialize(item, allow_pickle)
+            return True
+        return is_valid(item)
+    except Exception:
+        return False
+
+
+def _validate_chunk(items, allow_pickle=True):
+    return [_is_valid_item(item, allow_pickle) for item in items]
+
+
+def _executor(workers):
+    """ Return the shared pool of [workers] processes
+
+    The workers are not forked from this (threaded) process, a fork
+    would copy the locks held by the other threads.
+    """
+    global _executors_pid
+    with _executors_lock:
+        if _executors_pid != os.getpid():  # pools of the parent process
+            _executors.clear()
+            _executors_pid = os.getpid()
+        if workers not in _executors:
+            method = "forkserver" if "forkserver" in \
+                multiprocessing.get_all_start_methods() else "spawn"
+            _executors[workers] = ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context(method))
+        return _executors[workers]
+
+
+def shutdown_workers():
+    """ Stop the worker processes of validate_many(), they are started
+    again when needed """
+    with _executors_lock:
+        executors = list(_executors.values()) \
+            if _executors_pid == os.getpid() else []
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=True)
+
+
+atexit.register(shutdown_workers)
+
+
+def validate_many(blocks, workers=None, allow_pickle=True):
+    """ Return the validity of each block, in order
+
+    blocks: blocks (see is_valid) or serialized blocks (see deserialize),
+            invalid when they are not blocks
+    workers: processes hashing the blocks (default: one per cpu), the
+             blocks already in validation_cache and the batches smaller
+             than PARALLEL_MIN_BLOCKS are validated inline, as well as
+             the chunks which can not be pickled to the workers
+    allow_pickle: see loads()
+    """
+    blocks = list(blocks)
+    results = [True] * len(blocks)
+    pending = []
+    for (position, block) in enumerate(blocks):
+        if isinstance(block, (bytes, bytearray, memoryview)):
+            cached = validation_cache.contains_raw(block) and \
+                (allow_pickle or is_binary(block))
+        else:
+            cached = isinstance(block, dict) and is_block(block) and \
+                validation_cache.contains_block(block)
+        if not cached:
+            pending.append(position)
+
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(pending) < PARALLEL_MIN_BLOCKS:
+        for position in pending:
+            results[position] = _is_valid_item(blocks[position], allow_pickle)
+        return results
+
+    # memoryviews can not be pickled to the workers
+    items = [bytes(blocks[position])
+             if isinstance(blocks[position], memoryview)
+             else blocks[position] for position in pending]
+    chunks = [items[start:start + VALIDATION_CHUNK]
+              for start in range(0, len(items), VALIDATION_CHUNK)]
+    validate = functools.partial(_validate_chunk, allow_pickle=allow_pickle)
+    executor = _executor(workers)
+    futures = [executor.submit(validate, chunk) for chunk in chunks]
+    flags = []
+    for (chunk, future) in zip(chunks, futures):
+        try:
+            flags.extend(future.result())
+        except Exception as e:  # eg. blocks holding sockets
+            if isinstance(e, BrokenProcessPool):
+                with _executors_lock:
+                    if _executors.get(workers) is executor:
+                        del _executors[workers]
+            flags.extend(validate(chunk))
+    for (position, valid) in zip(pending, flags):
+        results[position] = valid
+        if not valid:
+            continue
+        if isinstance(blocks[position], dict):
+            validation_cache.add_block(blocks[position])
+        else:
+            validation_cache.add_raw(blocks[position])
+    return results
+
+
+def create(author, payload, metadata=None, timestamp=None,
+           payload_hash=None, algorithm=None):
+    """ Return a new valid block
+
+    timestamp: creation time (as time.time()), defaults to now
+    payload_hash: hash_data(payload) when already known
+    algorithm: hash algorithm, see hash_data()
+    """
     if author is None or type(author) != str:
         raise TypeError("Author must be a string")
     if payload is not None and type(payload) not in (str, dict, list, int,
@@ -92,11 +759,12 @@ def create(author, payload, metadata=None):
     block = {
         AUTHOR: author,
         DATA: payload,
-        DATA_HASH: hash_data(payload),
+        DATA_HASH: payload_hash or hash_data(payload, algorithm),
         METADATA: metadata,
-        DATE: str(datetime.datetime.now()),
+        DATE: str(datetime.datetime.fromtimestamp(timestamp)
+                  if timestamp is not None else datetime.datetime.now()),
         HASH: u''
     }
 
-    block[HASH] = hash_block(block)
+    block[HASH] = hash_block(block, algorithm)
     return block
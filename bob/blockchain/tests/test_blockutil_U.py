@@ -1,3 +1,4 @@
+import threading
 import unittest
 from bob.blockchain import blockutil_U as B
 
@@ -8,6 +9,9 @@ class ADummyClass:
 
 class TestBlockutilU(unittest.TestCase):
 
+    def setUp(self):
+        B.validation_cache.clear()
+
     def test_create(self):
         block = B.create("author", "payload", {"x": 1})
         for key in B.KEYS:
@@ -34,6 +38,119 @@ class TestBlockutilU(unittest.TestCase):
             self.assertIsInstance(output, str)
             self.assertTrue(len(output) > 32 and len(output) < 128)
 
+    def test_hashData_canonical(self):
+        self.assertEqual(B.hash_data({"a": 1, "b": [2, b"3"]}),
+                         B.hash_data({"b": [2, b"3"], "a": 1}))
+        self.assertTrue(B.hash_data(b"x").startswith("blake2b:"))
+        self.assertTrue(B.hash_data(b"x", "sha256").startswith("sha256:"))
+        values = [1, 1.0, True, "1", b"1", [1, 2], (1, 2), {"1": 1}, {1: 1},
+                  None, ["a", "b"], ["ab"]]
+        hashes = set(B.hash_data(value) for value in values)
+        self.assertEqual(len(hashes), len(values) - 1)  # list == tuple
+
+    def test_hashData_columns(self):
+        # long lists and dicts are encoded by columns, into the same bytes
+        payload = {"ints": list(range(-50, 50)) + [2 ** 63],
+                   "floats": [i / 4 for i in range(40)],
+                   "strs": {"k%d" % i: "v%d" % i for i in range(40)},
+                   "mixed": {"k%d" % i: [i, "x", i / 2] for i in range(40)}}
+        self.assertEqual(B.hash_data(payload),
+                         "blake2b:1b104562ce4be2014107dd95e648be50385817b0"
+                         "571c1a30c37f52d894ad2391")
+        for value in list(payload.values()) + [payload]:
+            parts = []
+            B.encode(value, parts.append)
+            hasher = B.HASH_ALGORITHMS["blake2b"]()
+            hasher.update(b"".join(parts))
+            self.assertEqual(B.hash_data(value),
+                             "blake2b:" + hasher.hexdigest())
+
+    def test_hashData_large(self):
+        payload = bytes(range(256)) * 4096
+        self.assertEqual(B.hash_data(payload),
+                         B.hash_data(bytearray(payload)))
+        self.assertNotEqual(B.hash_data(payload),
+                            B.hash_data(payload[:-1] + b"x"))
+
+    def test_hashData_legacy(self):
+        self.assertEqual(B.hash_data("a", B.LEGACY_HASH),
+                         "'86f7e437faa5a7fce15d1ddcb9eaeaea377667b8'")
+        self.assertEqual(B.hash_algorithm(B.hash_data("a", B.LEGACY_HASH)),
+                         B.LEGACY_HASH)
+        self.assertEqual(B.hash_algorithm(B.hash_data("a")), "blake2b")
+        with self.assertRaises(ValueError):
+            B.hash_data("a", "md4")
+
+    def test_isValid_legacy(self):
+        block = B.create("author", {"data": 123}, algorithm=B.LEGACY_HASH)
+        self.assertEqual(B.hash_algorithm(block[B.HASH]), B.LEGACY_HASH)
+        self.assertTrue(B.is_valid(block))
+        self.assertEqual(block, B.deserialize(B.serialize(block)))
+        block[B.DATA] = {"data": 124}
+        self.assertFalse(B.is_valid(block))
+
+    def test_rehash(self):
+        block = B.create("author", {"data": 123}, {"path": "p"})
+        legacy = B.rehash(block, B.LEGACY_HASH)
+        self.assertEqual(B.hash_algorithm(legacy[B.HASH]), B.LEGACY_HASH)
+        self.assertTrue(B.is_valid(legacy))
+        self.assertNotEqual(legacy[B.HASH], block[B.HASH])
+        self.assertEqual(B.rehash(legacy), block)
+
+    def test_isValid_reordered(self):
+        block = B.create("author", {"a": 1, "b": 2}, {"x": 1, "y": 2})
+        block[B.DATA] = {"b": 2, "a": 1}
+        block[B.METADATA] = {"y": 2, "x": 1}
+        self.assertTrue(B.is_valid(block))
+
+    def test_isValid_cached(self):
+        block = B.create("author", {"data": [1, 2]}, {"x": 1})
+        self.assertTrue(B.is_valid(block))
+        hits = B.validation_cache.stats()["hits"]
+        self.assertTrue(B.is_valid(block))
+        raw = B.serialize(block)
+        self.assertEqual(B.validation_cache.stats()["hits"], hits + 2)
+        self.assertEqual(B.deserialize(raw), block)
+        self.assertEqual(B.validation_cache.stats()["hits"], hits + 3)
+
+    def test_isValid_cached_mutated(self):
+        block = B.create("author", {"data": [1, 2]}, {"x": 1})
+        self.assertTrue(B.is_valid(block))
+        block[B.DATA]["data"].append(3)
+        self.assertFalse(B.is_valid(block))
+        block[B.DATA]["data"].pop()
+        self.assertTrue(B.is_valid(block))
+        block[B.METADATA]["x"] = 2
+        self.assertFalse(B.is_valid(block))
+        block[B.METADATA]["x"] = 1
+        block[B.DATA] = {"data": [1, 2.0]}
+        self.assertFalse(B.is_valid(block))
+
+        block = B.create("author", "payload")
+        self.assertTrue(B.is_valid(block))
+        block[B.DATA] = "other"
+        self.assertFalse(B.is_valid(block))
+        block[B.DATA] = "payload"
+        block[B.DATE] = "2000-01-01"
+        self.assertFalse(B.is_valid(block))
+
+    def test_isValid_cached_corruptedRaw(self):
+        raw = B.serialize(B.create("author", "content"))
+        corrupted = raw.replace(b"content", b"kontent")
+        with self.assertRaises(ValueError):
+            B.deserialize(corrupted)
+
+    def test_validationCache_bounded(self):
+        cache = B.ValidationCache(max_entries=2, max_bytes=10 ** 6)
+        blocks = [B.create("author", i) for i in range(3)]
+        for block in blocks:
+            cache.add_block(block)
+        self.assertFalse(cache.contains_block(blocks[0]))
+        self.assertTrue(cache.contains_block(blocks[2]))
+        cache.add_raw(b"x" * (10 ** 6 + 1))
+        self.assertEqual(cache.stats()["entries"], 2)
+        self.assertLessEqual(cache.stats()["bytes"], 10 ** 6)
+
     def test_isBlock(self):
         block = B.create("author", "payload")
         self.assertTrue(B.is_block(block))
@@ -69,3 +186,105 @@ class TestBlockutilU(unittest.TestCase):
         serialized = B.serialize(block)
         self.assertIsInstance(serialized, bytes)
         self.assertEqual(block, B.deserialize(serialized))
+
+    def test_serialize_binary(self):
+        block = B.create("author", {"a": [1, -2 ** 70, 2.5, None, True],
+                                    "b": (b"x", "\u00e9"), 3: {}})
+        raw = B.serialize(block)
+        self.assertTrue(B.is_binary(raw))
+        self.assertLess(len(raw), len(B.serialize(block, B.CODEC_PICKLE)))
+        self.assertEqual(B.deserialize(raw), block)
+        self.assertIsInstance(B.deserialize(raw)[B.DATA]["b"], tuple)
+
+    def test_serialize_pickle(self):
+        block = B.create("author", "payload")
+        raw = B.serialize(block, B.CODEC_PICKLE)
+        self.assertFalse(B.is_binary(raw))
+        self.assertEqual(B.deserialize(raw), block)
+        with self.assertRaises(ValueError):
+            B.deserialize(raw, allow_pickle=False)
+        with self.assertRaises(ValueError):
+            B.serialize(block, "json")
+
+    def test_serialize_notEncodable(self):
+        block = B.create("author", {"data": {1, 2}})  # a set
+        with self.assertRaises(TypeError):
+            B.serialize(block)
+        raw = B.serialize(block, B.CODEC_PICKLE)
+        self.assertEqual(B.deserialize(raw), block)
+
+    def test_serialize_legacy(self):
+        block = B.create("author", {"data": b"123"}, algorithm=B.LEGACY_HASH)
+        raw = B.serialize(block)
+        self.assertTrue(B.is_binary(raw))
+        self.assertEqual(B.deserialize(raw, zero_copy=True), block)
+
+    def test_deserialize_zeroCopy(self):
+        payload = bytes(range(256)) * 1024
+        raw = B.serialize(B.create("author", payload))
+        block = B.deserialize(raw, zero_copy=True)
+        self.assertIsInstance(block[B.DATA], memoryview)
+        self.assertIs(block[B.DATA].obj, raw)
+        self.assertEqual(block[B.DATA], payload)
+        self.assertTrue(B.is_valid(block))
+
+    def test_deserialize_corrupted(self):
+        raw = B.serialize(B.create("author", {"data": [1, 2, 3]}))
+        for corrupted in [raw[:-1], raw + b"x", raw[:5] + b"X" + raw[6:],
+                          raw[:4] + b"\x09" + raw[5:]]:
+            with self.assertRaises(ValueError):
+                B.deserialize(corrupted)
+        nested = B.BINARY_MAGIC + bytes([B.BINARY_VERSION]) + \
+            (b"L" + B.SIZE.pack(1)) * 1000
+        with self.assertRaises(ValueError):
+            B.loads(nested)
+
+    def test_validateMany(self):
+        blocks = [B.create("author", i) for i in range(5)]
+        blocks[1][B.DATA] = "corrupted"
+        items = blocks + [{}, "x", B.serialize(blocks[0]), b"x"]
+        self.assertEqual(B.validate_many(items),
+                         [True, False, True, True, True, False, False, True,
+                          False])
+        self.assertEqual(B.validate_many([]), [])
+
+    def test_validateMany_workers(self):
+        count = B.PARALLEL_MIN_BLOCKS + 10
+        blocks = [B.create("author", {"i": i}) for i in range(count)]
+        raws = [B.dumps(block) for block in blocks]
+        blocks[3][B.DATA] = {"i": -1}
+        raws[7] = raws[7][:-1]
+        raws[8] = B.dumps(blocks[8], B.CODEC_PICKLE)
+
+        results = B.validate_many(blocks, workers=2)
+        self.assertEqual(results.index(False), 3)
+        self.assertEqual(results.count(False), 1)
+        results = B.validate_many(raws, workers=2, allow_pickle=False)
+        self.assertEqual([i for (i, valid) in enumerate(results)
+                          if not valid], [7, 8])
+        self.assertTrue(B.validation_cache.contains_raw(raws[0]))
+
+    def test_validateMany_workers_notPicklable(self):
+        count = B.PARALLEL_MIN_BLOCKS + 10
+        raws = [B.dumps(B.create("author", {"i": i})) for i in range(count)]
+        views = [memoryview(raw) for raw in raws]
+        views[5] = views[5][:-1]
+        blocks = [B.create("author", i, {"lock": threading.Lock()})
+                  for i in range(count)]
+        blocks[9][B.DATA] = -1
+        B.validation_cache.clear()
+        for (items, invalid) in [(views, 5), (blocks, 9)]:
+            results = B.validate_many(items, workers=2)
+            self.assertEqual([i for (i, valid) in enumerate(results)
+                              if not valid], [invalid])
+        self.assertTrue(B.validation_cache.contains_raw(views[0]))
+
+    def test_shutdownWorkers(self):
+        raws = [B.dumps(B.create("author", i))
+                for i in range(B.PARALLEL_MIN_BLOCKS)]
+        self.assertTrue(all(B.validate_many(raws, workers=2)))
+        B.shutdown_workers()
+        self.assertEqual(B._executors, {})
+        B.validation_cache.clear()
+        self.assertTrue(all(B.validate_many(raws, workers=2)))
+
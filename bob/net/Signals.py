@@ -1,14 +1,31 @@
+import struct
 import uuid
 import json
+import zlib
 
 SIGNAL_START = "<BOB"
 SIGNAL_END = "BOB>"
 VERSION = "0.11"
 
+# wire formats of Signal.bytes()
+WIRE_V1 = 1  # VERSION "0.11": markers and separators, json channels
+WIRE_V2 = 2  # fixed binary header, then lengths, channels and data
+
 ENCODE = "encode"
 DECODE = "decode"
 
 SEPARATOR = ")--(".encode('utf8')
+FRAME_START = SIGNAL_START.encode('utf8')
+FRAME_END = SEPARATOR + SIGNAL_END.encode('utf8')
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+# WIRE_V2 header: magic, version, id, channel count, data length and the
+# crc32 of these fields (to resync on garbage), followed by the length of
+# each channel, the utf-8 channels and the data
+V2_START = b"BOB" + bytes([WIRE_V2])
+V2_HEADER = struct.Struct("<4s16sHII")
+V2_HEADER_CRC = V2_HEADER.size - 4  # bytes covered by the crc
+V2_CHANNEL_LENGTH = struct.Struct("<H")
 
 
 # TODO: add support: for encryption, for host,service
@@ -19,30 +36,71 @@ class Signal(object):
         type: string representing the type
         bytes: binary payload TODO: set type
         id: UUID string, automatically generated
+
+    wire: format of bytes() (WIRE_V1 by default, or the wire format of
+          the parsed signal). parse() detects the format, the data of a
+          parsed WIRE_V2 signal is a memoryview of the frame.
+
+    Signals are immutable: equal and hashed by id, channel is a tuple.
+    bytes() is encoded once per wire format, a parsed signal re-emits
+    the frame it was parsed from.
     """
+    __slots__ = ("id", "channel", "data", "metadata", "wire", "_encoded")
 
-    def __init__(self, id=None, channel=None, data=None, metadata=None):
+    def __init__(self, id=None, channel=None, data=None, metadata=None,
+                 wire=WIRE_V1):
         if data is None or channel is None:
             raise ValueError("channel and data are required for Signal")
 
         if isinstance(channel, str):
             channel = [channel]
 
-        if not isinstance(channel, list) or len(channel) == 0:
+        if not isinstance(channel, (list, tuple)) or len(channel) == 0:
             raise TypeError("channel must be non-empty list of strings")
 
-        if not isinstance(data, bytes):
+        if not isinstance(data, (bytes, memoryview)):
             raise TypeError("Data must be bytes, not [%s]" % type(data))
 
-        self.id = id or uuid.uuid4().bytes  # 16 bytes
-        self.data = data
-        self.channel = channel
-        self.metadata = None  # unused
+        init = super(Signal, self).__setattr__
+        init("id", id or uuid.uuid4().bytes)  # 16 bytes
+        init("data", data)
+        init("channel", tuple(channel))
+        init("metadata", None)  # unused
+        init("wire", wire)
+        init("_encoded", {})  # wire -> bytes()
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Signal is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Signal is immutable")
 
     @staticmethod
     def parse(data):
-        if type(data) != bytes:
+        if type(data) not in (bytes, bytearray, memoryview):
             return -1
+        if type(data) is memoryview and data.readonly and \
+                type(data.obj) is bytes and data.nbytes == len(data.obj):
+            data = data.obj
+        elif type(data) is not bytes:
+            data = bytes(data)  # the frame is kept by the signal
+        if data[:len(V2_START)] == V2_START:
+            signal = Signal.__parseV2(memoryview(data))
+        else:
+            signal = Signal.__parseV1(data)
+        if isinstance(signal, Signal):
+            signal._encoded[signal.wire] = data
+        return signal
+
+    @staticmethod
+    def __parseV1(data):
+        try:
+            return Signal.__fieldsV1(data)
+        except (UnicodeDecodeError, ValueError, TypeError):
+            return -4  # not utf-8, channel not a json list...
+
+    @staticmethod
+    def __fieldsV1(data):
         if data[:len(SIGNAL_START)].decode() != SIGNAL_START:
             return -2
         if data[-1 * len(SIGNAL_END):].decode() != SIGNAL_END:
@@ -59,28 +117,190 @@ class Signal(object):
         return Signal(id=parts[1], channel=json.loads(parts[2].decode()),
                       data=parts[3])
 
-    def bytes(self):
+    @staticmethod
+    def __parseV2(view):
+        """ Parse a WIRE_V2 frame, the data is not copied """
+        if len(view) < V2_HEADER.size:
+            return -4
+        (_, id, channel_count, data_length, crc) = \
+            V2_HEADER.unpack_from(view)
+        if zlib.crc32(view[:V2_HEADER_CRC]) != crc:
+            return -4
+        offset = V2_HEADER.size + channel_count * V2_CHANNEL_LENGTH.size
+        if channel_count == 0 or offset > len(view):
+            return -4
+        lengths = struct.unpack_from("<%dH" % channel_count, view,
+                                     V2_HEADER.size)
+        if offset + sum(lengths) + data_length != len(view):
+            return -4
+        channel = []
+        try:
+            for length in lengths:
+                channel.append(str(view[offset:offset + length], "utf-8"))
+                offset += length
+        except UnicodeDecodeError:
+            return -4
+        return Signal(id=id, channel=channel, data=view[offset:],
+                      wire=WIRE_V2)
+
+    def bytes(self, wire=None):
+        wire = wire or self.wire
+        encoded = self._encoded.get(wire)
+        if encoded is None:
+            encoded = self._encoded[wire] = self.__encode(wire)
+        return encoded
+
+    def __encode(self, wire):
+        if wire == WIRE_V2:
+            return self.__bytesV2()
+        if wire != WIRE_V1:
+            raise ValueError("unknown wire format [%s]" % wire)
         packet_parts = [SIGNAL_START,
                         VERSION,
                         self.id,
                         json.dumps(self.channel),
                         self.data,
                         SIGNAL_END]
-        return SEPARATOR.join([part if isinstance(part, bytes) else part.encode('utf-8')
+        return SEPARATOR.join([part if isinstance(part, (bytes, memoryview))
+                               else part.encode('utf-8')
                                for part in packet_parts])
 
+    def __bytesV2(self):
+        if len(self.id) != 16:
+            raise ValueError("id must be 16 bytes")
+        channels = [channel.encode("utf-8") for channel in self.channel]
+        header = V2_HEADER.pack(V2_START, self.id, len(channels),
+                                len(self.data), 0)[:V2_HEADER_CRC]
+        return b"".join(
+            [header, struct.pack("<I", zlib.crc32(header))] +
+            [V2_CHANNEL_LENGTH.pack(len(channel)) for channel in channels] +
+            channels + [self.data])
+
     def __repr__(self):
         raise NotImplementedError("This operation is not supported")
 
     def __eq__(self, other):
-        # return other is not None and self.id == other.id
-        if other is None or not isinstance(other, Signal):
-            return TypeError("Not a signal [%s]" % other)
-
-        return self.bytes() == other.bytes()
+        if not isinstance(other, Signal):
+            return NotImplemented
+        return self.id == other.id
 
     def __ne__(self, other):
-        return not self.__eq__(other)
+        if not isinstance(other, Signal):
+            return NotImplemented
+        return self.id != other.id
 
     def __hash__(self):
-        return self.id
+        return hash(self.id)
+
+
+class SignalDecoder(object):
+    """ Decodes the Signals of a byte stream fed by chunks
+
+    Frames may be split over several chunks or several frames received in
+    one chunk, a partial frame is kept until its end is received. Bytes
+    out of frames are skipped (resync on the next frame start), as well
+    as a frame larger than max_frame_size. Both wire formats are decoded.
+
+    Usage:
+        decoder = SignalDecoder()
+        for signal in decoder.feed(socket.recv(4096)): ...
+    """
+
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray()
+        self.dropped = 0  # bytes skipped
+        self._scan = 0  # where to look for the end of the pending frame
+
+    def feed(self, data):
+        """ Append data (bytes-like), returns the list of decoded Signals """
+        self.buffer += data
+        signals = []
+        while self.__resync():
+            size = len(self.buffer)
+            signal = self.__frame()
+            if signal is not None:
+                signals.append(signal)
+            elif len(self.buffer) < size:
+                continue  # not a frame, dropped
+            elif size <= self.max_frame_size:
+                break  # wait for the end of the frame
+            else:
+                self.__drop(1)  # too large, look for the next frame
+        return signals
+
+    def __resync(self):
+        """ Drop the bytes before the next frame start, returns False if
+        there is none """
+        starts = [start for start in (self.buffer.find(FRAME_START),
+                                      self.buffer.find(V2_START))
+                  if start >= 0]
+        start = min(starts) if starts else -1
+        if start < 0:
+            # keep what may be the beginning of a frame start
+            self.__drop(max(0, len(self.buffer) - len(FRAME_START) + 1))
+            return False
+        self.__drop(start)
+        return True
+
+    def __frame(self):
+        """ Return the Signal at the start of the buffer (removed from the
+        buffer), None if its end is not received yet """
+        if self.buffer.startswith(V2_START):
+            return self.__frameV2()
+        position = max(self._scan, len(FRAME_START))
+        while True:
+            end = self.buffer.find(FRAME_END, position)
+            if end < 0:
+                self._scan = max(len(FRAME_START),
+                                 len(self.buffer) - len(FRAME_END) + 1)
+                return None
+            end += len(FRAME_END)
+            # a frame start closer to the end means the bytes before it
+            # are garbage or a truncated frame
+            starts = [0, self.buffer.rfind(FRAME_START, 0,
+                                           end - len(FRAME_END))]
+            for start in sorted(set(starts)):
+                signal = Signal.parse(bytes(self.buffer[start:end]))
+                if isinstance(signal, Signal):
+                    self.__drop(start)
+                    del self.buffer[:end - start]
+                    self._scan = 0
+                    return signal
+            # not a signal (a V1 frame can not hold FRAME_END), skipped
+            self.__drop(end)
+            return None
+
+    def __frameV2(self):
+        if len(self.buffer) < V2_HEADER.size:
+            return None
+        (_, _, channel_count, data_length, crc) = \
+            V2_HEADER.unpack_from(self.buffer)
+        if zlib.crc32(self.buffer[:V2_HEADER_CRC]) != crc:
+            self.__drop(1)  # not a frame
+            return None
+        lengths_end = V2_HEADER.size + \
+            channel_count * V2_CHANNEL_LENGTH.size
+        if len(self.buffer) < lengths_end:
+            return None
+        end = lengths_end + data_length + sum(struct.unpack_from(
+            "<%dH" % channel_count, self.buffer, V2_HEADER.size))
+        if end > self.max_frame_size:
+            self.__drop(1)  # not a frame or too large
+            return None
+        if len(self.buffer) < end:
+            return None
+        signal = Signal.parse(bytes(self.buffer[:end]))
+        if not isinstance(signal, Signal):
+            self.__drop(end)  # valid header, invalid channels
+            return None
+        del self.buffer[:end]
+        self._scan = 0
+        return signal
+
+    def __drop(self, count):
+        if count > 0:
+            del self.buffer[:count]
+            self.dropped += count
+            self._scan = 0
+
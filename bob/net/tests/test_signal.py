@@ -1,5 +1,6 @@
 import unittest
-from bob.net import Signal
+from bob.net import Signal, SignalDecoder, WIRE_V1, WIRE_V2
+from bob.net.Signals import SEPARATOR, V2_HEADER, V2_CHANNEL_LENGTH
 
 
 class TestSignal(unittest.TestCase):
@@ -16,6 +17,53 @@ class TestSignal(unittest.TestCase):
             parsed = Signal.parse(signal.bytes())
             self.assertIsInstance(parsed, Signal)
             self.assertEqual(signal, parsed)
+            self.assertEqual(parsed.data, signal.data)
+
+    def test_parse_v2(self):
+        signal = Signal(data=b"x)--(BOB>" * 3, channel=["A", "\u00e9"])
+        raw = signal.bytes(WIRE_V2)
+        parsed = Signal.parse(raw)
+        self.assertIsInstance(parsed, Signal)
+        self.assertEqual(parsed.id, signal.id)
+        self.assertEqual(parsed.channel, signal.channel)
+        self.assertIsInstance(parsed.data, memoryview)
+        self.assertIs(parsed.data.obj, raw)
+        self.assertEqual(parsed.data, signal.data)
+        self.assertEqual(parsed.wire, WIRE_V2)
+        self.assertEqual(parsed.bytes(), raw)
+        # WIRE_V1 breaks on data holding its separator
+        self.assertNotIsInstance(Signal.parse(parsed.bytes(WIRE_V1)), Signal)
+        parsed = Signal.parse(Signal(data=b"x", channel="A").bytes(WIRE_V2))
+        self.assertEqual(Signal.parse(parsed.bytes(WIRE_V1)).wire, WIRE_V1)
+
+    def test_parse_v2_invalid(self):
+        raw = Signal(data=b"xyz", channel=["A"]).bytes(WIRE_V2)
+        corrupted = bytearray(raw)
+        corrupted[6] ^= 1  # id, covered by the header crc
+        for invalid in [raw[:-1], raw + b"x", raw[:20], bytes(corrupted)]:
+            self.assertNotIsInstance(Signal.parse(invalid), Signal)
+        with self.assertRaises(ValueError):
+            Signal(data=b"xyz", channel=["A"]).bytes(3)
+
+    def test_value(self):
+        signal = Signal(data=b"xyz", channel=["A"])
+        raw = signal.bytes()
+        self.assertIs(signal.bytes(), raw)
+        self.assertIs(Signal.parse(raw).bytes(), raw)
+        self.assertIs(Signal.parse(memoryview(raw)).bytes(), raw)
+        same = Signal(id=signal.id, data=b"other", channel="B")
+        self.assertEqual(signal, same)
+        self.assertNotEqual(signal, Signal(data=b"xyz", channel=["A"]))
+        self.assertNotEqual(signal, raw)
+        self.assertEqual(len({signal, same, Signal.parse(raw)}), 1)
+        self.assertEqual({signal: 1}[Signal.parse(raw)], 1)
+        with self.assertRaises(AttributeError):
+            signal.data = b"abc"
+        with self.assertRaises(AttributeError):
+            signal.other = 1
+        with self.assertRaises(AttributeError):
+            del signal.id
+        self.assertEqual(signal.channel, ("A",))
 
     def test_constructor_raise(self):
         with self.assertRaises(ValueError):
@@ -26,3 +74,83 @@ class TestSignal(unittest.TestCase):
             Signal(channel=bytes(1))
         with self.assertRaises(TypeError):
             Signal(data=[1], channel=["A"])
+
+
+class TestSignalDecoder(unittest.TestCase):
+
+    def setUp(self):
+        self.signals = [Signal(data=bytes([i]) * (i * 1000 + 1),
+                               channel=["C%d" % i]) for i in range(4)]
+        self.stream = b"\n\n".join(signal.bytes() for signal in self.signals)
+
+    def decode(self, stream, chunk_size, decoder=None):
+        decoder = decoder or SignalDecoder()
+        signals = []
+        for i in range(0, len(stream), chunk_size):
+            signals += decoder.feed(stream[i:i + chunk_size])
+        return signals
+
+    def test_feed(self):
+        for chunk_size in [1, 7, 4096, len(self.stream)]:
+            self.assertEqual([s.bytes() for s
+                              in self.decode(self.stream, chunk_size)],
+                             [s.bytes() for s in self.signals])
+
+    def test_feed_partial(self):
+        decoder = SignalDecoder()
+        frame = self.signals[1].bytes()
+        self.assertEqual(decoder.feed(frame[:-1]), [])
+        self.assertEqual(len(decoder.buffer), len(frame) - 1)
+        self.assertEqual(decoder.feed(frame[-1:])[0].id, self.signals[1].id)
+        self.assertEqual(len(decoder.buffer), 0)
+
+    def test_feed_garbage(self):
+        stream = b"junk<BO" + self.signals[0].bytes() + b"<BOB)--(cut" + \
+            self.signals[1].bytes() + b"trailing<B"
+        decoder = SignalDecoder()
+        signals = self.decode(stream, 3, decoder)
+        self.assertEqual([s.id for s in signals],
+                         [self.signals[0].id, self.signals[1].id])
+        self.assertEqual(len(decoder.buffer), len(b"<BOB") - 1)
+
+    def test_feed_invalidFrames(self):
+        def frame(channel):
+            return SEPARATOR.join([b"<BOB", b"0.11", b"i" * 16, channel,
+                                   b"data", b"BOB>"])
+        invalids = [frame(b"[oops"), frame(b"\xff\xfe"), frame(b"5"),
+                    frame(b'{"a": 1}'), b"<BOB\xff)--(BOB>"]
+        v2 = bytearray(Signal(data=b"x", channel="A").bytes(WIRE_V2))
+        v2[V2_HEADER.size + V2_CHANNEL_LENGTH.size] = 0xff  # channel
+        invalids.append(bytes(v2))
+        for invalid in invalids:
+            self.assertNotIsInstance(Signal.parse(invalid), Signal)
+            decoder = SignalDecoder()
+            stream = invalid + self.signals[0].bytes()
+            self.assertEqual([s.id for s in self.decode(stream, 7, decoder)],
+                             [self.signals[0].id])
+            self.assertEqual(decoder.dropped, len(invalid))
+            self.assertEqual(len(decoder.buffer), 0)
+            # the invalid frame alone is skipped too
+            decoder = SignalDecoder()
+            self.assertEqual(decoder.feed(invalid), [])
+            self.assertEqual(decoder.dropped, len(invalid))
+
+    def test_feed_maxFrameSize(self):
+        decoder = SignalDecoder(max_frame_size=2000)
+        self.assertEqual(self.decode(self.signals[3].bytes(), 100, decoder),
+                         [])
+        self.assertLessEqual(len(decoder.buffer), 2000)
+        self.assertEqual(decoder.feed(self.signals[1].bytes())[0].id,
+                         self.signals[1].id)
+
+    def test_feed_v2(self):
+        stream = b"junk\x00BOB\x02" + b"".join(
+            signal.bytes(WIRE_V2) + b"\n\n" + signal.bytes()
+            for signal in self.signals)
+        for chunk_size in [1, 100, len(stream)]:
+            signals = self.decode(stream, chunk_size)
+            self.assertEqual([(s.id, s.wire) for s in signals],
+                             [(signal.id, wire) for signal in self.signals
+                              for wire in (WIRE_V2, WIRE_V1)])
+            self.assertEqual(signals[2].data, self.signals[1].data)
+
@@ -0,0 +1,154 @@
+import bisect
+import math
+import threading
+import time
+from collections import deque
+
+try:
+    import numpy
+except ImportError:  # optional, aggregates are computed in Python
+    numpy = None
+
+
+def percentile(ordered, p):
+    """ p-th percentile of sorted values, interpolated like numpy """
+    if not ordered:
+        return None
+    rank = (len(ordered) - 1) * p / 100.0
+    low = int(math.floor(rank))
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values, percentiles=(), duration=None):
+    """ Return the count, sum, mean, min, max, rate and percentiles of
+    numeric values
+
+    values: list, array or numpy array (aggregated with numpy)
+    percentiles: eg. [50, 99] -> "p50", "p99" entries
+    duration: seconds covered by the values, rate is count / duration
+    """
+    count = len(values)
+    summary = {"count": count, "sum": 0, "mean": None, "min": None,
+               "max": None, "rate": None}
+    if duration:
+        summary["rate"] = count / duration
+    for p in percentiles:
+        summary["p%s" % p] = None
+    if count == 0:
+        return summary
+
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        summary["sum"] = values.sum().item()
+        summary["min"] = values.min().item()
+        summary["max"] = values.max().item()
+        if percentiles:
+            results = numpy.percentile(values, list(percentiles))
+            for (p, result) in zip(percentiles, results):
+                summary["p%s" % p] = result.item()
+    else:
+        summary["sum"] = sum(values)
+        summary["min"] = min(values)
+        summary["max"] = max(values)
+        if percentiles:
+            ordered = sorted(values)
+            for p in percentiles:
+                summary["p%s" % p] = percentile(ordered, p)
+    summary["mean"] = summary["sum"] / count
+    return summary
+
+
+class RollingAggregate(object):
+    """ Aggregates of the last values of the channel at path
+
+    Created by Store.rolling(), subscribed to path with onUpdate(). It
+    keeps the values of the window and running sums: reading the
+    aggregates does not rescan the channel.
+        last: number of values of the window
+        window: max age in seconds of the values of the window
+
+    min and max are kept in monotonic queues (amortized O(1) per add),
+    percentiles in a sorted list.
+    Stop: store.unsubscribe(rolling.path, rolling.onUpdate)
+    """
+
+    def __init__(self, path, last=None, window=None, percentiles=()):
+        if last is None and window is None:
+            raise ValueError("last or window must be set")
+        self.path = path
+        self.last = last
+        self.window = window
+        self.percentiles = list(percentiles)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def onUpdate(self, method, path, data):
+        """ Store subscription callback """
+        if path != self.path:
+            return
+        if method == "add":  # Store.ADD_METHOD
+            self.add(data)
+        else:
+            self.reset(data if isinstance(data, list) else ())
+
+    def reset(self, values=(), now=None):
+        """ Restart the window with values (added at [now]) """
+        now = now or time.time()
+        with self._lock:
+            self.entries = deque()  # (time, value)
+            self.sum = 0
+            self.mins = deque()  # increasing values of the window
+            self.maxs = deque()  # decreasing values of the window
+            self.ordered = []
+        for value in values:
+            self.add(value, now)
+
+    def add(self, value, now=None):
+        now = now or time.time()
+        with self._lock:
+            self.__add(value, now)
+
+    def stats(self, now=None):
+        """ Return the aggregates of the window, see summarize() """
+        with self._lock:
+            self.__expire(now or time.time())
+            count = len(self.entries)
+            summary = {
+                "count": count,
+                "sum": self.sum,
+                "mean": self.sum / count if count else None,
+                "min": self.mins[0] if count else None,
+                "max": self.maxs[0] if count else None,
+                "rate": count / self.window if self.window else None
+            }
+            for p in self.percentiles:
+                summary["p%s" % p] = percentile(self.ordered, p)
+        return summary
+
+    def __add(self, value, now):
+        self.entries.append((now, value))
+        self.sum += value
+        while self.mins and self.mins[-1] > value:
+            self.mins.pop()
+        self.mins.append(value)
+        while self.maxs and self.maxs[-1] < value:
+            self.maxs.pop()
+        self.maxs.append(value)
+        if self.percentiles:
+            bisect.insort(self.ordered, value)
+        self.__expire(now)
+
+    def __expire(self, now):
+        """ Drop the values out of the window """
+        while self.entries and (
+                (self.last is not None and len(self.entries) > self.last) or
+                (self.window is not None and
+                 self.entries[0][0] < now - self.window)):
+            (_, value) = self.entries.popleft()
+            self.sum -= value
+            if self.mins[0] == value:
+                self.mins.popleft()
+            if self.maxs[0] == value:
+                self.maxs.popleft()
+            if self.percentiles:
+                del self.ordered[bisect.bisect_left(self.ordered, value)]
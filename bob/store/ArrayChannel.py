@@ -0,0 +1,139 @@
+import time
+from array import array
+from bob.store.Channel import Channel
+
+try:
+    import numpy
+except ImportError:  # optional, views are memoryviews without numpy
+    numpy = None
+
+DEFAULT_TYPECODE = "d"
+TIME_TYPECODE = "d"
+
+
+class ArrayChannel(Channel):
+    """ Channel of numbers packed in typed arrays (see the array module)
+
+    Each chunk is a preallocated array of [typecode] ("d": float,
+    "q": int...), values cost their item size instead of a boxed Python
+    object. Reading returns Python ints and floats, thus an ArrayChannel
+    is a drop-in Channel. Bools are stored as ints.
+
+    timestamps: keep the append time of each value in a parallel column
+
+    Usage:
+        .tailTimes(count) -> append times of the last [count] values
+        .countSince(timestamp) -> number of values appended since
+                                  [timestamp], O(log n)
+        .view(count) -> last [count] values without copying them when
+                        they are in the same chunk (numpy array when
+                        numpy is installed, memoryview otherwise).
+                        A view shows 0 once its values are evicted.
+    """
+    EMPTY = 0
+
+    def __init__(self, values=None, typecode=DEFAULT_TYPECODE,
+                 timestamps=False, **args):
+        if array(typecode).typecode in ("u", "w"):  # ValueError if unknown
+            raise ValueError("typecode must be numeric, not [%s]" % typecode)
+        self.typecode = typecode
+        self.timestamps = timestamps
+        self.time_chunks = []
+        self.fill = 0  # values in the last chunk
+        super(ArrayChannel, self).__init__(values, **args)
+
+    def rewrite(self, values):
+        """ (Overide) The timestamps of the values are reset """
+        self.time_chunks = []
+        super(ArrayChannel, self).rewrite(values)
+
+    def tail(self, count):
+        if count <= 0:
+            return []
+        return self.__values(self.chunks, max(self.offset,
+                                              self.nextSeq() - count))
+
+    def tolist(self):
+        return self.__values(self.chunks, self.offset)
+
+    def tailTimes(self, count):
+        """ Return the append times of the last [count] values """
+        if not self.timestamps:
+            raise ValueError("channel has no timestamps")
+        if count <= 0:
+            return []
+        return self.__values(self.time_chunks, max(self.offset,
+                                                   self.nextSeq() - count))
+
+    def countSince(self, timestamp):
+        """ Return the number of the last values appended at or after
+        timestamp (binary search of the append times) """
+        if not self.timestamps:
+            raise ValueError("channel has no timestamps")
+        (low, high) = (self.offset, self.nextSeq())
+        while low < high:
+            middle = (low + high) // 2
+            (chunk_index, index) = divmod(middle - self.offset + self.head,
+                                          self.chunk_size)
+            if self.time_chunks[chunk_index][index] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return self.nextSeq() - low
+
+    def view(self, count, times=False):
+        """ Return the last [count] values, (values, times) with times """
+        seq = max(self.offset, self.nextSeq() - count)
+        values = self.__view(self.chunks, self.typecode, seq)
+        if not times:
+            return values
+        if not self.timestamps:
+            raise ValueError("channel has no timestamps")
+        return (values, self.__view(self.time_chunks, TIME_TYPECODE, seq))
+
+    def _push(self, value, timestamp):
+        if not self.chunks or self.fill >= self.chunk_size:
+            self.chunks.append(array(self.typecode, [0]) * self.chunk_size)
+            if self.timestamps:
+                self.time_chunks.append(
+                    array(TIME_TYPECODE, [0]) * self.chunk_size)
+            self.fill = 0
+        self.chunks[-1][self.fill] = value  # TypeError if not a number
+        if self.timestamps:
+            self.time_chunks[-1][self.fill] = timestamp or time.time()
+        self.fill += 1
+
+    def _popChunk(self):
+        super(ArrayChannel, self)._popChunk()
+        if self.timestamps:
+            self.time_chunks.pop(0)
+
+    def __spans(self, seq):
+        """ Yield (chunk index, start, stop) of the values from seq """
+        end = self.nextSeq()
+        while seq < end:
+            (chunk_index, start) = divmod(seq - self.offset + self.head,
+                                          self.chunk_size)
+            stop = min(self.chunk_size, start + end - seq)
+            yield (chunk_index, start, stop)
+            seq += stop - start
+
+    def __values(self, chunks, seq):
+        values = []
+        for (chunk_index, start, stop) in self.__spans(seq):
+            values.extend(chunks[chunk_index][start:stop].tolist())
+        return values
+
+    def __view(self, chunks, typecode, seq):
+        spans = list(self.__spans(seq))
+        if len(spans) == 1:
+            (chunk_index, start, stop) = spans[0]
+            view = memoryview(chunks[chunk_index])[start:stop]
+        else:
+            view = array(typecode)
+            for (chunk_index, start, stop) in spans:
+                view.extend(chunks[chunk_index][start:stop])
+            view = memoryview(view)
+        if numpy is not None:
+            return numpy.frombuffer(view, dtype=typecode)
+        return view
@@ -0,0 +1,289 @@
+import sys
+import time
+from collections import deque
+from contextlib import nullcontext
+
+CHUNK_SIZE = 1024
+
+
+def sizeof(value):
+    """ Approximate size of a value in bytes, used by Retention.max_bytes """
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(key) + sizeof(item)
+                                          for (key, item) in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sizeof(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class Channel(object):
+    """ Append-optimized list of values stored at a store path
+
+    Values are kept in fixed-size chunks (a segmented log), appending
+    never copies the previous values thus filling a channel is O(n).
+
+    Each value has a monotonic sequence number, the first value
+    of the channel has the sequence number [offset].
+
+    With a Retention policy, the oldest values are evicted on append:
+    the chunks act as a ring buffer, evicted slots are released and
+    a chunk is dropped once all its values are evicted. The most recent
+    value is never evicted.
+
+    Indexes (see Index) map field values to sequence numbers, they are
+    updated on append and eviction.
+
+    With a PayloadPool, the pool references of the values are acquired
+    on append and released on eviction, rewrite() and drop().
+
+    Subclasses change how values are stored in the chunks with _push()
+    (see ArrayChannel).
+
+    Usage:
+        .append(value) -> amortized O(1)
+        .tail(count) -> list of the last [count] values, O(count)
+        .since(seq) -> iterator from sequence number [seq], O(k)
+        .tolist() -> copy of all the values, O(n)
+        .at(seq) -> value with sequence number [seq], O(1)
+    """
+    EMPTY = None  # value of the evicted slots
+
+    def __init__(self, values=None, chunk_size=CHUNK_SIZE, retention=None,
+                 indexes=None, pool=None):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        self.chunk_size = chunk_size
+        self.chunks = []
+        self.length = 0
+        self.offset = 0
+        self.head = 0  # evicted slots at the start of the first chunk
+        self.evicted = 0
+        self.bytes = 0
+        self.sizes = None  # per value size, only kept for max_bytes
+        self.times = None  # per value append time, only kept for max_age
+        self.retention = None
+        self.indexes = {}  # Map<field, Index>
+        self.pool = pool
+        # shared with the replacements continuing the sequence numbers
+        self.lineage = object()
+        for index in indexes or []:
+            self.addIndex(index)
+        if retention is not None:
+            self.setRetention(retention)
+        if values is not None:
+            self.extend(values)
+
+    def setRetention(self, retention):
+        """ Apply a Retention policy (or None) to the current values """
+        self.retention = retention
+        values = list(self)
+        self.sizes = None
+        self.times = None
+        self.bytes = 0
+        if retention is not None and retention.max_bytes is not None:
+            self.sizes = deque(sizeof(value) for value in values)
+            self.bytes = sum(self.sizes)
+        if retention is not None and retention.max_age is not None:
+            now = time.time()
+            self.times = deque(now for _ in values)
+        self.enforce()
+
+    def addIndex(self, index):
+        """ Index the current and future values, replaces the index of
+        the same field """
+        for (seq, value) in enumerate(self, self.offset):
+            index.add(seq, value)
+        self.indexes[index.field] = index
+
+    def dropIndex(self, field):
+        return self.indexes.pop(field, None)
+
+    def append(self, value, timestamp=None):
+        self._push(value, timestamp)
+        self.length += 1
+        for index in self.indexes.values():
+            index.add(self.offset + self.length - 1, value)
+        if self.pool is not None:
+            self.pool.acquire(value)
+
+        if self.retention is not None:
+            if self.sizes is not None:
+                size = sizeof(value)
+                self.sizes.append(size)
+                self.bytes += size
+            if self.times is not None:
+                self.times.append(timestamp or time.time())
+            self.enforce()
+
+    def rewrite(self, values):
+        """ Replace all the values, keeping the next sequence number
+
+        Cursors positioned at the end of the channel stay valid.
+        """
+        next_seq = self.nextSeq()
+        retention = self.retention
+        indexes = self.indexes.values()
+        self.drop()
+        self.retention = None
+        self.indexes = {}
+        self.chunks = []
+        self.length = 0
+        self.head = 0
+        self.extend(values)
+        self.offset = next_seq - self.length
+        self.setRetention(retention)
+        for index in indexes:
+            self.addIndex(type(index)(index.field))
+
+    def drop(self):
+        """ Release the pool references of the values, once the channel
+        is discarded or rewritten """
+        if self.pool is not None:
+            for value in self:
+                self.pool.release(value)
+
+    def _push(self, value, timestamp):
+        """ Store value in the last chunk """
+        if not self.chunks or len(self.chunks[-1]) >= self.chunk_size:
+            self.chunks.append([])
+        self.chunks[-1].append(value)
+
+    def _popChunk(self):
+        """ Drop the first chunk, all its values are evicted """
+        self.chunks.pop(0)
+
+    def extend(self, values):
+        for value in values:
+            self.append(value)
+
+    def enforce(self, now=None):
+        """ Evict the oldest values breaking the retention policy
+
+        Returns the number of evicted values
+        """
+        retention = self.retention
+        if retention is None:
+            return 0
+
+        now = now or time.time()
+        evicted = 0
+        while self.length > 1 and self.__isOverdue(retention, now):
+            self.__evictFirst()
+            evicted += 1
+        return evicted
+
+    def tail(self, count):
+        """ Return the last [count] values, oldest first """
+        if count <= 0:
+            return []
+        parts = []
+        missing = min(count, self.length)
+        for chunk in reversed(self.chunks):
+            if missing <= 0:
+                break
+            part = chunk[-missing:]
+            parts.append(part)
+            missing -= len(part)
+
+        values = []
+        for part in reversed(parts):
+            values.extend(part)
+        return values
+
+    def since(self, seq, end=None, lock=None):
+        """ Iterate over values with sequence number in [seq, end[
+
+        [end] defaults to the sequence number of the next append, values
+        appended while iterating are thus not returned. Values evicted
+        while iterating are skipped.
+
+        lock: context manager held while reading each chunk
+        """
+        end = self.nextSeq() if end is None else min(end, self.nextSeq())
+        return self.__since(seq, end, lock or nullcontext())
+
+    def at(self, seq):
+        """ Return the value with sequence number [seq] """
+        if seq < self.offset or seq >= self.nextSeq():
+            raise IndexError("seq %d not in [%d, %d[" %
+                             (seq, self.offset, self.nextSeq()))
+        (chunk_index, index) = divmod(seq - self.offset + self.head,
+                                      self.chunk_size)
+        return self.chunks[chunk_index][index]
+
+    def nextSeq(self):
+        """ Return the sequence number of the next appended value """
+        return self.offset + self.length
+
+    def tolist(self):
+        values = []
+        for (pos, chunk) in enumerate(self.chunks):
+            values.extend(chunk[self.head:] if pos == 0 else chunk)
+        return values
+
+    def __since(self, seq, end, lock):
+        while True:
+            with lock:
+                seq = max(seq, self.offset)
+                if seq >= end:
+                    return
+                (chunk_index, index) = divmod(seq - self.offset + self.head,
+                                              self.chunk_size)
+                if chunk_index >= len(self.chunks):
+                    return
+                part = self.chunks[chunk_index][index:index + end - seq]
+            seq += len(part)
+            for value in part:
+                yield value
+
+    def __isOverdue(self, retention, now):
+        """ Return True if the oldest value breaks the retention policy """
+        if retention.max_entries is not None and \
+                self.length > retention.max_entries:
+            return True
+        if self.sizes is not None and self.bytes > retention.max_bytes:
+            return True
+        if self.times is not None and self.times[0] < now - retention.max_age:
+            return True
+        return False
+
+    def __evictFirst(self):
+        for index in self.indexes.values():
+            index.remove(self.offset, self.chunks[0][self.head])
+        if self.pool is not None:
+            self.pool.release(self.chunks[0][self.head])
+        self.chunks[0][self.head] = self.EMPTY
+        self.head += 1
+        self.length -= 1
+        self.offset += 1
+        self.evicted += 1
+        size = 0
+        if self.sizes is not None:
+            size = self.sizes.popleft()
+            self.bytes -= size
+        if self.times is not None:
+            self.times.popleft()
+        if self.head >= self.chunk_size:
+            self._popChunk()
+            self.head = 0
+        self.retention.evicted += 1
+        self.retention.evicted_bytes += size
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return self.since(self.offset)
+
+    def __eq__(self, other):
+        if isinstance(other, Channel):
+            other = other.tolist()
+        return self.tolist() == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return repr(self.tolist())
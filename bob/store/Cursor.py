@@ -0,0 +1,89 @@
+from bob.store.Channel import Channel
+
+
+class Cursor(object):
+    """ Read position on a store channel
+
+    A cursor keeps the sequence number of the next value to read, thus
+    reading new values is O(k) for k new values and does not depend on
+    values being unique (unlike Store.getSince).
+
+    When the channel is replaced (put, clear), the cursor reads the new
+    channel from its first value (but for Store.setTyped, which keeps
+    the sequence numbers). Values evicted by a Retention policy before
+    being read are counted in [missed].
+
+    Usage:
+        cursor = store.cursor("path")
+        for value in cursor.readNew():
+            ...
+    """
+
+    def __init__(self, store, path, from_start=True):
+        self.store = store
+        self.path = path
+        self.channel = None
+        self.lineage = None  # Channel.lineage of the read channel
+        self.seq = 0
+        self.missed = 0
+
+        channel = self.__channel()
+        if channel is not None:
+            self.__follow(channel)
+            self.seq = channel.offset if from_start else channel.nextSeq()
+
+    def readNew(self):
+        """ Return an iterator over the values added since the last read
+
+        The cursor moves forward immediately, values not consumed from
+        the returned iterator are not returned again.
+        """
+        channel = self.__channel()
+        if channel is None:
+            return iter([])
+
+        self.__follow(channel)
+        if self.seq < channel.offset:
+            self.missed += channel.offset - self.seq
+
+        start = self.seq
+        self.seq = channel.nextSeq()
+        return channel.since(start, self.seq,
+                             lock=self.store._locked(self.path))
+
+    def skip(self):
+        """ Move the cursor after the last value, returns the skipped count """
+        channel = self.__channel()
+        if channel is None:
+            return 0
+        self.__follow(channel)
+        if self.seq < channel.offset:
+            self.missed += channel.offset - self.seq
+            self.seq = channel.offset
+
+        skipped = channel.nextSeq() - self.seq
+        self.seq = channel.nextSeq()
+        return skipped
+
+    def hasNew(self):
+        channel = self.__channel()
+        if channel is None:
+            return False
+        return channel.lineage is not self.lineage or \
+            channel.nextSeq() > self.seq
+
+    def __follow(self, channel):
+        """ Read channel, from its first sequence number (0) when it is a
+        new channel: its values already evicted are missed """
+        if channel.lineage is not self.lineage:
+            self.lineage = channel.lineage
+            self.seq = 0
+        self.channel = channel
+
+    def __channel(self):
+        with self.store._locked(self.path):
+            channel = self.store._getChannel(self.path)
+        return channel if isinstance(channel, Channel) else None
+
+    def __repr__(self):
+        return "Cursor(%s@%d)" % (self.path, self.seq)
@@ -0,0 +1,206 @@
+import bisect
+from collections import deque
+
+HASH_INDEX = "hash"
+SORTED_INDEX = "sorted"
+INDEX_KINDS = [HASH_INDEX, SORTED_INDEX]
+
+MISSING = object()
+
+
+def fieldValue(value, field):
+    """ Return the field of value, MISSING if value has no such field
+
+    field: dotted path, parts are dict keys or sequence positions,
+           eg: "metadata.path" for journal blocks, "1" for tuples
+    """
+    for part in field.split('.'):
+        if isinstance(value, dict):
+            if part not in value:
+                return MISSING
+            value = value[part]
+        elif isinstance(value, (list, tuple)) and part.isdigit():
+            if int(part) >= len(value):
+                return MISSING
+            value = value[int(part)]
+        else:
+            return MISSING
+    return value
+
+
+def matches(value, where=None, between=None):
+    """ Return True if value satisfies every condition, see Store.query """
+    for (field, expected) in (where or {}).items():
+        if fieldValue(value, field) != expected:
+            return False
+    for (field, (low, high)) in (between or {}).items():
+        actual = fieldValue(value, field)
+        if actual is MISSING:
+            return False
+        try:
+            if (low is not None and actual < low) or \
+                    (high is not None and actual > high):
+                return False
+        except TypeError:
+            return False
+    return True
+
+
+def createIndex(field, kind):
+    if kind == HASH_INDEX:
+        return HashIndex(field)
+    if kind == SORTED_INDEX:
+        return SortedIndex(field)
+    raise ValueError("Unknown index kind [%s], expected one of %s" %
+                     (kind, INDEX_KINDS))
+
+
+class HashIndex(object):
+    """ Sequence numbers of a channel's values by field value
+
+    Supports equality lookups, values without the field are not indexed.
+    The values with an unhashable field are candidates of every lookup
+    (they may be equal to the key, eg. a set and a frozenset).
+    """
+    kind = HASH_INDEX
+
+    def __init__(self, field):
+        self.field = field
+        self.entries = {}  # Map<field value, deque<seq>>
+        self.unhashable = deque()  # seqs of the unhashable field values
+
+    def add(self, seq, value):
+        key = fieldValue(value, self.field)
+        if key is MISSING:
+            return
+        try:
+            self.entries.setdefault(key, deque()).append(seq)
+        except TypeError:
+            self.unhashable.append(seq)
+
+    def remove(self, seq, value):
+        """ Remove the oldest indexed value (see Channel eviction) """
+        key = fieldValue(value, self.field)
+        try:
+            seqs = self.entries.get(key)
+        except TypeError:
+            seqs = self.unhashable
+        if seqs and seqs[0] == seq:
+            seqs.popleft()
+            if not seqs and seqs is not self.unhashable:
+                del self.entries[key]
+
+    def equal(self, key):
+        """ Return the sorted sequence numbers of the values which may
+        have field == key, None if key is unhashable (not indexed) """
+        try:
+            seqs = self.entries.get(key, ())
+        except TypeError:
+            return None
+        return _merge(seqs, self.unhashable)
+
+    def between(self, low, high):
+        return None  # not supported, see SortedIndex
+
+    def __len__(self):
+        return sum(len(seqs) for seqs in self.entries.values()) + \
+            len(self.unhashable)
+
+
+class SortedIndex(object):
+    """ Sequence numbers of a channel's values sorted by field value
+
+    Supports equality and range lookups on numbers, strings and bytes.
+    The values with another field type are candidates of every lookup
+    (they may compare with the bounds, eg. tuples or Decimals).
+
+    Removing the first entry is O(1) (amortized): with increasing keys
+    (eg. the journal times), evictions do not shift the entries.
+    """
+    kind = SORTED_INDEX
+
+    def __init__(self, field):
+        self.field = field
+        self.entries = []  # sorted [(sort key, seq)] from [start]
+        self.start = 0  # removed entries at the start of entries
+        self.unsorted = deque()  # seqs of the other field values
+
+    def add(self, seq, value):
+        field = fieldValue(value, self.field)
+        if field is MISSING:
+            return
+        key = self.__sortKey(field)
+        if key is MISSING:
+            self.unsorted.append(seq)
+            return
+        entry = (key, seq)
+        if len(self.entries) == self.start or self.entries[-1] <= entry:
+            self.entries.append(entry)  # increasing keys, eg. timestamps
+        else:
+            bisect.insort(self.entries, entry, self.start)
+
+    def remove(self, seq, value):
+        field = fieldValue(value, self.field)
+        if field is MISSING:
+            return
+        key = self.__sortKey(field)
+        if key is MISSING:
+            if self.unsorted and self.unsorted[0] == seq:
+                self.unsorted.popleft()
+            return
+        entries = self.entries
+        if self.start < len(entries) and entries[self.start] == (key, seq):
+            entries[self.start] = None
+            self.start += 1
+            if self.start * 2 > len(entries):  # amortized compaction
+                del entries[:self.start]
+                self.start = 0
+            return
+        pos = bisect.bisect_left(entries, (key, seq), self.start)
+        if pos < len(entries) and entries[pos] == (key, seq):
+            del entries[pos]
+
+    def equal(self, key):
+        if self.__sortKey(key) is MISSING:
+            return None  # eg. None, which is also an unbounded range
+        return self.between(key, key)
+
+    def between(self, low, high):
+        """ Return the sorted sequence numbers of the values which may
+        have low <= field <= high, None bounds are unbounded. None if a
+        bound is not a number, string or bytes (not indexed) """
+        start = self.start
+        end = len(self.entries)
+        if low is not None:
+            low = self.__sortKey(low)
+            if low is MISSING:
+                return None
+            start = bisect.bisect_left(self.entries, (low,), start)
+        if high is not None:
+            high = self.__sortKey(high)
+            if high is MISSING:
+                return None
+            end = bisect.bisect_right(self.entries, (high, float("inf")),
+                                      start)
+        return _merge(sorted(seq for (_, seq) in self.entries[start:end]),
+                      self.unsorted)
+
+    def __sortKey(self, key):
+        """ Numbers, strings and bytes are sortable together """
+        if isinstance(key, (int, float)):
+            return (0, key)
+        if isinstance(key, str):
+            return (1, key)
+        if isinstance(key, bytes):
+            return (2, key)
+        return MISSING
+
+    def __len__(self):
+        return len(self.entries) - self.start + len(self.unsorted)
+
+
+def _merge(seqs, others):
+    """ Sorted list of two sorted sequences of seqs """
+    if not others:
+        return list(seqs)
+    return sorted(list(seqs) + list(others))
@@ -0,0 +1,123 @@
+"""
+Journal maintenance and verification
+
+The journal (Store JOURNAL_PATH) holds one block per add() and put(),
+the functions of this module work on lists of journal blocks.
+
+Verification relies on the block hashes only, payloads are not hashed
+again: a chained journal (Store(chain_journal=True)) links each block
+to the hash of the previous one, Merkle roots summarize a range of
+blocks in one hash.
+
+Compaction rebases a chained journal: the blocks kept after the first
+dropped one are linked again (see rebase()), thus get new hashes.
+"""
+import hashlib
+from bob.blockchain import blockutil_U as B
+from bob.store.Store import PUT_METHOD, KILL_VALUE, JOURNAL_PREV
+
+
+def compact(blocks):
+    """ Return the blocks still needed to rebuild a store from scratch
+
+    A put() supersedes the earlier blocks of its path and sub-paths, a
+    clear() (put of KILL_VALUE) also supersedes itself. The order of the
+    remaining blocks is kept.
+    """
+    kept = {}  # Map<path, [(position, block)]>
+    for (position, block) in enumerate(blocks):
+        method = block[B.METADATA]['method']
+        path = block[B.METADATA]['path']
+
+        if method == PUT_METHOD:
+            for other in [p for p in kept
+                          if p == path or p.startswith(path + '.')]:
+                del kept[other]
+            if block[B.DATA] == KILL_VALUE:
+                continue
+            kept[path] = []
+        kept.setdefault(path, []).append((position, block))
+
+    positions = sorted(entry for entries in kept.values()
+                       for entry in entries)
+    return [block for (_, block) in positions]
+
+
+def rebase(blocks, prev=None):
+    """ Return blocks linked one to the other, the first one to prev
+
+    The blocks already linked are kept, the others are copied with
+    their new link and hash: the hash of a block covers its link, thus
+    every block after the first relinked one is a new block.
+    """
+    rebased = []
+    for block in blocks:
+        if block[B.METADATA].get(JOURNAL_PREV) != prev:
+            algorithm = B.hash_algorithm(block[B.HASH])
+            block = dict(block)
+            block[B.METADATA] = dict(block[B.METADATA])
+            block[B.METADATA][JOURNAL_PREV] = prev
+            block[B.HASH] = u''
+            block[B.HASH] = B.hash_block(block, algorithm)
+        rebased.append(block)
+        prev = block[B.HASH]
+    return rebased
+
+
+def verifyChain(blocks, prev=None, check_hashes=False):
+    """ Return the position of the first block not linked to the block
+    before it, None if the chain holds
+
+    prev: hash of the block before blocks (None: do not check the first)
+    check_hashes: also recompute the hash of each block (but not of its
+                  payload, covered by the payload hash)
+    """
+    for (position, block) in enumerate(blocks):
+        if (position > 0 or prev is not None) and \
+                block[B.METADATA].get(JOURNAL_PREV) != prev:
+            return position
+        if check_hashes and B.hash_block(
+                block, B.hash_algorithm(block[B.HASH])) != block[B.HASH]:
+            return position
+        prev = block[B.HASH]
+    return None
+
+
+def merkleRoot(blocks):
+    """ Return the Merkle root (hex) of the hashes of blocks, None if
+    there is no block """
+    level = [_hash(b"\x00", block[B.HASH].encode("utf-8"))
+             for block in blocks]
+    if not level:
+        return None
+    while len(level) > 1:
+        level = [_hash(b"\x01", level[i], level[i + 1])
+                 if i + 1 < len(level) else level[i]
+                 for i in range(0, len(level), 2)]
+    return level[0].hex()
+
+
+def findDivergence(local_root, remote_root, start, end):
+    """ Return the first sequence number in [start, end[ where two
+    journals differ, None if they hold the same blocks
+
+    local_root, remote_root: function(start, end) returning the Merkle
+    root of a journal range (eg. Store.journalRoot), remote_root is
+    called O(log(end - start)) times
+    """
+    if local_root(start, end) == remote_root(start, end):
+        return None
+    while end - start > 1:
+        middle = (start + end) // 2
+        if local_root(start, middle) != remote_root(start, middle):
+            end = middle
+        else:
+            start = middle
+    return start
+
+
+def _hash(prefix, *parts):
+    hasher = hashlib.blake2b(prefix, digest_size=32)
+    for part in parts:
+        hasher.update(part)
+    return hasher.digest()
@@ -0,0 +1,259 @@
+import mmap
+import os
+import pickle
+import struct
+import threading
+import zlib
+from bob.store.Store import Store, JOURNAL_PATH, ADD_METHOD, PUT_METHOD
+from bob.store.Store import KILL_VALUE
+
+SEGMENT_SIZE = 16 * 1024 * 1024
+SEGMENT_FORMAT = "%010d.seg"
+
+# record: header (body length, crc32 of body) + body
+# body: header (method, path length) + path + pickled value
+RECORD_HEADER = struct.Struct("<II")
+BODY_HEADER = struct.Struct("<BH")
+METHODS = {ADD_METHOD: 0, PUT_METHOD: 1}
+METHOD_NAMES = {code: name for (name, code) in METHODS.items()}
+
+
+class LogStore(Store):
+    """ Store persisted in a segmented append-only log
+
+    Every add() and put() is appended as a record to the active segment
+    of [directory], a new segment is started once the active one reaches
+    [segment_size] bytes. The journal is not persisted.
+
+    Opening only memory-maps the segments and truncates a torn record at
+    the end of the last segment. The per-path offset index is built on
+    first access, and a path is loaded from the log the first time it is
+    accessed.
+
+    Arguments:
+        directory: directory of the segments, created if needed
+        segment_size: size in bytes after which a new segment is started
+        sync: fsync after every record (otherwise flushed to the OS)
+    """
+
+    def __init__(self, directory, segment_size=SEGMENT_SIZE, sync=False,
+                 **args):
+        super(LogStore, self).__init__(**args)
+        self.directory = directory
+        self.segment_size = segment_size
+        self.sync = sync
+        self._log_lock = threading.RLock()
+        self._maps = {}  # Map<segment, mmap>
+        self._index = None  # Map<path, [(segment, offset, method)]>
+        self._loaded = set()
+
+        os.makedirs(directory, exist_ok=True)
+        self._segments = sorted(
+            int(name.split('.')[0]) for name in os.listdir(directory)
+            if name.endswith(".seg"))
+        if not self._segments:
+            self._segments = [0]
+        for segment in self._segments[:-1]:
+            self.__map(segment)
+        self.truncated = self.__recover(self._segments[-1])
+        self._file = open(self.__filename(self._segments[-1]), "ab")
+
+    def add(self, path, value, journal=True):
+        with self._locked(path):
+            self.__load(path)
+            super(LogStore, self).add(path, value, journal=journal)
+
+    def put(self, path, value, journal=True):
+        with self._locked(path):
+            self.__load(path)
+            super(LogStore, self).put(path, value, journal=journal)
+
+    def snapshot(self):
+        """ (Overide) Loads every path before taking the snapshot """
+        self.__buildIndex()
+        for path in list(self._index):
+            with self._locked(path):
+                self.__load(path)
+        return super(LogStore, self).snapshot()
+
+    def close(self):
+        super(LogStore, self).close()
+        with self._log_lock:
+            self._file.close()
+            for segment_map in self._maps.values():
+                segment_map.close()
+            self._maps = {}
+
+    def _getChannel(self, path):
+        """ (Overide) Loads path from the log on first access """
+        if path not in self._loaded and path != JOURNAL_PATH:
+            self.__load(path)
+            prefix = path + '.'
+            for other in [p for p in self._index if p.startswith(prefix)]:
+                self.__load(other)
+        return super(LogStore, self)._getChannel(path)
+
+    def _onUpdate(self, method, path, data):
+        """ (Overide) Appends the update to the log """
+        if path != JOURNAL_PATH:
+            self.__append(method, path, data)
+        super(LogStore, self)._onUpdate(method, path, data)
+
+    def _apply(self, method, path, data):
+        """ (Overide) Appends the replayed updates to the log """
+        with self._locked(path):
+            self.__load(path)
+            super(LogStore, self)._apply(method, path, data)
+        if path == JOURNAL_PATH:
+            return
+        if method == ADD_METHOD:
+            for value in data:
+                self.__append(method, path, value)
+        elif type(data) == list or data == KILL_VALUE:
+            self.__append(method, path, data)
+        else:
+            self.__append(method, path, [data])
+
+    def __append(self, method, path, data):
+        path_bytes = path.encode("utf-8")
+        body = BODY_HEADER.pack(METHODS[method], len(path_bytes)) + \
+            path_bytes + pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+        record = RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body
+
+        with self._log_lock:
+            if self._file.tell() > 0 and \
+                    self._file.tell() + len(record) > self.segment_size:
+                self._file.close()
+                self._segments.append(self._segments[-1] + 1)
+                self._file = open(self.__filename(self._segments[-1]), "ab")
+
+            offset = self._file.tell()
+            self._file.write(record)
+            self._file.flush()
+            if self.sync:
+                os.fsync(self._file.fileno())
+            if self._index is not None:
+                self._index.setdefault(path, []).append(
+                    (self._segments[-1], offset, method))
+
+    def __load(self, path):
+        """ Replay the records of path (and its parents) once """
+        if path in self._loaded or path == JOURNAL_PATH:
+            return
+        self.__buildIndex()
+        self._loaded.add(path)
+
+        parts = path.split('.')
+        positions = list(self._index.get(path, []))
+        for i in range(1, len(parts)):
+            positions += [position for position in
+                          self._index.get('.'.join(parts[:i]), [])
+                          if position[2] == PUT_METHOD]
+
+        values = None
+        for (segment, offset, method) in sorted(positions):
+            (_, record_path, data) = self.__read(segment, offset)
+            if record_path != path or (method == PUT_METHOD and
+                                       data == KILL_VALUE):
+                # put on a parent path replaced this path
+                values = None
+            elif method == PUT_METHOD:
+                values = list(data)
+            else:
+                values = values if values is not None else []
+                values.append(data)
+
+        if values:
+            super(LogStore, self).put(path, values, journal=False)
+
+    def __buildIndex(self):
+        with self._log_lock:
+            if self._index is not None:
+                return
+            index = {}
+            for segment in self._segments:
+                segment_map = self.__map(segment)
+                for (offset, method, path) in self.__records(segment_map):
+                    index.setdefault(path, []).append(
+                        (segment, offset, method))
+            self._index = index
+
+    def __read(self, segment, offset):
+        """ Return the (method, path, value) record at offset """
+        with self._log_lock:
+            segment_map = self.__map(segment, offset + RECORD_HEADER.size)
+            (length, _) = RECORD_HEADER.unpack_from(segment_map, offset)
+            start = offset + RECORD_HEADER.size
+            segment_map = self.__map(segment, start + length)
+            (method, path_length) = BODY_HEADER.unpack_from(segment_map,
+                                                            start)
+            path_start = start + BODY_HEADER.size
+            path = segment_map[path_start:path_start + path_length]
+            data = pickle.loads(
+                segment_map[path_start + path_length:start + length])
+        return (METHOD_NAMES[method], path.decode("utf-8"), data)
+
+    def __records(self, segment_map, check=False):
+        """ Yield (offset, method, path) of every complete record
+
+        check: also verify the crc32 of the records
+        """
+        offset = 0
+        size = len(segment_map) if segment_map is not None else 0
+        while offset + RECORD_HEADER.size <= size:
+            (length, crc) = RECORD_HEADER.unpack_from(segment_map, offset)
+            start = offset + RECORD_HEADER.size
+            if length < BODY_HEADER.size or start + length > size:
+                return
+            if check and zlib.crc32(segment_map[start:start + length]) != crc:
+                return
+            (method, path_length) = BODY_HEADER.unpack_from(segment_map,
+                                                            start)
+            path_start = start + BODY_HEADER.size
+            if method not in METHOD_NAMES or \
+                    path_start + path_length > start + length:
+                return
+            path = segment_map[path_start:path_start + path_length]
+            yield (offset, METHOD_NAMES[method], path.decode("utf-8"))
+            offset = start + length
+
+    def __recover(self, segment):
+        """ Truncate a torn or corrupted tail, returns the dropped bytes """
+        segment_map = self.__map(segment)
+        end = 0
+        for (offset, _, _) in self.__records(segment_map, check=True):
+            (length, _) = RECORD_HEADER.unpack_from(segment_map, offset)
+            end = offset + RECORD_HEADER.size + length
+        filename = self.__filename(segment)
+        size = os.path.getsize(filename) if os.path.exists(filename) else 0
+        if end < size:
+            self.__unmap(segment)
+            with open(filename, "r+b") as file:
+                file.truncate(end)
+        return size - end
+
+    def __map(self, segment, min_size=0):
+        """ Return the mmap of segment, None if the segment is empty
+
+        The mmap is recreated when smaller than min_size (active segment)
+        """
+        segment_map = self._maps.get(segment)
+        if segment_map is not None and len(segment_map) >= min_size:
+            return segment_map
+
+        self.__unmap(segment)
+        filename = self.__filename(segment)
+        if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+            return None
+        with open(filename, "rb") as file:
+            segment_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps[segment] = segment_map
+        return segment_map
+
+    def __unmap(self, segment):
+        segment_map = self._maps.pop(segment, None)
+        if segment_map is not None:
+            segment_map.close()
+
+    def __filename(self, segment):
+        return os.path.join(self.directory, SEGMENT_FORMAT % segment)
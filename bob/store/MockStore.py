@@ -1,13 +1,31 @@
 from bob.store.Store import Store
+import mmap
+import os
+import struct
 import tempfile
+import threading
+import weakref
 import json
 
 TYPE = "type"
 PATH = "path"
 DATA = "data"
 
-SEPARATOR = "*+*_*"
-LINE_SEPARATOR = "%^U]\n["
+# log record: header (method length, path length, data length) followed
+# by the utf-8 method, path and data (repr of the written value)
+RECORD_HEADER = struct.Struct("<BHI")
+FLUSH_SIZE = 64 * 1024
+
+_stores = weakref.WeakSet()  # MockStores flushed before os.fork()
+
+
+def _flushBeforeFork():
+    for store in list(_stores):
+        store.flushLogs()
+
+
+os.register_at_fork(before=_flushBeforeFork)
+
 
 class MockStore(Store):
     """ Store for testing
@@ -15,6 +33,10 @@ class MockStore(Store):
     This store use local file storage to store logs. Thus it works
     across processes and threads but not accross machines.
 
+    Logs are buffered and appended to the file once [FLUSH_SIZE] bytes
+    are pending, when logs are read or before a fork. Forked processes
+    write through, their logs are readable by the parent immediately.
+
     Refer to tests/test_mockStore.py for usage examples
     """
     def __init__(self):
@@ -23,6 +45,14 @@ class MockStore(Store):
         file = tempfile.NamedTemporaryFile(delete=False)
         self.filename = file.name
         file.close()
+        self._log_lock = threading.Lock()
+        self._log_buffer = []
+        self._log_size = 0
+        self._log_owner = os.getpid()  # other processes write through
+        self._log_pid = os.getpid()  # process of the buffered logs
+        self._log_index = {}  # Map<path, [(record offset, record size)]>
+        self._log_scanned = 0  # file offset indexed up to
+        _stores.add(self)
 
     def mock_with_value(self, path, return_value, ):
         """ Mock data in store with static value """
@@ -41,37 +71,107 @@ class MockStore(Store):
         return filename
 
     def getLogs(self, path=None):
-        """ Return all write operations that occured on this store """
-        logs = []
-        with open(self.filename) as file:
-            lines = file.read().split(LINE_SEPARATOR)
-            lines_splitted = [line.split(SEPARATOR) for line in lines if line]
-            logs = [{
-                TYPE: line[0],
-                PATH: line[1],
-                DATA: line[2]
-            } for line in lines_splitted]
-            logs = [log for log in logs if not path or path in log[PATH]]
+        """ Return all write operations that occured on this store
+
+        path: only the logs of paths containing [path]
+        """
+        self.flushLogs()
+        with self._log_lock, open(self.filename, "rb") as file:
+            self.__scan(file)
+            offsets = []
+            for (log_path, path_offsets) in self._log_index.items():
+                if not path or path in log_path:
+                    offsets.extend((offset, size, log_path)
+                                   for (offset, size) in path_offsets)
+            if not offsets:
+                return []
+            logs = []
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as log:
+                for (offset, size, log_path) in sorted(offsets):
+                    (method, data) = self.__parse(log[offset:offset + size])
+                    logs.append({
+                        TYPE: method,
+                        PATH: log_path,
+                        DATA: data
+                    })
         return logs
 
-    def get(self, path):
+    def flushLogs(self):
+        """ Append the buffered logs to the log file """
+        with self._log_lock:
+            self.__checkFork()
+            if not self._log_buffer:
+                return
+            records = b"".join(self._log_buffer)
+            self._log_buffer = []
+            self._log_size = 0
+            fd = os.open(self.filename, os.O_WRONLY | os.O_APPEND)
+            try:
+                while records:
+                    records = records[os.write(fd, records):]
+            finally:
+                os.close(fd)
+
+    def close(self):
+        super(MockStore, self).close()
+        self.flushLogs()
+
+    def _getChannel(self, path):
         """ (Overide) Support mocked data """
         mocked_data = None
         if path in self.mocks:
             mocked_data = self.mocks[path](path)
 
-        return mocked_data or super(MockStore, self).get(path)
+        return mocked_data or super(MockStore, self)._getChannel(path)
 
     def _onUpdate(self, method, path, data):
         """ (Overide) Logs any update to output file """
-        with open(self.filename, "a") as file:
-            data_str = data
-            if type(data) not in (str, bytes):
-                data_str = repr(data)
-            newLine = method + SEPARATOR + path + SEPARATOR + str(data_str)
-            file.write(newLine + LINE_SEPARATOR)
+        data_str = data
+        if type(data) not in (str, bytes):
+            data_str = repr(data)
+        fields = [part.encode("utf-8") for part in
+                  (method, path, str(data_str))]
+        record = RECORD_HEADER.pack(*[len(field) for field in fields]) + \
+            b"".join(fields)
+
+        with self._log_lock:
+            self.__checkFork()
+            self._log_buffer.append(record)
+            self._log_size += len(record)
+            flush = self._log_size >= FLUSH_SIZE or \
+                self._log_pid != self._log_owner
+        if flush:
+            self.flushLogs()
         super(MockStore, self)._onUpdate(method, path, data)
 
+    def __checkFork(self):
+        """ Drop the logs buffered by the parent process, it writes them """
+        if self._log_pid != os.getpid():
+            self._log_buffer = []
+            self._log_size = 0
+            self._log_pid = os.getpid()
+
+    def __scan(self, file):
+        """ Index the records appended since the last scan """
+        size = os.fstat(file.fileno()).st_size
+        file.seek(self._log_scanned)
+        while self._log_scanned + RECORD_HEADER.size <= size:
+            lengths = RECORD_HEADER.unpack(file.read(RECORD_HEADER.size))
+            if file.tell() + sum(lengths) > size:
+                break  # being written by another process
+            path = file.read(lengths[0] + lengths[1])[lengths[0]:]
+            file.seek(lengths[2], os.SEEK_CUR)
+            self._log_index.setdefault(path.decode("utf-8"), []).append(
+                (self._log_scanned, file.tell() - self._log_scanned))
+            self._log_scanned = file.tell()
+
+    def __parse(self, record):
+        """ Return the (method, data) of a record """
+        (method_end, path_length, _) = RECORD_HEADER.unpack_from(record)
+        method_end += RECORD_HEADER.size
+        return (record[RECORD_HEADER.size:method_end].decode("utf-8"),
+                record[method_end + path_length:].decode("utf-8"))
+
     def __readFile(self, filename):
         with open(filename) as file:
             content = file.read()
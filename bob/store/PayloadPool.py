@@ -0,0 +1,108 @@
+import threading
+from bob.blockchain import blockutil_U as B
+from bob.store.Channel import sizeof
+
+# payloads of other types are small or immutable singletons (int, None...)
+POOLED_TYPES = (str, bytes, dict, list, tuple)
+
+
+class PayloadPool(object):
+    """ Content-addressed payloads shared by the channels and the journal
+
+    intern(payload) returns the pooled payload equal to payload (same
+    type and B.hash_data), thus equal payloads added to several paths or
+    received again through processBlock() are stored once.
+
+    References are counted per channel slot and journal block holding a
+    pooled payload (see Channel), a payload leaves the pool once all
+    its references are evicted or overwritten.
+
+    Pooled payloads are shared: values read from the store must not be
+    modified in place.
+    """
+
+    def __init__(self):
+        self.payloads = {}  # Map<(type, payload hash), payload>
+        self.entries = {}  # Map<id(payload), [key, references, size]>
+        self.hits = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+
+    def intern(self, payload, payload_hash=None):
+        """ Return the pooled payload equal to payload
+
+        payload_hash: B.hash_data(payload) when already known (blocks)
+        """
+        if type(payload) not in POOLED_TYPES:
+            return payload
+        with self._lock:
+            if id(payload) in self.entries:
+                return payload
+        if payload_hash is None:
+            payload_hash = B.hash_data(payload)
+        key = (type(payload), payload_hash)
+
+        with self._lock:
+            pooled = self.payloads.get(key)
+            if pooled is not None:
+                self.hits += 1
+                self.bytes_saved += self.entries[id(pooled)][2]
+                return pooled
+            self.payloads[key] = payload
+            self.entries[id(payload)] = [key, 0, sizeof(payload)]
+            return payload
+
+    def hashOf(self, payload):
+        """ Return B.hash_data(payload) of a pooled payload, None if the
+        payload is not pooled """
+        entry = self.entries.get(id(payload))
+        return entry[0][1] if entry is not None else None
+
+    def acquire(self, payload):
+        with self._lock:
+            entry = self.entries.get(id(payload))
+            if entry is not None:
+                entry[1] += 1
+
+    def release(self, payload):
+        with self._lock:
+            entry = self.entries.get(id(payload))
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self.entries[id(payload)]
+                del self.payloads[entry[0]]
+
+    def field(self, name):
+        """ Return a view counting the references of value[name], used for
+        the journal blocks and their B.DATA payload """
+        return _FieldPool(self, name)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "payloads": len(self.payloads),
+                "references": sum(entry[1] for entry
+                                  in self.entries.values()),
+                "bytes": sum(entry[2] for entry in self.entries.values()),
+                "hits": self.hits,
+                "bytes_saved": self.bytes_saved
+            }
+
+    def __len__(self):
+        return len(self.payloads)
+
+
+class _FieldPool(object):
+    def __init__(self, pool, name):
+        self.pool = pool
+        self.name = name
+
+    def acquire(self, value):
+        if isinstance(value, dict) and self.name in value:
+            self.pool.acquire(value[self.name])
+
+    def release(self, value):
+        if isinstance(value, dict) and self.name in value:
+            self.pool.release(value[self.name])
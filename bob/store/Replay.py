@@ -0,0 +1,33 @@
+from bob.blockchain import blockutil_U as B
+
+REPLAY_BATCH = 10000  # blocks validated then applied at once
+
+
+def collapse(blocks, add_method):
+    """ Yield (method, path, data, blocks) with consecutive adds to the
+    same path merged: data is then the list of added values """
+    group = None
+    for block in blocks:
+        metadata = block[B.METADATA]
+        method = metadata["method"]
+        path = metadata["path"]
+        if method == add_method:
+            if group is not None and group[1] == path:
+                group[2].append(block[B.DATA])
+                group[3].append(block)
+                continue
+            if group is not None:
+                yield tuple(group)
+            group = [method, path, [block[B.DATA]], [block]]
+        else:
+            if group is not None:
+                yield tuple(group)
+                group = None
+            yield (method, path, block[B.DATA], [block])
+    if group is not None:
+        yield tuple(group)
+
+
+def loadRaw(raw):
+    """ Deserialize a block already validated """
+    return B.loads(raw)
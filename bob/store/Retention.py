@@ -0,0 +1,32 @@
+class Retention(object):
+    """ Retention policy of store channels
+
+    Set on a path prefix with Store.setRetention(), channels under that
+    prefix evict their oldest values once any limit is exceeded:
+        max_entries: max number of values
+        max_bytes: max approximate size of the values (see Channel.sizeof)
+        max_age: max age in seconds of the values
+
+    Eviction counters are shared by all the channels of the policy.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, max_age=None):
+        for (name, limit) in [("max_entries", max_entries),
+                              ("max_bytes", max_bytes),
+                              ("max_age", max_age)]:
+            if limit is not None and limit <= 0:
+                raise ValueError("%s must be positive, not [%s]" %
+                                 (name, limit))
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.evicted = 0
+        self.evicted_bytes = 0
+
+    def isEmpty(self):
+        return self.max_entries is None and self.max_bytes is None and \
+            self.max_age is None
+
+    def __repr__(self):
+        return "Retention(max_entries=%s, max_bytes=%s, max_age=%s)" % (
+            self.max_entries, self.max_bytes, self.max_age)
@@ -0,0 +1,299 @@
+import atexit
+import os
+import tempfile
+import threading
+import uuid
+import weakref
+from multiprocessing.connection import Listener, Client
+from bob.store.Store import Store
+
+OK = "ok"
+ERROR = "error"
+
+# Store methods callable by a SharedStore
+READS = ["get", "getObj", "getLasts", "getSince", "getRetention", "query",
+         "getTyped", "aggregate", "snapshot", "journalSince", "journalRange",
+         "journalRoot", "journalCheckpoints", "payloadStats", "stats"]
+WRITES = ["add", "addAll", "put", "clear", "processBlock", "setRetention",
+          "createIndex", "dropIndex", "setTyped", "compactJournal",
+          "flushJournal", "enableStats", "disableStats", "replay"]
+
+
+class StoreServer(object):
+    """ Serves a Store to SharedStore clients of other processes
+
+    Listens on a local unix socket, each client connection is served by
+    a thread. The authentication key is only known by this process and
+    its forked children. The server is closed with its store (see
+    Store.close) or when this process exits.
+
+    Usage:
+        server = StoreServer.forStore(store)
+        pid = os.fork()
+        if pid == 0:
+            store = server.client()  # in the child process
+    """
+
+    def __init__(self, store, address=None):
+        if not isinstance(store, Store):
+            raise TypeError("store must be a Store, not [%s]" % type(store))
+        self.store = store
+        self.authkey = os.urandom(16)
+        if address is None:
+            address = os.path.join(tempfile.gettempdir(),
+                                   "bob-store-%s.sock" % uuid.uuid4().hex)
+        self.listener = Listener(address, family="AF_UNIX",
+                                 authkey=self.authkey)
+        self.address = self.listener.address
+        self._cursors = {}  # Map<id, Cursor>
+        self._pid = os.getpid()
+        self._closed = False
+        self._thread = threading.Thread(target=self.__accept,
+                                        name="StoreServer", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def forStore(store):
+        """ Return the server of store, started on first call """
+        server = getattr(store, "_server", None)
+        if server is None:
+            server = StoreServer(store)
+            store._server = server
+            atexit.register(server.close)
+        return server
+
+    def client(self):
+        return SharedStore(self.address, self.authkey)
+
+    def close(self):
+        """ Stop listening, no-op in forked children """
+        if self._closed or self._pid != os.getpid():
+            return
+        self._closed = True
+        if getattr(self.store, "_server", None) is self:
+            self.store._server = None
+        self.listener.close()
+        if os.path.exists(self.address):
+            os.remove(self.address)
+
+    def __accept(self):
+        while not self._closed:
+            try:
+                connection = self.listener.accept()
+            except (OSError, EOFError):
+                return  # listener closed
+            except Exception:
+                self.store.logger.exception("StoreServer accept failed")
+                continue
+            threading.Thread(target=self.__serve, args=(connection,),
+                             name="StoreServerClient", daemon=True).start()
+
+    def __serve(self, connection):
+        with connection:
+            while True:
+                try:
+                    requests = connection.recv()
+                except (EOFError, OSError):
+                    return
+                responses = []
+                for (method, args, kwargs) in requests:
+                    try:
+                        responses.append(
+                            (OK, self.__call(method, args, kwargs)))
+                    except Exception as e:
+                        responses.append((ERROR, e))
+                connection.send(responses)
+
+    def __call(self, method, args, kwargs):
+        if method in READS or method in WRITES:
+            result = getattr(self.store, method)(*args, **kwargs)
+            if method == "journalSince" or (method == "get" and
+                                            isinstance(result, filter)):
+                result = list(result)
+            return result
+        if method == "cursor":
+            (path, from_start, seq) = args
+            cursor = self.store.cursor(path, from_start=from_start)
+            if seq is not None and cursor.channel is not None:
+                cursor.seq = min(max(seq, cursor.channel.offset),
+                                 cursor.channel.nextSeq())
+            cursor_id = uuid.uuid4().hex
+            self._cursors[cursor_id] = cursor
+            return cursor_id
+        if method == "readNew":
+            return list(self._cursors[args[0]].readNew())
+        if method == "skip":
+            return self._cursors[args[0]].skip()
+        if method == "hasNew":
+            return self._cursors[args[0]].hasNew()
+        if method == "waitFor":
+            (cursor_ids, timeout) = args
+            return self.store.waitFor(
+                [self._cursors[cursor_id] for cursor_id in cursor_ids],
+                timeout)
+        if method == "closeCursor":
+            self._cursors.pop(args[0], None)
+            return None
+        raise ValueError("Unknown store method [%s]" % method)
+
+
+class RemoteCursor(object):
+    """ Cursor of a SharedStore, see Cursor """
+
+    def __init__(self, store, cursor_id, path):
+        self.store = store
+        self.id = cursor_id
+        self.path = path
+
+    def readNew(self):
+        return iter(self.store._request("readNew", self.id))
+
+    def skip(self):
+        return self.store._request("skip", self.id)
+
+    def hasNew(self):
+        return self.store._request("hasNew", self.id)
+
+    def close(self):
+        self.store._request("closeCursor", self.id)
+
+    def __repr__(self):
+        return "RemoteCursor(%s)" % self.path
+
+
+class SharedStore(object):
+    """ Store of another process on the same host, see StoreServer
+
+    Exposes the Store API (except subscribe) over a local unix socket.
+    Each thread has its own connection (served by its own thread of the
+    StoreServer): a thread blocked in waitFor() does not delay the
+    requests of the others. The connections are re-opened after a fork,
+    thus a SharedStore can be used by forked AMIs.
+
+    Batching: writes made by a thread inside 'with store.batch():' are
+    sent in a single request when the block exits or before its next
+    read.
+    """
+
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+        self._pid = os.getpid()
+        self._local = threading.local()  # connection and batch
+        # of all the threads (closed when their thread ends) for close()
+        self._connections = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def batch(self):
+        self.__checkFork()
+        return _Batch(self)
+
+    def get(self, path, filter_func=None):
+        values = self._request("get", path)
+        if filter_func:
+            values = filter(filter_func, values)
+        return values
+
+    def cursor(self, path, from_start=True, seq=None):
+        """ Return a RemoteCursor, see Store.cursor
+
+        seq: read from this sequence number, eg. the seq of a Cursor of
+             the served store
+        """
+        return RemoteCursor(self, self._request("cursor", path, from_start,
+                                                seq), path)
+
+    def waitFor(self, cursors, timeout=None):
+        if isinstance(cursors, RemoteCursor):
+            cursors = [cursors]
+        return self._request("waitFor", [cursor.id for cursor in cursors],
+                             timeout)
+
+    def subscribe(self, prefix, callback):
+        raise NotImplementedError("callbacks can not be shared across "
+                                  "processes, use cursor() and waitFor()")
+
+    def journalSince(self, seq):
+        return iter(self._request("journalSince", seq))
+
+    def flush(self):
+        """ Send the pending batched writes of this thread """
+        self.__checkFork()
+        if getattr(self._local, "batch", None):
+            self.__send([])
+
+    def close(self):
+        """ Flush, then close the connections of all the threads """
+        self.flush()
+        with self._lock:
+            connections = list(self._connections)
+            self._connections = weakref.WeakSet()
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+
+    def _request(self, method, *args, **kwargs):
+        self.__checkFork()
+        batch = getattr(self._local, "batch", None)
+        if batch is not None and method in WRITES:
+            batch.append((method, args, kwargs))
+            return None
+        return self.__send([(method, args, kwargs)])
+
+    def __send(self, requests):
+        """ Send the batched writes and requests, returns the last result """
+        batch = getattr(self._local, "batch", None)
+        if batch:
+            requests = batch + requests
+            self._local.batch = []
+
+        connection = self.__connection()
+        connection.send(requests)
+        responses = connection.recv()
+        result = None
+        for (status, result) in responses:
+            if status == ERROR:
+                raise result
+        return result
+
+    def __checkFork(self):
+        """ Reset the state inherited from the parent process """
+        if self._pid != os.getpid():
+            self._lock = threading.Lock()
+            self._local = threading.local()
+            self._connections = weakref.WeakSet()
+            self._pid = os.getpid()
+
+    def __connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = Client(self.address, family="AF_UNIX",
+                                authkey=self.authkey)
+            self._local.connection = connection
+            with self._lock:
+                self._connections.add(connection)
+        return connection
+
+    def __getattr__(self, method):
+        if method in READS or method in WRITES:
+            return lambda *args, **kwargs: \
+                self._request(method, *args, **kwargs)
+        raise AttributeError("SharedStore has no attribute [%s]" % method)
+
+    def __repr__(self):
+        return "SharedStore(%s)" % self.address
+
+
+class _Batch(object):
+    def __init__(self, store):
+        self.store = store
+
+    def __enter__(self):
+        self.store._local.batch = []
+        return self.store
+
+    def __exit__(self, *exc_info):
+        try:
+            self.store.flush()
+        finally:
+            self.store._local.batch = None
@@ -0,0 +1,140 @@
+import bisect
+import functools
+import threading
+import time
+from bob.store.Channel import sizeof
+
+STATS_PATH = "__STATS__"
+STATS_OPERATIONS = ["get", "getLasts", "getSince", "query", "add", "put"]
+WRITE_OPERATIONS = ["add", "put"]
+
+# upper bounds (in seconds) of the latency histogram buckets, the last
+# bucket counts the slower operations
+LATENCY_BUCKETS = [1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0]
+
+# values sampled per channel to estimate its size
+SIZE_SAMPLES = 16
+
+
+class OperationStats(object):
+    """ Count, latency (total, max, histogram) of an operation """
+    __slots__ = ["count", "total", "max", "histogram"]
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.histogram[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def todict(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "max": self.max,
+            "histogram": list(self.histogram)
+        }
+
+
+class StoreStats(object):
+    """ Per path prefix operation stats of a Store, see Store.enableStats
+
+    Paths are aggregated on their first [depth] parts. Store calls made
+    while an instrumented operation runs in the same thread (eg. add()
+    creating the channel with put()) are accounted to that operation.
+    """
+
+    def __init__(self, depth=1):
+        if depth < 1:
+            raise ValueError("depth must be positive")
+        self.depth = depth
+        self.operations = {}  # Map<prefix, Map<operation, OperationStats>>
+        self.written_bytes = {}  # Map<prefix, bytes>
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def prefix(self, path):
+        return '.'.join(path.split('.')[:self.depth])
+
+    def wrap(self, operation, method):
+        """ Return method recording its calls as operation """
+        local = self._local
+
+        @functools.wraps(method)
+        def instrumented(path, *args, **kwargs):
+            if getattr(local, "active", False):
+                return method(path, *args, **kwargs)
+            local.active = True
+            start = time.perf_counter()
+            try:
+                return method(path, *args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                local.active = False
+                size = 0
+                if operation in WRITE_OPERATIONS and args:
+                    size = sizeof(args[0])
+                self.record(operation, path, seconds, size)
+        return instrumented
+
+    def record(self, operation, path, seconds, size=0):
+        prefix = self.prefix(path) if isinstance(path, str) else repr(path)
+        with self._lock:
+            operations = self.operations.setdefault(prefix, {})
+            stats = operations.get(operation)
+            if stats is None:
+                stats = operations[operation] = OperationStats()
+            stats.record(seconds)
+            if size:
+                self.written_bytes[prefix] = \
+                    self.written_bytes.get(prefix, 0) + size
+
+    def snapshot(self, sizes=()):
+        """ Return the stats of every prefix
+
+        sizes: (path, entries, bytes) of the channels, see channelSize()
+        """
+        prefixes = {}
+        with self._lock:
+            for (prefix, operations) in self.operations.items():
+                self.__prefix(prefixes, prefix)["operations"] = {
+                    operation: stats.todict()
+                    for (operation, stats) in operations.items()}
+            for (prefix, size) in self.written_bytes.items():
+                self.__prefix(prefixes, prefix)["written_bytes"] = size
+
+        for (path, entries, size) in sizes:
+            stats = self.__prefix(prefixes, self.prefix(path))
+            stats["entries"] += entries
+            stats["bytes"] += size
+        return {
+            "time": time.time(),
+            "buckets": list(LATENCY_BUCKETS),
+            "prefixes": prefixes
+        }
+
+    def __prefix(self, prefixes, prefix):
+        if prefix not in prefixes:
+            prefixes[prefix] = {
+                "operations": {},
+                "written_bytes": 0,
+                "entries": 0,
+                "bytes": 0
+            }
+        return prefixes[prefix]
+
+    @staticmethod
+    def channelSize(channel):
+        """ Return the (entries, approximate bytes) of channel """
+        if channel.sizes is not None:
+            return (len(channel), channel.bytes)
+        samples = channel.tail(SIZE_SAMPLES)
+        if not samples:
+            return (0, 0)
+        return (len(channel), sum(sizeof(value) for value in samples) *
+                len(channel) // len(samples))
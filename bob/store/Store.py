@@ -1,4 +1,17 @@
+import logging
+import threading
+import time
+from collections import deque
 from bob.blockchain import blockutil_U as B
+from bob.store.Channel import Channel
+from bob.store.ArrayChannel import ArrayChannel
+from bob.store.Aggregate import RollingAggregate, summarize
+from bob.store import Replay
+from bob.store.Cursor import Cursor
+from bob.store.Index import HASH_INDEX, SORTED_INDEX, createIndex, matches
+from bob.store.PayloadPool import PayloadPool
+from bob.store.Stats import StoreStats, STATS_PATH, STATS_OPERATIONS
+from bob.store.Retention import Retention
 
 MAX_PATH_LENGTH = 10
 KILL_VALUE = "__KILL__"
@@ -7,6 +20,13 @@ FLAGS = [KILL_VALUE, READ_VALUE]
 ADD_METHOD = "add"
 PUT_METHOD = "put"
 JOURNAL_PATH = "__JOURNAL__"
+JOURNAL_TIME = "metadata.time"  # time.time() of the journal blocks
+JOURNAL_PREV = "prev"  # metadata of chained blocks, hash of the previous
+SNAPSHOT_VERSION = "version"
+SNAPSHOT_JOURNAL_SEQ = "journal_seq"
+SNAPSHOT_BLOCKS = "blocks"
+SNAPSHOT_CURRENT_VERSION = 1
+LOCK_STRIPES = 16
 
 
 class StoreData(object):
@@ -25,28 +45,134 @@ class StoreData(object):
         return str(self.data)
 
 
+def _isLocal(path):
+    """ Local paths (top-level part ending with '_') are not snapshotted """
+    return path.split('.', 1)[0].endswith('_')
+
+
+def _tolist(values):
+    """ Copy of a channel, or of a sub-dictionary of channels, as lists """
+    if isinstance(values, Channel):
+        return values.tolist()
+    if isinstance(values, dict):
+        return {key: _tolist(value) for (key, value) in values.items()}
+    return values
+
+
+class _StoreLock(object):
+    """ Striped locks of Store, counts the lock depth of the thread """
+    __slots__ = ["store", "locks", "local"]
+
+    def __init__(self, store, locks):
+        self.store = store
+        self.locks = locks
+        self.local = store._local
+
+    def __enter__(self):
+        local = self.local
+        depth = getattr(local, "depth", 0)
+        if depth == 0:
+            local.pending = []
+        for lock in self.locks:
+            lock.acquire()
+        local.depth = depth + 1
+
+    def __exit__(self, *exc_info):
+        local = self.local
+        local.depth -= 1
+        for lock in reversed(self.locks):
+            lock.release()
+        if local.depth == 0 and local.pending:
+            self.store._flushNotifications()
+
+
 class Store(object):
     """ This is a dictionnary with a few additions
 
     Path are channels
-    All path entries are list
+    All path entries are list (stored as append-optimized Channel)
     .add(path, value) -> create list or append
     .get(path, filter) -> get filtered list, filter is executed on store
     .getLast(path, maxCount) -> get the last X items
     .getSince(path, lastItem) -> get all items since lastItem
+    .cursor(path) -> read position, cursor.readNew() returns new items
+    .waitFor(cursors, timeout) -> block until a cursor has new items
+    .subscribe(prefix, callback) -> callback(method, path, data) on update
+    .setRetention(prefix, max_entries, max_bytes, max_age) -> capped paths
+    .createIndex(prefix, field, kind) -> index a field of the values
+    .setTyped(prefix, typecode) -> numbers packed in arrays, see getView()
+    .aggregate(path, last, window) -> mean, min, max, percentiles, rate
+    .rolling(path, last, window) -> aggregates updated on every add
+    .query(path, where, between, limit, reverse) -> indexed get
+    .compactJournal() -> drop journal blocks superseded by put/clear
+    .snapshot() -> point-in-time copy, see loadSnapshot()
+    .flushJournal() -> build the blocks of a deferred journal
+    .replay(raws) -> bulk processBlock(), see Replay
+    .journalRoot(start, end) -> Merkle root of journal blocks, see Journal
+    .journalCheckpoints() -> Merkle roots of the journal every
+                             checkpoint_interval blocks
+    .payloadStats() -> payload pool usage, see PayloadPool
+    .enableStats(depth, interval) -> per prefix operation stats, .stats()
 
     Additions:
         * support multiple deepness of storage
         * execute UNSECURED actions to update itself
         * easy path traversal
+        * thread safe: one lock per top-level path part (striped locks),
+          writes to "a.x" and "b.y" do not wait for each other
+
+    Arguments:
+        deferred_journal: when True, writes only queue a journal record,
+                          blocks are built (and hashed) in batches by
+                          flushJournal(). Reading the journal flushes it.
+        journal_flush_interval: with deferred_journal, a background
+                                thread flushes the journal every
+                                [journal_flush_interval] seconds
+        payload_pool: when True, equal payloads are stored once and
+                      shared by the channels and the journal blocks
+        chain_journal: when True, the metadata of each journal block
+                       holds the hash of the previous block (JOURNAL_PREV)
+        checkpoint_interval: keep the Merkle root of every
+                             [checkpoint_interval] journal blocks
 
     TODO:
         * add channel with permissions?
         * add symetric encryption per "block" in add(),put()...
     """
 
-    def __init__(self):
+    def __init__(self, deferred_journal=False, journal_flush_interval=None,
+                 payload_pool=False, chain_journal=False,
+                 checkpoint_interval=None):
         self.data = StoreData({})
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._waiters = {}  # Map<top-level path part, Map<Event, [path]>>
+        self._waiters_lock = threading.Lock()
+        self._subscriptions = {}  # Map<path prefix, [callback]>
+        self._locks = [threading.RLock() for _ in range(LOCK_STRIPES)]
+        self._local = threading.local()
+        self._retentions = {}  # Map<path prefix, Retention>
+        self._indexes = {  # Map<path prefix, Map<field, index kind>>
+            JOURNAL_PATH: {JOURNAL_TIME: SORTED_INDEX}
+        }
+        self._types = {}  # Map<path prefix, (typecode, timestamps)>
+        self._deferred_journal = deferred_journal
+        self._pool = PayloadPool() if payload_pool else None
+        self._journal_records = deque()  # (method, path, data, time)
+        self._journal_stop = threading.Event()
+        self._journal_worker = None
+        self._chain_journal = chain_journal
+        self._journal_head = None  # hash of the last journal block
+        self._checkpoint_interval = checkpoint_interval
+        self._server = None  # see StoreServer.forStore()
+        self._checkpoints = []  # {"start", "end", "root"}
+        self._stats = None
+        self._stats_stop = None
+        if deferred_journal and journal_flush_interval:
+            self._journal_worker = threading.Thread(
+                target=self.__flushJournalEvery,
+                args=(journal_flush_interval,),
+                name="StoreJournal", daemon=True)
+            self._journal_worker.start()
 
     def processBlock(self, signal_data):
         block = B.deserialize(signal_data)
@@ -54,6 +180,8 @@ class Store(object):
         method = block[B.METADATA]['method']
         path = block[B.METADATA]['path']
         data = block[B.DATA]
+        if self._pool is not None and method == ADD_METHOD:
+            data = self._pool.intern(data, block[B.DATA_HASH])
 
         if method == ADD_METHOD:
             self.add(path, data)
@@ -63,9 +191,37 @@ class Store(object):
             raise ValueError("unknown method [%s], block: %s",
                              method, block[B.HASH])
 
+    def replay(self, raws, journal=False, strict=True, workers=None):
+        """ Apply serialized blocks in order, faster than processBlock()
+
+        The blocks are validated by batches in [workers] processes, see
+        B.validate_many().
+        Consecutive adds to the same path are applied at once.
+        journal: False skips the journal, True appends the replayed
+                 blocks to it as they are (they are not rebuilt)
+        strict: raise ValueError on the first invalid block (the blocks
+                of its batch are not applied), otherwise skip it
+        Returns {blocks, applied, invalid, seconds, blocks_per_second}
+        """
+        started_at = time.perf_counter()
+        report = {"blocks": 0, "applied": 0, "invalid": 0}
+        batch = []
+        for raw in raws:
+            batch.append(raw)
+            if len(batch) >= Replay.REPLAY_BATCH:
+                self.__replayBatch(batch, workers, journal, strict, report)
+                batch = []
+        if batch:
+            self.__replayBatch(batch, workers, journal, strict, report)
+        report["seconds"] = time.perf_counter() - started_at
+        report["blocks_per_second"] = report["blocks"] / report["seconds"] \
+            if report["seconds"] > 0 else 0.0
+        return report
+
     def get(self, path, filter_func=None):
         """return the value stored on this path (if any)"""
-        values = self.__updatePath(path)
+        with self._locked(path):
+            values = _tolist(self._getChannel(path))
         if filter_func:
             values = filter(filter_func, values)
         return values
@@ -79,8 +235,61 @@ class Store(object):
                 "Value at path [%s] is not a single object", path)
 
     def getLasts(self, path, max_count):
-        values = self.get(path)
-        return values[-1 * (min(len(values), max_count)):]
+        with self._locked(path):
+            values = self._getChannel(path)
+            if isinstance(values, Channel):
+                return values.tail(max_count)
+            return values[-1 * (min(len(values), max_count)):]
+
+    def getView(self, path, max_count, times=False):
+        """ Return the last values of a typed channel without copying
+        them, (values, times) with times, see ArrayChannel.view """
+        with self._locked(path):
+            channel = self._getChannel(path)
+            if not isinstance(channel, ArrayChannel):
+                raise TypeError("Path [%s] is not a typed channel" % path)
+            return channel.view(max_count, times=times)
+
+    def aggregate(self, path, last=None, window=None, percentiles=()):
+        """ Return the aggregates of the numbers at path, see summarize()
+
+        last: only the last [last] values
+        window: only the values added during the last [window] seconds,
+                needs append times (typed channel with timestamps or
+                max_age retention), the rate is per second
+        percentiles: eg. [50, 99] -> "p50", "p99" entries
+        Typed channels are aggregated with numpy when installed.
+        """
+        with self._locked(path):
+            channel = self._getChannel(path)
+            if channel is None:
+                return summarize([], percentiles)
+            if not isinstance(channel, Channel):
+                raise TypeError("Path [%s] is not a channel" % path)
+
+            count = len(channel) if last is None else min(last, len(channel))
+            if window is not None:
+                count = min(count, self.__countSince(
+                    path, channel, time.time() - window))
+            if isinstance(channel, ArrayChannel):
+                values = channel.view(count)
+            else:
+                values = channel.tail(count)
+            return summarize(values, percentiles, window)
+
+    def rolling(self, path, last=None, window=None, percentiles=()):
+        """ Return a RollingAggregate of path, updated on every add
+
+        The current values of path are counted as added now.
+        """
+        rolling = RollingAggregate(path, last, window, percentiles)
+        with self._locked(path):
+            channel = self._getChannel(path)
+            if isinstance(channel, Channel):
+                rolling.reset(channel.tail(len(channel) if last is None
+                                           else last))
+            self.subscribe(path, rolling.onUpdate)
+        return rolling
 
     def getSince(self, path, last_value=None):
         values = self.get(path)
@@ -89,43 +298,642 @@ class Store(object):
                 return values[pos+1:]
         raise ValueError("Unknown last_value %s", last_value)
 
+    def cursor(self, path, from_start=True):
+        """ Return a Cursor reading the channel at path
+
+        from_start: when False, only values added after the creation
+                    of the cursor are read
+        """
+        return Cursor(self, path, from_start=from_start)
+
+    def waitFor(self, cursors, timeout=None):
+        """ Block until one of the cursors has new values to read
+
+        cursors: a Cursor or a list of Cursors of this store
+        timeout: max waiting time in seconds, None waits forever
+        Returns False if the timeout expired without new values
+
+        Only the writes to the paths of the cursors (or to a parent path)
+        wake up the waiting thread.
+        """
+        if isinstance(cursors, Cursor):
+            cursors = [cursors]
+        deadline = None if timeout is None else time.monotonic() + timeout
+        event = threading.Event()
+        paths = [cursor.path for cursor in cursors]
+        self.__addWaiter(event, paths)
+        try:
+            while not any(cursor.hasNew() for cursor in cursors):
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                event.wait(remaining)
+                event.clear()
+            return True
+        finally:
+            self.__removeWaiter(event, paths)
+
+    def subscribe(self, prefix, callback):
+        """ Call callback(method, path, data) on every update under prefix
+
+        The prefix matches whole path parts: "a.b" matches "a.b" and
+        "a.b.c" but not "a.bc". An empty prefix matches every path.
+        Callbacks run synchronously in the thread writing to the store.
+        """
+        if not callable(callback):
+            raise TypeError("callback must be callable")
+        self._subscriptions.setdefault(prefix, []).append(callback)
+
+    def unsubscribe(self, prefix, callback):
+        callbacks = self._subscriptions.get(prefix, [])
+        if callback not in callbacks:
+            raise ValueError("callback is not subscribed to [%s]" % prefix)
+        callbacks.remove(callback)
+        if not callbacks:
+            del self._subscriptions[prefix]
+
+    def setRetention(self, prefix, max_entries=None, max_bytes=None,
+                     max_age=None):
+        """ Cap the channels under prefix, returns the Retention policy
+
+        The most specific prefix applies to a channel. Existing channels
+        are capped immediately. Without any limit, the policy of prefix
+        is removed.
+        """
+        retention = Retention(max_entries, max_bytes, max_age)
+        if retention.isEmpty():
+            self._retentions.pop(prefix, None)
+            retention = None
+        else:
+            self._retentions[prefix] = retention
+
+        for (path, channel) in list(self.__channels(prefix)):
+            with self._locked(path):
+                channel.setRetention(self.getRetention(path))
+        return retention
+
+    def getRetention(self, path):
+        """ Return the Retention policy (and counters) applying to path """
+        parts = path.split('.')
+        for i in range(len(parts), -1, -1):
+            retention = self._retentions.get('.'.join(parts[:i]))
+            if retention is not None:
+                return retention
+        return None
+
+    def setTyped(self, prefix, typecode="d", timestamps=False):
+        """ Store the numbers of the channels under prefix in arrays
+
+        typecode: array typecode of the values, eg: "d" (float), "q" (int)
+        timestamps: also keep the append time of each value
+        The most specific prefix applies to a channel. Existing channels
+        are converted immediately. With typecode None, the channels
+        under prefix are no longer typed.
+        """
+        if typecode is None:
+            self._types.pop(prefix, None)
+        else:
+            ArrayChannel(typecode=typecode)  # validates typecode
+            self._types[prefix] = (typecode, timestamps)
+
+        for (path, channel) in list(self.__channels(prefix)):
+            with self._locked(path):
+                # same sequence numbers: cursors keep their position
+                replacement = self.__newChannel(path, [])
+                replacement.offset = channel.offset
+                replacement.lineage = channel.lineage
+                replacement.extend(channel.tolist())
+                self.__setChannel(path, replacement)
+
+    def getTyped(self, path):
+        """ Return the (typecode, timestamps) of path, None if untyped """
+        parts = path.split('.')
+        for i in range(len(parts), -1, -1):
+            typed = self._types.get('.'.join(parts[:i]))
+            if typed is not None:
+                return typed
+        return None
+
+    def createIndex(self, prefix, field, kind=HASH_INDEX):
+        """ Index [field] of the values of the channels under prefix
+
+        field: dotted path in the values, eg: "metadata.path", see
+               Index.fieldValue
+        kind: HASH_INDEX (equality) or SORTED_INDEX (equality and range)
+        Existing channels are indexed immediately.
+        """
+        createIndex(field, kind)  # validates kind
+        self._indexes.setdefault(prefix, {})[field] = kind
+        for (path, channel) in list(self.__channels(prefix)):
+            with self._locked(path):
+                channel.addIndex(createIndex(field, kind))
+
+    def dropIndex(self, prefix, field):
+        kinds = self._indexes.get(prefix, {})
+        if field not in kinds:
+            raise ValueError("No index on [%s] under [%s]" % (field, prefix))
+        del kinds[field]
+        if not kinds:
+            del self._indexes[prefix]
+        for (path, channel) in list(self.__channels(prefix)):
+            with self._locked(path):
+                channel.dropIndex(field)
+                for (other, kind) in self.__indexes(path).items():
+                    if other not in channel.indexes:
+                        channel.addIndex(createIndex(other, kind))
+
+    def query(self, path, where=None, between=None, limit=None,
+              reverse=False):
+        """ Return the values at path matching every condition
+
+        where: {field: value} equality conditions
+        between: {field: (low, high)} inclusive ranges, None is unbounded
+        limit: max number of values returned
+        reverse: newest values first (default: oldest first)
+
+        An index of the channel (see createIndex) selects the candidate
+        values, the channel is scanned when no index applies.
+        """
+        where = where or {}
+        between = between or {}
+        with self._locked(path):
+            channel = self._getChannel(path)
+            if channel is None:
+                return []
+            if isinstance(channel, list):
+                channel = Channel(channel)
+            if not isinstance(channel, Channel):
+                raise TypeError("Path [%s] is not a channel" % path)
+
+            seqs = self.__lookup(channel, where, between)
+            if seqs is None:
+                seqs = range(channel.offset, channel.nextSeq())
+            if reverse:
+                seqs = reversed(seqs)
+
+            values = []
+            for seq in seqs:
+                if limit is not None and len(values) >= limit:
+                    break
+                value = channel.at(seq)
+                if matches(value, where, between):
+                    values.append(value)
+            return values
+
+    def compactJournal(self):
+        """ Drop the journal blocks superseded by a later put() or clear()
+
+        Cursors at the end of the journal stay valid, cursors behind
+        skip the compacted blocks. Returns the number of dropped blocks.
+
+        A chained journal is rebased (see Journal.rebase()): the kept
+        blocks after the first dropped one get new hashes, peers see the
+        chains diverge there. The checkpoints are replaced by an anchor
+        checkpoint over the compacted blocks, the next checkpoints start
+        at its end.
+        """
+        from bob.store import Journal
+        with self._locked(JOURNAL_PATH):
+            self.flushJournal()
+            journal = self.__updatePath(JOURNAL_PATH)
+            if not isinstance(journal, Channel):
+                return 0
+            blocks = journal.tolist()
+            kept = Journal.compact(blocks)
+            if self._chain_journal and blocks:
+                base = blocks[0][B.METADATA].get(JOURNAL_PREV)
+                kept = Journal.rebase(kept, base)
+                self._journal_head = kept[-1][B.HASH] if kept else base
+            journal.rewrite(kept)
+            self._checkpoints = []  # the compacted ranges changed
+            if self._checkpoint_interval and kept:
+                self._checkpoints.append({
+                    "start": journal.offset,
+                    "end": journal.nextSeq(),
+                    "root": Journal.merkleRoot(kept)
+                })
+        return len(blocks) - len(kept)
+
+    def snapshot(self):
+        """ Return a point-in-time snapshot of the store
+
+        The snapshot holds one serialized put block per channel and the
+        journal sequence number it was taken at. Local paths (top-level
+        part ending with '_', eg the journal) are not included, and
+        loadSnapshot() skips their blocks of the journal tail: the
+        rebuilt store has none of them. A value which the binary codec
+        cannot encode raises TypeError (see B.dumps()).
+
+        Rebuild: new_store.loadSnapshot(snapshot, store.journalSince(
+                                        snapshot[SNAPSHOT_JOURNAL_SEQ]))
+        """
+        blocks = []
+        with self._lockedAll():
+            self.flushJournal()
+            for (path, channel) in self.__channels(""):
+                if _isLocal(path):
+                    continue
+                block = B.create("store", channel.tolist(), {
+                    "method": PUT_METHOD,
+                    "path": path
+                })
+                blocks.append(B.serialize(block))
+            journal = self.__updatePath(JOURNAL_PATH)
+            journal_seq = journal.nextSeq() if journal is not None else 0
+        return {
+            SNAPSHOT_VERSION: SNAPSHOT_CURRENT_VERSION,
+            SNAPSHOT_JOURNAL_SEQ: journal_seq,
+            SNAPSHOT_BLOCKS: blocks
+        }
+
+    def loadSnapshot(self, snapshot, tail=None):
+        """ Rebuild from a snapshot and the journal blocks written after it
+
+        tail: journal blocks (dict) written after the snapshot, the
+              blocks of local paths are skipped (see snapshot())
+        """
+        if snapshot.get(SNAPSHOT_VERSION) != SNAPSHOT_CURRENT_VERSION:
+            raise ValueError("Unsupported snapshot version [%s]" %
+                             snapshot.get(SNAPSHOT_VERSION))
+        for raw in snapshot[SNAPSHOT_BLOCKS]:
+            self.processBlock(raw)
+        for block in tail or []:
+            if not _isLocal(block[B.METADATA]["path"]):
+                self.processBlock(B.serialize(block))
+
+    def flushJournal(self):
+        """ Build and append the blocks of the deferred journal records
+
+        Returns the number of appended blocks
+        """
+        flushed = 0
+        with self._locked(JOURNAL_PATH):
+            while self._journal_records:
+                (method, path, data, timestamp) = \
+                    self._journal_records.popleft()
+                self.__journal(method, path, data, timestamp)
+                flushed += 1
+        return flushed
+
+    def close(self):
+        """ Stop the background threads and the StoreServer, flush the
+        journal """
+        if self._server is not None:
+            self._server.close()
+        self.disableStats()
+        self._journal_stop.set()
+        if self._journal_worker is not None:
+            self._journal_worker.join()
+            self._journal_worker = None
+        self.flushJournal()
+
+    def payloadStats(self):
+        """ Return the payload pool counters (payloads, references, bytes,
+        hits, bytes_saved), None without payload_pool """
+        return self._pool.stats() if self._pool is not None else None
+
+    def enableStats(self, depth=1, interval=None, max_entries=1000):
+        """ Instrument get(), add(), put()... with per prefix stats
+
+        depth: number of path parts of the prefixes
+        interval: when set, stats() is appended to STATS_PATH (without
+                  journaling) every [interval] seconds, the channel
+                  keeps the last [max_entries] stats
+        Disabled stats cost nothing: the instrumented methods are only
+        installed on this instance while enabled.
+        """
+        if self._stats is not None:
+            self.disableStats()
+        self._stats = StoreStats(depth)
+        for operation in STATS_OPERATIONS:
+            setattr(self, operation,
+                    self._stats.wrap(operation, getattr(self, operation)))
+        if interval:
+            if self.getRetention(STATS_PATH) is None:
+                self.setRetention(STATS_PATH, max_entries=max_entries)
+            self._stats_stop = threading.Event()
+            threading.Thread(target=self.__writeStatsEvery,
+                             args=(interval, self._stats_stop),
+                             name="StoreStats", daemon=True).start()
+
+    def disableStats(self):
+        if self._stats is None:
+            return
+        if self._stats_stop is not None:
+            self._stats_stop.set()
+            self._stats_stop = None
+        for operation in STATS_OPERATIONS:
+            self.__dict__.pop(operation, None)
+        self._stats = None
+
+    def stats(self):
+        """ Return the operation counters and latency histograms, entries
+        and approximate bytes per prefix, None when stats are disabled """
+        stats = self._stats
+        if stats is None:
+            return None
+        sizes = []
+        for (path, channel) in list(self.__channels("")):
+            with self._locked(path):
+                sizes.append((path,) + stats.channelSize(channel))
+        return stats.snapshot(sizes)
+
+    def journalRange(self, t_start=None, t_end=None, path_prefix=None):
+        """ Return the journal blocks written in [t_start, t_end]
+
+        t_start, t_end: time.time() seconds, None is unbounded
+        path_prefix: only the blocks of the paths under path_prefix, the
+                     prefix matches whole path parts (see subscribe)
+        The blocks are found by binary search in the sorted index of
+        their JOURNAL_TIME.
+        """
+        blocks = self.query(JOURNAL_PATH,
+                            between={JOURNAL_TIME: (t_start, t_end)})
+        if path_prefix:
+            blocks = [block for block in blocks
+                      if block[B.METADATA]["path"] == path_prefix or
+                      block[B.METADATA]["path"].startswith(path_prefix + '.')]
+        return blocks
+
+    def journalRoot(self, start=0, end=None):
+        """ Return the Merkle root of the journal blocks in [start, end[,
+        None if there is none (see Journal.merkleRoot) """
+        from bob.store import Journal
+        return Journal.merkleRoot(self.__journalBlocks(start, end))
+
+    def journalCheckpoints(self, since=0):
+        """ Return the checkpoints ({"start", "end", "root"}) of the
+        journal blocks from seq [since]
+
+        Peers compare their checkpoints, then search the diverging range
+        with Journal.findDivergence()
+        """
+        with self._locked(JOURNAL_PATH):
+            self.flushJournal()
+            return [dict(checkpoint) for checkpoint in self._checkpoints
+                    if checkpoint["end"] > since]
+
+    def journalSince(self, seq):
+        """ Return an iterator over the journal blocks from seq """
+        journal = self._getChannel(JOURNAL_PATH)
+        if not isinstance(journal, Channel):
+            return iter([])
+        return journal.since(seq, lock=self._locked(JOURNAL_PATH))
+
     def addAll(self, path, values):
         if not isinstance(values, list):
             raise TypeError("Values must be a list")
-        for value in values:
-            self.add(path, value)
+        with self._locked(path):
+            for value in values:
+                self.add(path, value)
 
-    def add(self, path, value):
-        values = self.get(path) + [value] if self.get(path) else [value]
-        self.put(path, values, journal=False)
-        self._onUpdate(ADD_METHOD, path, value)
+    def add(self, path, value, journal=True):
+        if self._pool is not None and path != JOURNAL_PATH:
+            value = self._pool.intern(value)
+        with self._locked(path):
+            channel = self.__updatePath(path)
+            if channel is None:
+                self.put(path, [value], journal=False)
+            elif isinstance(channel, Channel):
+                channel.append(value)
+            else:
+                raise TypeError("Path [%s] is not a channel" % path)
+            if journal:
+                self._onUpdate(ADD_METHOD, path, value)
+            else:
+                self.__notify(ADD_METHOD, path, value)
 
     def put(self, path, value, journal=True):
         value_adjusted = value
         if type(value) != list and value not in FLAGS:
             value_adjusted = [value_adjusted]
+        if self._pool is not None and path != JOURNAL_PATH and \
+                value_adjusted not in FLAGS:
+            value_adjusted = [self._pool.intern(item)
+                              for item in value_adjusted]
 
-        # failsafe, eg when value = KILL_VALUE
-        if self.__updatePath(path, value_adjusted) != value_adjusted:
-            raise RuntimeError(
-                "Could not write at path [%s]: %s", path, value_adjusted)
+        with self._locked(path):
+            # failsafe, eg when value = KILL_VALUE
+            if self.__updatePath(path, value_adjusted) != value_adjusted:
+                raise RuntimeError(
+                    "Could not write at path [%s]: %s", path, value_adjusted)
 
-        # journal
-        if journal:
-            self._onUpdate(PUT_METHOD, path, value_adjusted)
+            # journal
+            if journal:
+                self._onUpdate(PUT_METHOD, path, value_adjusted)
 
     def clear(self, path):
         self.put(path, KILL_VALUE)
 
+    def _getChannel(self, path):
+        """ Return the Channel (or sub-dictionary) at path, None if empty
+
+        Read accessor shared by get(), getLasts()... subclasses may
+        override it to change what is read (eg: MockStore)
+        """
+        if path == JOURNAL_PATH and self._journal_records:
+            self.flushJournal()
+        channel = self.__updatePath(path)
+        if isinstance(channel, Channel) and channel.times is not None:
+            channel.enforce()
+        return channel
+
     def _onUpdate(self, method, path, data):
-        if path == JOURNAL_PATH:
+        if path != JOURNAL_PATH:
+            if self._deferred_journal:
+                self._journal_records.append((method, path, data,
+                                              time.time()))
+            else:
+                self.__journal(method, path, data)
+        self.__notify(method, path, data)
+
+    def _apply(self, method, path, data):
+        """ Apply replayed blocks without journaling them
+
+        method ADD_METHOD: data is the list of the consecutive added values
+        method PUT_METHOD: data is the put value
+        """
+        if method == PUT_METHOD:
+            self.put(path, data, journal=False)
+            self.__notify(method, path, data)
             return
+        if method != ADD_METHOD:
+            raise ValueError("unknown method [%s]" % method)
+
+        with self._locked(path):
+            channel = self.__updatePath(path)
+            if channel is None:
+                self.__updatePath(path, list(data))
+            elif isinstance(channel, Channel):
+                channel.extend(data)
+            else:
+                raise TypeError("Path [%s] is not a channel" % path)
+            for value in data:
+                self.__notify(method, path, value)
+
+    def __replayBatch(self, raws, workers, journal, strict, report):
+        flags = B.validate_many(raws, workers)
+        report["blocks"] += len(raws)
+        if strict and not all(flags):
+            raise ValueError("invalid block at position %d" %
+                             (report["blocks"] - len(raws) + flags.index(False)))
+        blocks = [Replay.loadRaw(raw) for (raw, valid) in zip(raws, flags)
+                  if valid]
+        report["invalid"] += len(raws) - len(blocks)
+
+        for (method, path, data, group) in Replay.collapse(blocks,
+                                                           ADD_METHOD):
+            if self._pool is not None and method == ADD_METHOD:
+                data = [self._pool.intern(value, block[B.DATA_HASH])
+                        for (value, block) in zip(data, group)]
+                for (value, block) in zip(data, group):
+                    block[B.DATA] = value  # shared with the journal
+            self._apply(method, path, data)
+            if journal:
+                with self._locked(JOURNAL_PATH):
+                    self._apply(ADD_METHOD, JOURNAL_PATH, group)
+                    self._journal_head = group[-1][B.HASH]
+                    self.__checkpoint()
+            report["applied"] += len(group)
+
+    def __journal(self, method, path, data, timestamp=None):
+        timestamp = timestamp or time.time()
         metadata = {
             "method": method,
-            "path": path
+            "path": path,
+            "time": timestamp
         }
-        block = B.create("store", data, metadata)
-        self.add(JOURNAL_PATH, block)
+        payload_hash = self._pool.hashOf(data) if self._pool else None
+        if not self._chain_journal and not self._checkpoint_interval:
+            block = B.create("store", data, metadata, timestamp=timestamp,
+                             payload_hash=payload_hash)
+            self.add(JOURNAL_PATH, block)
+            return
+
+        with self._locked(JOURNAL_PATH):  # linked in journal order
+            if self._chain_journal:
+                metadata[JOURNAL_PREV] = self._journal_head
+            block = B.create("store", data, metadata, timestamp=timestamp,
+                             payload_hash=payload_hash)
+            self.add(JOURNAL_PATH, block)
+            self._journal_head = block[B.HASH]
+            self.__checkpoint()
+
+    def __checkpoint(self):
+        """ Add the missing checkpoints of the journal """
+        from bob.store import Journal
+        interval = self._checkpoint_interval
+        journal = self.__updatePath(JOURNAL_PATH)
+        if not interval or not isinstance(journal, Channel):
+            return
+        start = self._checkpoints[-1]["end"] if self._checkpoints else 0
+        if start < journal.offset:  # evicted blocks
+            start = -(-journal.offset // interval) * interval
+        while start + interval <= journal.nextSeq():
+            self._checkpoints.append({
+                "start": start,
+                "end": start + interval,
+                "root": Journal.merkleRoot(
+                    journal.since(start, start + interval))
+            })
+            start += interval
+
+    def __journalBlocks(self, start, end):
+        journal = self._getChannel(JOURNAL_PATH)
+        if not isinstance(journal, Channel):
+            return []
+        with self._locked(JOURNAL_PATH):
+            return list(journal.since(start, end))
+
+    def __writeStatsEvery(self, interval, stop):
+        while not stop.wait(interval):
+            stats = self.stats()
+            if stats is not None:
+                Store.add(self, STATS_PATH, stats, journal=False)
+
+    def __flushJournalEvery(self, interval):
+        while not self._journal_stop.wait(interval):
+            self.flushJournal()
+
+    def _locked(self, path):
+        """ Return the lock of the top-level part of path, use with 'with'
+
+        Locks are re-entrant. Notifications raised while holding a lock
+        are delayed until this thread releases its outermost lock, thus
+        callbacks never run while holding a lock.
+        """
+        return _StoreLock(self, [self.__stripe(path)])
+
+    def _lockedAll(self):
+        """ Return all the locks of the store, use with 'with'
+
+        The journal lock is taken last: writers hold their path lock
+        while appending to the journal.
+        """
+        journal_lock = self.__stripe(JOURNAL_PATH)
+        locks = [lock for lock in self._locks if lock is not journal_lock]
+        return _StoreLock(self, locks + [journal_lock])
+
+    def __stripe(self, path):
+        if type(path) != str:
+            raise ValueError("Path is not a string: %s" % path)
+        return self._locks[hash(path.split('.', 1)[0]) % LOCK_STRIPES]
+
+    def __notify(self, method, path, data):
+        local = self._local
+        if getattr(local, "depth", 0) > 0:
+            local.pending.append((method, path, data))
+        else:
+            self.__runNotification(method, path, data)
+
+    def _flushNotifications(self):
+        pending = self._local.pending
+        while pending:
+            self.__runNotification(*pending.pop(0))
+
+    def __addWaiter(self, event, paths):
+        with self._waiters_lock:
+            for path in paths:
+                waiters = self._waiters.setdefault(path.split('.', 1)[0], {})
+                waiters.setdefault(event, []).append(path)
+
+    def __removeWaiter(self, event, paths):
+        with self._waiters_lock:
+            for key in set(path.split('.', 1)[0] for path in paths):
+                waiters = self._waiters.get(key, {})
+                waiters.pop(event, None)
+                if not waiters:
+                    self._waiters.pop(key, None)
+
+    def __wakeWaiters(self, path):
+        """ Wake up the waitFor() reading path or a path under it """
+        with self._waiters_lock:
+            waiters = self._waiters.get(path.split('.', 1)[0])
+            if not waiters:
+                return
+            prefix = path + '.'
+            events = [event for (event, paths) in waiters.items()
+                      if any(waited == path or waited.startswith(prefix)
+                             for waited in paths)]
+        for event in events:
+            event.set()
+
+    def __runNotification(self, method, path, data):
+        """ Wake up waitFor() and run the callbacks subscribed to path """
+        self.__wakeWaiters(path)
+
+        if not self._subscriptions:
+            return
+        parts = path.split('.')
+        prefixes = ['.'.join(parts[:i]) for i in range(len(parts) + 1)]
+        for prefix in prefixes:
+            for callback in list(self._subscriptions.get(prefix, [])):
+                try:
+                    callback(method, path, data)
+                except Exception:
+                    self.logger.exception("Callback failed on [%s]", path)
 
     def __updatePath(self, path, value=READ_VALUE):
         """ Read or Write to the store
@@ -149,21 +957,117 @@ class Store(object):
         cell = self.data.get()
         while len(parts) > 1:
             if parts[0] not in cell:
+                if value == READ_VALUE:
+                    return None
                 cell[parts[0]] = {}
 
             cell = cell[parts[0]]
             parts = parts[1:]
+            if not isinstance(cell, dict):
+                raise TypeError("Path [%s] goes through a channel" % path)
 
         if value == KILL_VALUE:
             if parts[0] in cell:
-                del cell[parts[0]]
+                self.__drop(cell.pop(parts[0]))
                 return KILL_VALUE
             return None
         elif value == READ_VALUE:
             return cell[parts[0]] if parts[0] in cell else None
         else:
-            cell[parts[0]] = value
+            channel = self.__newChannel(path, value)
+            if parts[0] in cell:
+                self.__drop(cell[parts[0]])
+            cell[parts[0]] = channel
             return value
 
+    def __newChannel(self, path, values):
+        """ Return a Channel of values with the settings of path """
+        indexes = [createIndex(field, kind) for (field, kind)
+                   in self.__indexes(path).items()]
+        pool = self._pool
+        if pool is not None and path == JOURNAL_PATH:
+            pool = pool.field(B.DATA)
+        typed = self.getTyped(path)
+        if typed is not None:
+            return ArrayChannel(values, typecode=typed[0],
+                                timestamps=typed[1], indexes=indexes,
+                                retention=self.getRetention(path), pool=pool)
+        return Channel(values, retention=self.getRetention(path),
+                       indexes=indexes, pool=pool)
+
+    def __setChannel(self, path, channel):
+        """ Replace the existing channel at path (keeps pool references) """
+        parts = path.split('.')
+        cell = self.data.get()
+        for part in parts[:-1]:
+            cell = cell[part]
+        cell[parts[-1]].drop()
+        cell[parts[-1]] = channel
+
+    def __drop(self, node):
+        """ Release the pooled payloads of a removed channel or dict """
+        if self._pool is None:
+            return
+        if isinstance(node, Channel):
+            node.drop()
+        elif isinstance(node, dict):
+            for child in node.values():
+                self.__drop(child)
+
+    def __countSince(self, path, channel, timestamp):
+        """ Return the number of values of channel appended at or after
+        timestamp, without copying the append times """
+        if isinstance(channel, ArrayChannel) and channel.timestamps:
+            return channel.countSince(timestamp)
+        if channel.times is not None:
+            # the window is the tail of the retention times: O(window)
+            count = 0
+            for appended_at in reversed(channel.times):
+                if appended_at < timestamp:
+                    break
+                count += 1
+            return count
+        raise ValueError("Path [%s] has no append times, use setTyped("
+                         "timestamps=True) or a max_age retention" % path)
+
+    def __indexes(self, path):
+        """ Return the {field: kind} indexed for path """
+        indexes = {}
+        parts = path.split('.')
+        for i in range(len(parts) + 1):
+            indexes.update(self._indexes.get('.'.join(parts[:i]), {}))
+        return indexes
+
+    def __lookup(self, channel, where, between):
+        """ Return the sorted sequence numbers selected by an index of
+        channel, None if no index applies """
+        for (field, value) in where.items():
+            index = channel.indexes.get(field)
+            if index is not None:
+                seqs = index.equal(value)
+                if seqs is not None:
+                    return seqs
+        for (field, (low, high)) in between.items():
+            index = channel.indexes.get(field)
+            if index is not None:
+                seqs = index.between(low, high)
+                if seqs is not None:
+                    return seqs
+        return None
+
+    def __channels(self, prefix):
+        """ Yield (path, channel) for every channel under prefix """
+        node = self.__updatePath(prefix) if prefix else self.data.get()
+        if isinstance(node, Channel):
+            yield (prefix, node)
+        elif isinstance(node, dict):
+            for (key, child) in list(node.items()):
+                path = prefix + '.' + key if prefix else key
+                if isinstance(child, Channel):
+                    yield (path, child)
+                else:
+                    for found in self.__channels(path):
+                        yield found
+
     def __repr__(self):
         return str(self.data.get())
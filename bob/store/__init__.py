@@ -1,2 +1,12 @@
 from bob.store.Store import *
-from bob.store.MockStore import *
\ No newline at end of file
+from bob.store.MockStore import *
+from bob.store.Channel import *
+from bob.store.Cursor import *
+from bob.store.Retention import *
+from bob.store.LogStore import *
+from bob.store.SharedStore import *
+from bob.store.PayloadPool import *
+from bob.store.Stats import *
+from bob.store.ArrayChannel import *
+from bob.store.Aggregate import *
+from bob.store.Replay import *
\ No newline at end of file
@@ -0,0 +1,73 @@
+import time
+import unittest
+from bob.store import Store, RollingAggregate, summarize
+
+
+class TestAggregate(unittest.TestCase):
+
+    def test_summarize(self):
+        summary = summarize([4, 1, 3, 2], percentiles=[50, 100], duration=2)
+        self.assertEqual(summary, {"count": 4, "sum": 10, "mean": 2.5,
+                                   "min": 1, "max": 4, "rate": 2.0,
+                                   "p50": 2.5, "p100": 4})
+        self.assertEqual(summarize([], [50])["p50"], None)
+
+    def test_aggregate(self):
+        store = Store()
+        store.addAll("m", list(range(10)))
+        self.assertEqual(store.aggregate("m")["mean"], 4.5)
+        summary = store.aggregate("m", last=4, percentiles=[50])
+        self.assertEqual((summary["min"], summary["max"], summary["p50"]),
+                         (6, 9, 7.5))
+        self.assertEqual(store.aggregate("missing")["count"], 0)
+        with self.assertRaises(ValueError):
+            store.aggregate("m", window=10)
+
+    def test_aggregate_typed(self):
+        store = Store()
+        store.setTyped("m", timestamps=True)
+        store.addAll("m.x", [1, 2, 3])
+        store._getChannel("m.x").time_chunks[0][0] = time.time() - 100
+        summary = store.aggregate("m.x", window=10, percentiles=[0])
+        self.assertEqual((summary["count"], summary["sum"], summary["p0"]),
+                         (2, 5.0, 2.0))
+        self.assertEqual(summary["rate"], 0.2)
+        self.assertEqual(store.aggregate("m.x", last=10)["count"], 3)
+
+    def test_aggregate_maxAge(self):
+        store = Store()
+        store.setRetention("m", max_age=100)
+        store.addAll("m", [1, 2])
+        self.assertEqual(store.aggregate("m", window=10)["count"], 2)
+
+    def test_rolling(self):
+        store = Store()
+        store.addAll("m", [5, 1])
+        rolling = store.rolling("m", last=3, percentiles=[50])
+        for value in [3, 2, 9]:
+            store.add("m", value)
+        store.add("n", 100)
+        self.assertEqual(rolling.stats(), {"count": 3, "sum": 14,
+                                           "mean": 14 / 3, "min": 2,
+                                           "max": 9, "rate": None,
+                                           "p50": 3})
+        store.put("m", [7])
+        self.assertEqual(rolling.stats()["max"], 7)
+        store.unsubscribe("m", rolling.onUpdate)
+        store.add("m", 8)
+        self.assertEqual(rolling.stats()["count"], 1)
+
+    def test_rolling_window(self):
+        rolling = RollingAggregate("m", window=10)
+        rolling.add(1, now=100)
+        rolling.add(3, now=105)
+        rolling.add(2, now=112)
+        self.assertEqual(rolling.stats(now=112)["min"], 2)
+        self.assertEqual(rolling.stats(now=112)["max"], 3)
+        self.assertEqual(rolling.stats(now=120)["count"], 1)
+        with self.assertRaises(ValueError):
+            RollingAggregate("m")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import sys
+import unittest
+from bob.store import Store, Channel, ArrayChannel, JOURNAL_PATH
+from bob.store.Retention import Retention
+
+
+class TestArrayChannel(unittest.TestCase):
+
+    def test_values(self):
+        channel = ArrayChannel(range(10), typecode="q", chunk_size=4)
+        channel.append(True)
+        self.assertEqual(channel.tolist(), list(range(10)) + [1])
+        self.assertEqual(channel.tail(3), [8, 9, 1])
+        self.assertEqual(list(channel.since(9)), [9, 1])
+        self.assertEqual(channel.at(5), 5)
+        self.assertIsInstance(channel.tolist()[0], int)
+        self.assertEqual(channel, Channel(list(range(10)) + [1]))
+        with self.assertRaises(TypeError):
+            channel.append(1.5)
+        with self.assertRaises(TypeError):
+            channel.append("1")
+        with self.assertRaises(ValueError):
+            ArrayChannel(typecode="u")
+
+    def test_view(self):
+        channel = ArrayChannel([float(i) for i in range(10)], chunk_size=4)
+        view = channel.view(2)
+        self.assertEqual(list(view), [8.0, 9.0])
+        channel.append(10.0)  # a view does not block appends
+        self.assertEqual(list(channel.view(5)), [6.0, 7.0, 8.0, 9.0, 10.0])
+        self.assertEqual(list(channel.view(100)), channel.tolist())
+
+    def test_timestamps(self):
+        channel = ArrayChannel(timestamps=True, chunk_size=2)
+        for i in range(5):
+            channel.append(i, timestamp=100 + i)
+        self.assertEqual(channel.tailTimes(2), [103.0, 104.0])
+        (values, times) = channel.view(3, times=True)
+        self.assertEqual(list(values), [2.0, 3.0, 4.0])
+        self.assertEqual(list(times), [102.0, 103.0, 104.0])
+        with self.assertRaises(ValueError):
+            ArrayChannel().tailTimes(1)
+
+    def test_countSince(self):
+        channel = ArrayChannel(timestamps=True, chunk_size=2,
+                               retention=Retention(max_entries=6))
+        for i in range(9):
+            channel.append(i, timestamp=100 + i)
+        self.assertEqual(channel.offset, 3)
+        self.assertEqual([channel.countSince(t) for t in
+                          [0, 103, 103.5, 106, 108, 109]], [6, 6, 5, 3, 1, 0])
+        with self.assertRaises(ValueError):
+            ArrayChannel().countSince(0)
+
+    def test_retention(self):
+        store = Store()
+        store.setTyped("m", "q", timestamps=True)
+        store.setRetention("m", max_entries=3)
+        store.addAll("m.x", list(range(3000)))
+        channel = store._getChannel("m.x")
+        self.assertIsInstance(channel, ArrayChannel)
+        self.assertEqual(store.get("m.x"), [2997, 2998, 2999])
+        self.assertEqual(len(channel.chunks), len(channel.time_chunks))
+        self.assertEqual(len(channel.tailTimes(10)), 3)
+
+    def test_store(self):
+        store = Store()
+        store.add("m.x", 1.5)
+        store.setTyped("m")
+        store.add("m.x", 2)
+        store.add("m.y", 3)
+        self.assertEqual(store.get("m.x"), [1.5, 2.0])
+        self.assertEqual(store.getLasts("m.y", 5), [3.0])
+        self.assertEqual(list(store.getView("m.x", 1)), [2.0])
+        self.assertEqual(store.getTyped("m.x"), ("d", False))
+        self.assertEqual(list(store.cursor("m.x").readNew()), [1.5, 2.0])
+        with self.assertRaises(TypeError):
+            store.add("m.x", "a")
+        self.assertEqual(len(store.get(JOURNAL_PATH)), 3)
+        with self.assertRaises(TypeError):
+            store.getView(JOURNAL_PATH, 1)
+
+        store.setTyped("m", None)
+        self.assertNotIsInstance(store._getChannel("m.x"), ArrayChannel)
+        self.assertEqual(store.get("m.x"), [1.5, 2.0])
+
+    def test_store_cursor(self):
+        store = Store()
+        store.addAll("m.x", [1, 2, 3, 4])
+        cursor = store.cursor("m.x")
+        self.assertEqual(list(cursor.readNew()), [1, 2, 3, 4])
+        store.add("m.x", 5)
+        store.setTyped("m", "q")
+        store.add("m.x", 6)
+        self.assertEqual(list(cursor.readNew()), [5, 6])  # not re-read
+        self.assertEqual(cursor.missed, 0)
+
+        store.setRetention("m", max_entries=3)
+        channel = store._getChannel("m.x")
+        self.assertEqual((channel.offset, channel.nextSeq()), (3, 6))
+        store.setTyped("m", None)  # replacement keeps the seq numbers
+        channel = store._getChannel("m.x")
+        self.assertEqual((channel.offset, channel.nextSeq()), (3, 6))
+        self.assertEqual(list(channel.since(4)), [5, 6])
+
+    def test_size(self):
+        channel = ArrayChannel(range(1024), typecode="q")
+        self.assertLess(sys.getsizeof(channel.chunks[0]), 1024 * 8 + 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
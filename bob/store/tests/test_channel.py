@@ -0,0 +1,39 @@
+import unittest
+from bob.store import Channel
+
+
+class TestChannel(unittest.TestCase):
+
+    def test_append(self):
+        channel = Channel(chunk_size=2)
+        for i in range(5):
+            channel.append(i)
+        self.assertEqual(len(channel), 5)
+        self.assertEqual(len(channel.chunks), 3)
+        self.assertEqual(channel.tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(list(channel), [0, 1, 2, 3, 4])
+
+    def test_tail(self):
+        channel = Channel(range(7), chunk_size=3)
+        self.assertEqual(channel.tail(0), [])
+        self.assertEqual(channel.tail(1), [6])
+        self.assertEqual(channel.tail(4), [3, 4, 5, 6])
+        self.assertEqual(channel.tail(100), list(range(7)))
+
+    def test_since(self):
+        channel = Channel(range(7), chunk_size=3)
+        self.assertEqual(channel.nextSeq(), 7)
+        self.assertEqual(list(channel.since(0)), list(range(7)))
+        self.assertEqual(list(channel.since(2)), [2, 3, 4, 5, 6])
+        self.assertEqual(list(channel.since(2, 5)), [2, 3, 4])
+        self.assertEqual(list(channel.since(7)), [])
+
+    def test_eq(self):
+        self.assertEqual(Channel([1, 2]), [1, 2])
+        self.assertEqual(Channel([1, 2]), Channel([1, 2], chunk_size=1))
+        self.assertNotEqual(Channel([1, 2]), [2, 1])
+        self.assertEqual(repr(Channel([1, "a"])), repr([1, "a"]))
+
+    def test_invalid_chunk_size(self):
+        with self.assertRaises(ValueError):
+            Channel(chunk_size=0)
@@ -0,0 +1,59 @@
+import unittest
+from bob.store import Store, Cursor
+
+
+class TestCursor(unittest.TestCase):
+
+    def test_readNew(self):
+        store = Store()
+        store.addAll("t1", [1, 2])
+        cursor = store.cursor("t1")
+        self.assertIsInstance(cursor, Cursor)
+        self.assertEqual(list(cursor.readNew()), [1, 2])
+        self.assertEqual(list(cursor.readNew()), [])
+        store.addAll("t1", [3, 4])
+        self.assertEqual(list(cursor.readNew()), [3, 4])
+
+    def test_readNew_duplicates(self):
+        store = Store()
+        store.addAll("t1", [1, 1, 1])
+        cursor = store.cursor("t1")
+        self.assertEqual(list(cursor.readNew()), [1, 1, 1])
+        store.add("t1", 1)
+        self.assertEqual(list(cursor.readNew()), [1])
+
+    def test_readNew_notFromStart(self):
+        store = Store()
+        store.addAll("t1", [1, 2])
+        cursor = store.cursor("t1", from_start=False)
+        self.assertFalse(cursor.hasNew())
+        store.add("t1", 3)
+        self.assertTrue(cursor.hasNew())
+        self.assertEqual(list(cursor.readNew()), [3])
+
+    def test_readNew_emptyPath(self):
+        store = Store()
+        cursor = store.cursor("t1.t2")
+        self.assertEqual(list(cursor.readNew()), [])
+        store.add("t1.t2", "a")
+        self.assertEqual(list(cursor.readNew()), ["a"])
+
+    def test_readNew_put_clear(self):
+        store = Store()
+        store.addAll("t1", [1, 2])
+        cursor = store.cursor("t1")
+        list(cursor.readNew())
+        store.put("t1", [5, 6])
+        self.assertEqual(list(cursor.readNew()), [5, 6])
+        store.clear("t1")
+        self.assertEqual(list(cursor.readNew()), [])
+        store.add("t1", 7)
+        self.assertEqual(list(cursor.readNew()), [7])
+
+    def test_readNew_iterator(self):
+        store = Store()
+        store.addAll("t1", list(range(3000)))
+        values = store.cursor("t1").readNew()
+        self.assertNotIsInstance(values, list)
+        store.add("t1", "not read")
+        self.assertEqual(list(values), list(range(3000)))
@@ -0,0 +1,139 @@
+import unittest
+from bob.store import Store, Channel, JOURNAL_PATH
+from bob.store.Index import HashIndex, SortedIndex, MISSING
+from bob.store.Index import HASH_INDEX, SORTED_INDEX
+from bob.store.Index import fieldValue
+from bob.store.Retention import Retention
+
+
+class TestIndex(unittest.TestCase):
+
+    def test_fieldValue(self):
+        value = {"a": {"b": (1, {"c": 2})}}
+        self.assertEqual(fieldValue(value, "a.b.0"), 1)
+        self.assertEqual(fieldValue(value, "a.b.1.c"), 2)
+        self.assertIs(fieldValue(value, "a.x"), MISSING)
+        self.assertIs(fieldValue(value, "a.b.5"), MISSING)
+        self.assertIs(fieldValue(3, "a"), MISSING)
+
+    def test_hashIndex(self):
+        channel = Channel(indexes=[HashIndex("k")])
+        channel.extend([{"k": i % 3} for i in range(9)] + [{"k": [1]}, 4])
+        # the unhashable [1] is a candidate of every lookup
+        self.assertEqual(channel.indexes["k"].equal(1), [1, 4, 7, 9])
+        self.assertEqual(channel.indexes["k"].equal(5), [9])
+        self.assertIsNone(channel.indexes["k"].equal([1]))
+
+    def test_sortedIndex(self):
+        channel = Channel(indexes=[SortedIndex("k")])
+        channel.extend([{"k": k} for k in [5, 1, "a", 3, 1.5]])
+        index = channel.indexes["k"]
+        self.assertEqual(index.between(1, 3), [1, 3, 4])
+        self.assertEqual(index.between(None, 1), [1])
+        self.assertEqual(index.between("a", None), [2])
+        self.assertEqual(index.equal(5), [0])
+
+    def test_sortedIndex_evictFirst(self):
+        channel = Channel(indexes=[SortedIndex("t")],
+                          retention=Retention(max_entries=5))
+        channel.extend([{"t": t} for t in range(100)])
+        index = channel.indexes["t"]
+        self.assertEqual(len(index), 5)
+        self.assertLessEqual(len(index.entries), 10)  # compacted
+        self.assertEqual(index.between(None, None), [95, 96, 97, 98, 99])
+        self.assertEqual(index.between(97, 200), [97, 98, 99])
+        channel.append({"t": 0})  # out of order
+        self.assertEqual(index.between(None, 96), [96, 100])
+
+    def test_eviction(self):
+        store = Store()
+        store.setRetention("t1", max_entries=4)
+        store.createIndex("t1", "k")
+        store.createIndex("t1", "v", SORTED_INDEX)
+        store.addAll("t1", [{"k": i % 2, "v": i} for i in range(10)])
+        channel = store._getChannel("t1")
+        self.assertEqual(channel.indexes["k"].equal(0), [6, 8])
+        self.assertEqual(len(channel.indexes["v"]), 4)
+        self.assertEqual(store.query("t1", where={"k": 0}),
+                         [{"k": 0, "v": 6}, {"k": 0, "v": 8}])
+
+    def test_query(self):
+        store = Store()
+        store.createIndex("dns", "success")
+        store.createIndex("dns", "time", SORTED_INDEX)
+        store.addAll("dns", [{"success": i % 3 != 0, "time": i}
+                             for i in range(10)])
+        failed = store.query("dns", where={"success": False})
+        self.assertEqual([v["time"] for v in failed], [0, 3, 6, 9])
+        last = store.query("dns", where={"success": False}, limit=2,
+                           reverse=True)
+        self.assertEqual([v["time"] for v in last], [9, 6])
+        both = store.query("dns", where={"success": True},
+                           between={"time": (2, 5)})
+        self.assertEqual([v["time"] for v in both], [2, 4, 5])
+        self.assertEqual(store.query("missing"), [])
+        store.add("a.b", 1)
+        with self.assertRaises(TypeError):
+            store.query("a")
+
+    def test_query_notIndexable(self):
+        values = [{"k": k} for k in [1, [1], None, (1, 2), {1}, "a", (0,),
+                                     frozenset([1]), 2.5]]
+        where = [1, [1], None, (1, 2), frozenset([1]), {1}, "a"]
+        between = [(None, None), (0, 2), ((0,), (1, 5)), (None, "b"),
+                   ((1,), None)]
+        scanned = Store()
+        scanned.addAll("t1", values)
+        for kind in [HASH_INDEX, SORTED_INDEX]:
+            store = Store()
+            store.createIndex("t1", "k", kind)
+            store.addAll("t1", values)
+            for key in where:
+                self.assertEqual(store.query("t1", where={"k": key}),
+                                 scanned.query("t1", where={"k": key}))
+            for bounds in between:
+                self.assertEqual(store.query("t1", between={"k": bounds}),
+                                 scanned.query("t1", between={"k": bounds}))
+
+    def test_query_scan(self):
+        store = Store()
+        store.addAll("t1", [{"k": i} for i in range(5)] + [3])
+        self.assertEqual(store.query("t1", between={"k": (1, 2)}),
+                         [{"k": 1}, {"k": 2}])
+        self.assertEqual(store.query("t1", where={"k": 4}, reverse=True),
+                         [{"k": 4}])
+
+    def test_existing_put(self):
+        store = Store()
+        store.addAll("a.b", [{"k": 1}, {"k": 2}])
+        store.createIndex("a", "k")
+        self.assertEqual(store._getChannel("a.b").indexes["k"].equal(2), [1])
+        store.put("a.b", [{"k": 2}])
+        store.add("a.b", {"k": 2})
+        self.assertEqual(store.query("a.b", where={"k": 2}), [{"k": 2}] * 2)
+        store.dropIndex("a", "k")
+        self.assertEqual(store._getChannel("a.b").indexes, {})
+        with self.assertRaises(ValueError):
+            store.dropIndex("a", "k")
+
+    def test_journal(self):
+        store = Store()
+        store.createIndex(JOURNAL_PATH, "metadata.path")
+        store.add("t1", 1)
+        store.add("t2", 2)
+        store.add("t1", 3)
+        blocks = store.query(JOURNAL_PATH, where={"metadata.path": "t1"})
+        self.assertEqual([block["payload"] for block in blocks], [1, 3])
+
+    def test_compactJournal(self):
+        store = Store()
+        store.createIndex(JOURNAL_PATH, "metadata.path")
+        store.add("t1", 1)
+        store.put("t1", [2])
+        store.compactJournal()
+        blocks = store.query(JOURNAL_PATH, where={"metadata.path": "t1"})
+        self.assertEqual([block["payload"] for block in blocks], [[2]])
+
+
+if __name__ == '__main__':
+    unittest.main()
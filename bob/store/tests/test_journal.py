@@ -0,0 +1,268 @@
+import time
+import unittest
+from bob.blockchain import blockutil_U as B
+from bob.store import Store, Journal, JOURNAL_PATH, JOURNAL_PREV, \
+    SNAPSHOT_JOURNAL_SEQ
+
+
+def paths(blocks):
+    return [(b[B.METADATA]['method'], b[B.METADATA]['path'], b[B.DATA])
+            for b in blocks]
+
+
+class TestJournal(unittest.TestCase):
+
+    def test_compact(self):
+        store = Store()
+        store.addAll("t1", [1, 2])
+        store.put("t1", [3])
+        store.add("t1", 4)
+        store.add("t2", 5)
+        blocks = Journal.compact(store.get(JOURNAL_PATH))
+        self.assertEqual(paths(blocks), [
+            ("put", "t1", [3]),
+            ("add", "t1", 4),
+            ("add", "t2", 5)
+        ])
+
+    def test_compact_clear(self):
+        store = Store()
+        store.add("t1.t2", 1)
+        store.add("t1.t3", 2)
+        store.add("t4", 3)
+        store.clear("t1")
+        store.add("t1.t2", 4)
+        store.clear("t4")
+        blocks = Journal.compact(store.get(JOURNAL_PATH))
+        self.assertEqual(paths(blocks), [("add", "t1.t2", 4)])
+
+    def test_compactJournal(self):
+        store = Store()
+        cursor = store.cursor(JOURNAL_PATH)
+        store.addAll("t1", [1, 2, 3])
+        store.put("t1", [4])
+        list(cursor.readNew())
+        self.assertEqual(store.compactJournal(), 3)
+        self.assertEqual(len(store.get(JOURNAL_PATH)), 1)
+        store.add("t1", 5)
+        self.assertEqual(paths(cursor.readNew()), [("add", "t1", 5)])
+
+        rebuilt = Store()
+        for block in store.get(JOURNAL_PATH):
+            rebuilt.processBlock(B.serialize(block))
+        self.assertEqual(rebuilt.get("t1"), [4, 5])
+
+    def test_compactJournal_chained(self):
+        store = Store(chain_journal=True)
+        store.add("t1", 1)
+        store.add("t2", 2)
+        store.put("t1", [3])
+        store.add("t2", 4)
+        before = store.get(JOURNAL_PATH)
+        self.assertEqual(store.compactJournal(), 1)
+        store.add("t1", 5)
+        blocks = store.get(JOURNAL_PATH)
+        self.assertEqual(paths(blocks), [("add", "t2", 2), ("put", "t1", [3]),
+                                         ("add", "t2", 4), ("add", "t1", 5)])
+        self.assertIsNone(Journal.verifyChain(blocks, check_hashes=True))
+        self.assertIsNone(blocks[0][B.METADATA][JOURNAL_PREV])
+        self.assertNotEqual(blocks[0][B.HASH], before[1][B.HASH])
+        self.assertTrue(all(B.is_valid(block) for block in blocks))
+
+    def test_compactJournal_checkpoints(self):
+        store = Store(chain_journal=True, checkpoint_interval=4)
+        store.addAll("t1", list(range(10)))
+        store.put("t1", [10])
+        store.add("t1", 11)
+        self.assertEqual(len(store.journalCheckpoints()), 3)
+        store.compactJournal()
+        (anchor,) = store.journalCheckpoints()
+        self.assertEqual((anchor["start"], anchor["end"]), (10, 12))
+        self.assertEqual(anchor["root"], store.journalRoot(10, 12))
+
+        store.addAll("t1", list(range(12, 18)))
+        checkpoints = store.journalCheckpoints()
+        self.assertEqual([(c["start"], c["end"]) for c in checkpoints],
+                         [(10, 12), (12, 16)])
+        self.assertEqual(checkpoints[1]["root"], store.journalRoot(12, 16))
+        self.assertIsNone(Journal.verifyChain(store.get(JOURNAL_PATH)))
+
+    def test_rebase(self):
+        store = Store(chain_journal=True)
+        store.addAll("t1", [1, 2, 3])
+        blocks = store.get(JOURNAL_PATH)
+        self.assertEqual(Journal.rebase(blocks), blocks)
+        rebased = Journal.rebase([blocks[0], blocks[2]])
+        self.assertIs(rebased[0], blocks[0])
+        self.assertEqual(rebased[1][B.METADATA][JOURNAL_PREV],
+                         blocks[0][B.HASH])
+        self.assertEqual(blocks[2][B.METADATA][JOURNAL_PREV],
+                         blocks[1][B.HASH])  # not modified
+        self.assertIsNone(Journal.verifyChain(rebased, check_hashes=True))
+
+    def test_snapshot(self):
+        store = Store()
+        store.addAll("t1.t2", [1, 2])
+        store.put("t3", ["a"])
+        store.add("local_", "not in snapshot")
+        snapshot = store.snapshot()
+        store.add("t1.t2", 3)
+        store.clear("t3")
+        store.add("local_", "not in the tail either")
+
+        rebuilt = Store()
+        rebuilt.loadSnapshot(snapshot, store.journalSince(
+            snapshot[SNAPSHOT_JOURNAL_SEQ]))
+        self.assertEqual(rebuilt.get("t1.t2"), [1, 2, 3])
+        self.assertIsNone(rebuilt.get("t3"))
+        self.assertIsNone(rebuilt.get("local_"))
+
+    def test_loadSnapshot_version(self):
+        with self.assertRaises(ValueError):
+            Store().loadSnapshot({"version": -1})
+
+    def test_deferred(self):
+        store = Store(deferred_journal=True)
+        store.put("t1", ["a"])
+        store.add("t1", "b")
+        store.add("t2", "c")
+        self.assertEqual(len(store._journal_records), 3)
+        self.assertEqual(paths(store.get(JOURNAL_PATH)), [
+            ("put", "t1", ["a"]),
+            ("add", "t1", "b"),
+            ("add", "t2", "c")
+        ])
+        for block in store.get(JOURNAL_PATH):
+            self.assertTrue(B.is_valid(block))
+        self.assertEqual(store.flushJournal(), 0)
+
+    def test_deferred_cursor(self):
+        store = Store(deferred_journal=True)
+        cursor = store.cursor(JOURNAL_PATH)
+        store.add("t1", 1)
+        self.assertTrue(store.waitFor(cursor, timeout=1))
+        self.assertEqual(paths(cursor.readNew()), [("add", "t1", 1)])
+
+    def test_journalRange(self):
+        store = Store()
+        for (path, value) in [("a.b", 1), ("ab", 2), ("a.c", 3)]:
+            store.add(path, value)
+            time.sleep(0.001)
+        times = [block[B.METADATA]["time"] for block
+                 in store.get(JOURNAL_PATH)]
+        self.assertEqual(paths(store.journalRange()),
+                         paths(store.get(JOURNAL_PATH)))
+        self.assertEqual(paths(store.journalRange(times[1], times[2])),
+                         [("add", "ab", 2), ("add", "a.c", 3)])
+        self.assertEqual(paths(store.journalRange(t_end=times[0])),
+                         [("add", "a.b", 1)])
+        self.assertEqual(paths(store.journalRange(path_prefix="a")),
+                         [("add", "a.b", 1), ("add", "a.c", 3)])
+        self.assertEqual(store.journalRange(times[2] + 1), [])
+
+    def test_journalRange_deferred(self):
+        store = Store(deferred_journal=True)
+        store.add("t1", 1)
+        added_at = time.time()
+        time.sleep(0.01)
+        store.flushJournal()
+        self.assertEqual(len(store.journalRange(t_end=added_at)), 1)
+
+    def test_deferred_worker(self):
+        store = Store(deferred_journal=True, journal_flush_interval=0.01)
+        store.add("t1", 1)
+        for _ in range(100):
+            if not store._journal_records:
+                break
+            time.sleep(0.01)
+        self.assertEqual(len(store._journal_records), 0)
+        store.close()
+        self.assertIsNone(store._journal_worker)
+
+    def test_chain(self):
+        store = Store(chain_journal=True)
+        store.addAll("t1", [1, 2, 3])
+        store.put("t2", ["a"])
+        blocks = store.get(JOURNAL_PATH)
+        self.assertIsNone(blocks[0][B.METADATA][JOURNAL_PREV])
+        for (previous, block) in zip(blocks, blocks[1:]):
+            self.assertEqual(block[B.METADATA][JOURNAL_PREV],
+                             previous[B.HASH])
+        self.assertIsNone(Journal.verifyChain(blocks, check_hashes=True))
+        self.assertEqual(Journal.verifyChain(blocks[:1] + blocks[2:]), 1)
+        self.assertEqual(Journal.verifyChain(blocks[2:], blocks[0][B.HASH]),
+                         0)
+
+        blocks[2][B.METADATA]["path"] = "t3"
+        self.assertIsNone(Journal.verifyChain(blocks))
+        self.assertEqual(Journal.verifyChain(blocks, check_hashes=True), 2)
+
+    def test_chain_deferred(self):
+        store = Store(deferred_journal=True, chain_journal=True)
+        store.addAll("t1", [1, 2])
+        store.add("t2", 3)
+        blocks = store.get(JOURNAL_PATH)
+        self.assertEqual(len(blocks), 3)
+        self.assertIsNone(Journal.verifyChain(blocks, check_hashes=True))
+
+    def test_chain_replay(self):
+        store = Store(chain_journal=True)
+        store.addAll("t1", [1, 2])
+        copy = Store(chain_journal=True)
+        copy.replay([B.serialize(block) for block in store.get(JOURNAL_PATH)],
+                    journal=True)
+        copy.add("t1", 3)
+        self.assertIsNone(Journal.verifyChain(copy.get(JOURNAL_PATH)))
+
+    def test_merkleRoot(self):
+        store = Store()
+        store.addAll("t1", list(range(5)))
+        blocks = store.get(JOURNAL_PATH)
+        self.assertIsNone(Journal.merkleRoot([]))
+        self.assertEqual(store.journalRoot(), Journal.merkleRoot(blocks))
+        self.assertEqual(store.journalRoot(1, 3),
+                         Journal.merkleRoot(blocks[1:3]))
+        self.assertNotEqual(Journal.merkleRoot(blocks[:2]),
+                            Journal.merkleRoot(blocks[1::-1]))
+        self.assertNotEqual(Journal.merkleRoot(blocks[:2]),
+                            Journal.merkleRoot(blocks[:3]))
+
+    def test_checkpoints(self):
+        store = Store(checkpoint_interval=4)
+        store.addAll("t1", list(range(10)))
+        checkpoints = store.journalCheckpoints()
+        self.assertEqual([(c["start"], c["end"]) for c in checkpoints],
+                         [(0, 4), (4, 8)])
+        self.assertEqual(checkpoints[1]["root"], store.journalRoot(4, 8))
+        self.assertEqual(len(store.journalCheckpoints(since=4)), 1)
+
+        store.setRetention(JOURNAL_PATH, max_entries=6)
+        store.addAll("t1", list(range(10)))
+        self.assertEqual(store.journalCheckpoints()[-1]["end"], 20)
+
+    def test_findDivergence(self):
+        local = Store(chain_journal=True, checkpoint_interval=64)
+        local.addAll("t1", list(range(1000)))
+        remote = Store(chain_journal=True, checkpoint_interval=64)
+        remote.replay([B.serialize(block) for block
+                       in local.get(JOURNAL_PATH)[:700]], journal=True)
+        local.add("t2", "local")
+        remote.addAll("t1", list(range(700, 1001)))
+
+        calls = []
+
+        def remote_root(start, end):
+            calls.append((start, end))
+            return remote.journalRoot(start, end)
+
+        diverging = [c for (c, r) in zip(local.journalCheckpoints(),
+                                         remote.journalCheckpoints())
+                     if c != r][0]
+        self.assertEqual(diverging["start"], 640)
+        self.assertEqual(Journal.findDivergence(
+            local.journalRoot, remote_root, diverging["start"],
+            diverging["end"]), 700)
+        self.assertLessEqual(len(calls), 7)
+        self.assertIsNone(Journal.findDivergence(
+            local.journalRoot, remote.journalRoot, 0, 640))
+
@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import unittest
+from bob.store import Store, LogStore
+
+
+class TestLogStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_isStore(self):
+        store = LogStore(self.directory)
+        self.assertIsInstance(store, Store)
+        store.close()
+
+    def test_reopen(self):
+        store = LogStore(self.directory)
+        store.addAll("t1.t2", [1, 2, 3])
+        store.put("t3", ["a", {"b": 1}])
+        store.add("t4", b"bytes")
+        store.clear("t4")
+        store.close()
+
+        store = LogStore(self.directory)
+        self.assertIsNone(store._index)
+        self.assertEqual(store.get("t1.t2"), [1, 2, 3])
+        self.assertEqual(store.get("t3"), ["a", {"b": 1}])
+        self.assertIsNone(store.get("t4"))
+        self.assertEqual(store.getSince("t1.t2", 1), [2, 3])
+        store.add("t1.t2", 4)
+        self.assertEqual(store.getLasts("t1.t2", 2), [3, 4])
+        store.close()
+
+        store = LogStore(self.directory)
+        self.assertEqual(store.get("t1.t2"), [1, 2, 3, 4])
+        self.assertEqual(list(store.get("t1")), ["t2"])
+        store.close()
+
+    def test_putParent(self):
+        store = LogStore(self.directory)
+        store.add("t1.t2", 1)
+        store.put("t1", [2])
+        store.close()
+
+        store = LogStore(self.directory)
+        self.assertEqual(store.get("t1"), [2])
+        with self.assertRaises(TypeError):
+            store.get("t1.t2")
+        store.close()
+
+    def test_segments(self):
+        store = LogStore(self.directory, segment_size=100)
+        store.addAll("t1", list(range(50)))
+        self.assertGreater(len(os.listdir(self.directory)), 1)
+        self.assertEqual(store.get("t1"), list(range(50)))
+        store.close()
+
+        store = LogStore(self.directory, segment_size=100)
+        self.assertEqual(store.get("t1"), list(range(50)))
+        store.close()
+
+    def test_tornTail(self):
+        store = LogStore(self.directory)
+        store.addAll("t1", [1, 2])
+        store.close()
+        filename = os.path.join(self.directory, os.listdir(self.directory)[0])
+        size = os.path.getsize(filename)
+        with open(filename, "r+b") as file:
+            file.truncate(size - 3)
+
+        store = LogStore(self.directory)
+        self.assertGreater(store.truncated, 0)
+        self.assertEqual(store.get("t1"), [1])
+        store.add("t1", 3)
+        store.close()
+
+        store = LogStore(self.directory)
+        self.assertEqual(store.truncated, 0)
+        self.assertEqual(store.get("t1"), [1, 3])
+        store.close()
+
+    def test_snapshot(self):
+        store = LogStore(self.directory)
+        store.addAll("t1", [1, 2])
+        store.close()
+
+        store = LogStore(self.directory)
+        rebuilt = Store()
+        rebuilt.loadSnapshot(store.snapshot())
+        self.assertEqual(rebuilt.get("t1"), [1, 2])
+        store.close()
@@ -1,4 +1,5 @@
 import unittest
+import os
 import tempfile
 import json
 from bob.store import Store
@@ -29,6 +30,40 @@ class TestStore(unittest.TestCase):
             }
         ])
 
+    def test_getLogs_path(self):
+        store = MockStore()
+        for i in range(1000):
+            store.add("a.b", i)
+            store.add("d", str(i))
+        store.add("a.bc", b"x")
+
+        logs = store.getLogs("a.b")
+        self.assertEqual(len(logs), 1001)
+        self.assertEqual(logs[-1], {TYPE: "add", PATH: "a.bc", DATA: "b'x'"})
+        self.assertEqual([log[DATA] for log in store.getLogs("d")],
+                         [str(i) for i in range(1000)])
+        self.assertEqual(len(store.getLogs()), 2 * 2001)  # and the journal
+
+    def test_getLogs_buffered(self):
+        store = MockStore()
+        store.add("path", 1)
+        self.assertEqual(os.path.getsize(store.filename), 0)
+        self.assertEqual(len(store.getLogs("path")), 1)
+        store.add("path", "x" * 100000)  # above the flush threshold
+        self.assertGreater(os.path.getsize(store.filename), 100000)
+
+    def test_getLogs_fork(self):
+        store = MockStore()
+        store.add("path", 1)
+        pid = os.fork()
+        if pid == 0:
+            store.add("path", 2)
+            os._exit(0)
+        os.waitpid(pid, 0)
+        store.add("path", 3)
+        self.assertEqual([log[DATA] for log in store.getLogs("path")],
+                         ["1", "2", "3"])
+
     def test_mock_with_value(self):
         store = MockStore()
         store.mock_with_value("path", [1, 2, 3])
@@ -0,0 +1,62 @@
+import unittest
+from bob.blockchain import blockutil_U as B
+from bob.store import Store, PayloadPool, JOURNAL_PATH
+
+
+class TestPayloadPool(unittest.TestCase):
+
+    def test_intern(self):
+        pool = PayloadPool()
+        value = {"a": [1, 2]}
+        self.assertIs(pool.intern(value), value)
+        self.assertIs(pool.intern({"a": [1, 2]}), value)
+        self.assertIsNot(pool.intern({"a": [1, 3]}), value)
+        self.assertEqual(pool.intern("1"), "1")
+        self.assertEqual(pool.intern(1), 1)  # not pooled
+        self.assertEqual(len(pool), 3)
+        self.assertEqual(pool.stats()["hits"], 1)
+        self.assertGreater(pool.stats()["bytes_saved"], 0)
+
+    def test_shared(self):
+        store = Store(payload_pool=True)
+        store.add("t1", {"a": "x" * 100})
+        store.add("t2", {"a": "x" * 100})
+        self.assertIs(store.get("t1")[0], store.get("t2")[0])
+        blocks = store.get(JOURNAL_PATH)
+        self.assertIs(blocks[0][B.DATA], store.get("t1")[0])
+        self.assertIs(blocks[1][B.DATA], store.get("t1")[0])
+        self.assertTrue(all(B.is_valid(block) for block in blocks))
+        stats = store.payloadStats()
+        self.assertEqual(stats["payloads"], 1)
+        self.assertEqual(stats["references"], 4)
+        self.assertEqual(stats["hits"], 1)
+
+    def test_processBlock(self):
+        store = Store(payload_pool=True)
+        store.add("t1", ["value"])
+        block = store.get(JOURNAL_PATH)[0]
+        store.processBlock(B.serialize(block))
+        self.assertIs(store.get("t1")[0], store.get("t1")[1])
+        self.assertEqual(store.payloadStats()["payloads"], 1)
+
+    def test_release(self):
+        store = Store(payload_pool=True)
+        store.setRetention(JOURNAL_PATH, max_entries=1)
+        store.setRetention("t1", max_entries=1)
+        store.add("t1", "a")
+        store.add("t1", "b")
+        self.assertEqual(store.payloadStats()["payloads"], 1)
+        store.put("t2", ["c", "d"])
+        store.clear("t2")
+        store.compactJournal()
+        self.assertEqual(store.payloadStats()["payloads"], 1)
+        self.assertEqual(store.payloadStats()["references"], 1)
+
+    def test_disabled(self):
+        store = Store()
+        store.add("t1", "a")
+        self.assertIsNone(store.payloadStats())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import shutil
+import tempfile
+import unittest
+from bob.blockchain import blockutil_U as B
+from bob.store import Store, LogStore, JOURNAL_PATH, Replay
+
+
+def journal(store):
+    return [B.serialize(block) for block in store.get(JOURNAL_PATH)]
+
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.source = Store()
+        self.source.addAll("t1", [1, 2, 3])
+        self.source.add("t2.a", "x")
+        self.source.put("t1", [4])
+        self.source.add("t1", 5)
+        self.source.add("t2.b", {"k": 1})
+
+    def test_replay(self):
+        store = Store()
+        report = store.replay(journal(self.source))
+        self.assertEqual(store.get("t1"), [4, 5])
+        self.assertEqual(store.get("t2.a"), ["x"])
+        self.assertEqual(store.get("t2.b"), [{"k": 1}])
+        self.assertEqual(store.get(JOURNAL_PATH), None)
+        self.assertEqual(report["blocks"], 7)
+        self.assertEqual(report["applied"], 7)
+        self.assertEqual(report["invalid"], 0)
+        self.assertGreater(report["blocks_per_second"], 0)
+
+    def test_replay_journal(self):
+        store = Store()
+        store.replay(journal(self.source), journal=True)
+        self.assertEqual(store.get(JOURNAL_PATH),
+                         self.source.get(JOURNAL_PATH))
+
+    def test_replay_notifications(self):
+        store = Store()
+        updates = []
+        store.subscribe("t1", lambda *update: updates.append(update))
+        store.replay(journal(self.source))
+        self.assertEqual(updates, [("add", "t1", 1), ("add", "t1", 2),
+                                   ("add", "t1", 3), ("put", "t1", [4]),
+                                   ("add", "t1", 5)])
+
+    def test_replay_invalid(self):
+        raws = journal(self.source)
+        raws.insert(2, b"not a block")
+        with self.assertRaises(ValueError):
+            Store().replay(raws)
+
+        store = Store()
+        report = store.replay(raws, strict=False)
+        self.assertEqual(report["invalid"], 1)
+        self.assertEqual(report["applied"], 7)
+        self.assertEqual(store.get("t1"), [4, 5])
+
+    def test_replay_workers(self):
+        count = 2 * B.PARALLEL_MIN_BLOCKS + 10
+        source = Store()
+        for i in range(count):
+            source.add("t%d" % (i % 3), i)
+        raws = journal(source)
+        raws[5] = raws[5][:-1]
+        B.validation_cache.clear()  # validated by the workers
+        store = Store()
+        report = store.replay(raws, workers=2, strict=False)
+        self.assertEqual(report["applied"], count - 1)
+        self.assertEqual(report["invalid"], 1)
+        self.assertEqual(store.get("t0"), list(range(0, count, 3)))
+        self.assertEqual(store.get("t2"), [i for i in range(2, count, 3)
+                                           if i != 5])
+
+    def test_replay_payload_pool(self):
+        store = Store(payload_pool=True)
+        store.replay(journal(self.source), journal=True)
+        self.assertIs(store.get("t2.a")[0],
+                      store.get(JOURNAL_PATH)[3][B.DATA])
+        self.assertEqual(store.get("t1"), [4, 5])
+
+    def test_replay_logStore(self):
+        directory = tempfile.mkdtemp()
+        try:
+            store = LogStore(directory)
+            store.replay(journal(self.source))
+            store.close()
+            store = LogStore(directory)
+            self.assertEqual(store.get("t1"), [4, 5])
+            self.assertEqual(store.get("t2.b"), [{"k": 1}])
+            store.close()
+        finally:
+            shutil.rmtree(directory)
+
+    def test_collapse(self):
+        blocks = [B.deserialize(raw) for raw in journal(self.source)]
+        groups = [(method, path, data) for (method, path, data, _)
+                  in Replay.collapse(blocks, "add")]
+        self.assertEqual(groups, [
+            ("add", "t1", [1, 2, 3]),
+            ("add", "t2.a", ["x"]),
+            ("put", "t1", [4]),
+            ("add", "t1", [5]),
+            ("add", "t2.b", [{"k": 1}])
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+from bob.store import Store, Retention, JOURNAL_PATH
+
+
+class TestRetention(unittest.TestCase):
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            Retention(max_entries=0)
+        with self.assertRaises(ValueError):
+            Retention(max_age=-1)
+
+    def test_maxEntries(self):
+        store = Store()
+        retention = store.setRetention("t1", max_entries=3)
+        store.addAll("t1.t2", list(range(10)))
+        self.assertEqual(store.get("t1.t2"), [7, 8, 9])
+        self.assertEqual(store.getLasts("t1.t2", 2), [8, 9])
+        self.assertEqual(store.getLasts("t1.t2", 5), [7, 8, 9])
+        self.assertEqual(retention.evicted, 7)
+        self.assertIs(store.getRetention("t1.t2"), retention)
+        self.assertIsNone(store.getRetention("t2"))
+
+    def test_maxEntries_chunks(self):
+        store = Store()
+        store.setRetention("t1", max_entries=1500)
+        store.addAll("t1", list(range(5000)))
+        self.assertEqual(store.get("t1"), list(range(3500, 5000)))
+        self.assertEqual(list(store.cursor("t1").readNew()),
+                         list(range(3500, 5000)))
+
+    def test_maxEntries_existing(self):
+        store = Store()
+        store.addAll("t1", [1, 2, 3])
+        store.setRetention("t1", max_entries=1)
+        self.assertEqual(store.get("t1"), [3])
+        store.setRetention("t1")
+        store.addAll("t1", [4, 5])
+        self.assertEqual(store.get("t1"), [3, 4, 5])
+
+    def test_maxBytes(self):
+        store = Store()
+        retention = store.setRetention("t1", max_bytes=10)
+        store.addAll("t1", ["aaaa", "bbbb", "cccc"])
+        self.assertEqual(store.get("t1"), ["bbbb", "cccc"])
+        self.assertEqual(retention.evicted_bytes, 4)
+        store.add("t1", "d" * 20)  # the last value is never evicted
+        self.assertEqual(store.get("t1"), ["d" * 20])
+
+    def test_maxAge(self):
+        store = Store()
+        store.setRetention("t1", max_age=60)
+        store.addAll("t1", [1, 2])
+        channel = store._getChannel("t1")
+        channel.times[0] -= 120
+        self.assertEqual(store.get("t1"), [2])
+
+    def test_mostSpecificPrefix(self):
+        store = Store()
+        store.setRetention("t1", max_entries=1)
+        store.setRetention("t1.t2", max_entries=2)
+        store.addAll("t1.t2", [1, 2, 3])
+        store.addAll("t1.t3", [1, 2, 3])
+        self.assertEqual(store.get("t1.t2"), [2, 3])
+        self.assertEqual(store.get("t1.t3"), [3])
+
+    def test_put(self):
+        store = Store()
+        store.setRetention("t1", max_entries=2)
+        store.put("t1", [1, 2, 3])
+        self.assertEqual(store.get("t1"), [2, 3])
+
+    def test_cursor_missed(self):
+        store = Store()
+        store.setRetention("t1", max_entries=2)
+        cursor = store.cursor("t1")
+        store.addAll("t1", [1, 2])
+        self.assertEqual(list(cursor.readNew()), [1, 2])
+        store.addAll("t1", [3, 4, 5])
+        self.assertEqual(list(cursor.readNew()), [4, 5])
+        self.assertEqual(cursor.missed, 1)
+
+    def test_cursor_missed_unseen(self):
+        store = Store()
+        store.setRetention("t1", max_entries=3)
+        cursor = store.cursor("t1")
+        store.addAll("t1", list(range(10)))
+        self.assertEqual(list(cursor.readNew()), [7, 8, 9])
+        self.assertEqual(cursor.missed, 7)
+        store.put("t1", [1, 2, 3, 4])  # replaced channel
+        self.assertEqual(list(cursor.readNew()), [2, 3, 4])
+        self.assertEqual(cursor.missed, 8)
+        skipped = store.cursor("t2")
+        store.addAll("t2", list(range(5)))
+        store.setRetention("t2", max_entries=2)
+        self.assertEqual(skipped.skip(), 2)
+        self.assertEqual(skipped.missed, 3)
+
+    def test_journal(self):
+        store = Store()
+        store.setRetention(JOURNAL_PATH, max_entries=5)
+        store.addAll("t1", list(range(10)))
+        self.assertEqual(len(store.get(JOURNAL_PATH)), 5)
+        self.assertEqual(store.get("t1"), list(range(10)))
@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+import unittest
+from bob.store import Store, StoreServer, SharedStore
+
+
+class TestSharedStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = Store()
+        self.server = StoreServer.forStore(self.store)
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_forStore(self):
+        self.assertIs(StoreServer.forStore(self.store), self.server)
+        self.assertIsInstance(self.server.client(), SharedStore)
+
+    def test_readWrite(self):
+        shared = self.server.client()
+        shared.add("t1", 1)
+        shared.addAll("t1", [2, 3])
+        shared.put("t2", ["a"])
+        self.assertEqual(self.store.get("t1"), [1, 2, 3])
+        self.assertEqual(shared.get("t1"), [1, 2, 3])
+        self.assertEqual(list(shared.get("t1", lambda x: x > 1)), [2, 3])
+        self.assertEqual(shared.getLasts("t1", 1), [3])
+        self.assertEqual(shared.getObj("t2"), "a")
+        shared.clear("t2")
+        self.assertIsNone(shared.get("t2"))
+        with self.assertRaises(TypeError):
+            shared.add("t1.t2", 1)
+        shared.close()
+
+    def test_keywords(self):
+        shared = self.server.client()
+        shared.add("t1", 1, journal=False)
+        shared.setRetention("t1", max_entries=2)
+        shared.addAll("t1", [2, 3])
+        self.assertEqual(self.store.get("t1"), [2, 3])
+        self.assertEqual(self.store.getRetention("t1").max_entries, 2)
+        with shared.batch():
+            shared.add("t2", "a", journal=False)
+        self.assertEqual(shared.get("t2"), ["a"])
+        cursor = shared.cursor("t1", seq=self.store.cursor("t1").seq + 1)
+        self.assertEqual(list(cursor.readNew()), [3])
+
+    def test_close(self):
+        address = self.server.address
+        pid = os.fork()
+        if pid == 0:
+            self.server.close()  # no-op in the child
+            os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertTrue(os.path.exists(address))
+        self.store.close()
+        self.assertFalse(os.path.exists(address))
+        self.assertIsNot(StoreServer.forStore(self.store), self.server)
+        StoreServer.forStore(self.store).close()
+
+    def test_batch(self):
+        shared = self.server.client()
+        with shared.batch():
+            shared.add("t1", 1)
+            shared.add("t1", 2)
+            self.assertIsNone(self.store.get("t1"))
+        self.assertEqual(self.store.get("t1"), [1, 2])
+
+        with shared.batch():
+            shared.add("t2", 1)
+            self.assertEqual(shared.get("t2"), [1])
+
+    def test_cursor(self):
+        shared = self.server.client()
+        cursor = shared.cursor("t1")
+        self.assertFalse(cursor.hasNew())
+        threading.Timer(0.05, lambda: self.store.add("t1", 1)).start()
+        self.assertTrue(shared.waitFor(cursor, timeout=5))
+        self.assertEqual(list(cursor.readNew()), [1])
+        self.store.add("t1", 2)
+        self.assertEqual(cursor.skip(), 1)
+        cursor.close()
+
+    def test_waitFor_threads(self):
+        shared = self.server.client()
+        cursor = shared.cursor("t1")
+        waiter = threading.Thread(target=shared.waitFor, args=(cursor, 2))
+        waiter.start()
+        time.sleep(0.1)
+        started_at = time.time()
+        shared.add("t2", 1)
+        self.assertEqual(shared.get("t2"), [1])
+        self.assertLess(time.time() - started_at, 0.5)
+        with shared.batch():
+            shared.add("t3", 1)
+            thread = threading.Thread(target=shared.add, args=("t3", 2))
+            thread.start()
+            thread.join()
+            self.assertEqual(self.store.get("t3"), [2])  # not batched
+        self.assertEqual(self.store.get("t3"), [2, 1])
+        shared.add("t1", 1)
+        waiter.join()
+        shared.close()
+
+    def test_fork(self):
+        shared = self.server.client()
+        shared.add("t1", "parent")
+        pid = os.fork()
+        if pid == 0:
+            try:
+                shared.add("t1", "child")
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertEqual(self.store.get("t1"), ["parent", "child"])
+        shared.add("t1", "parent")
+        self.assertEqual(len(self.store.get("t1")), 3)
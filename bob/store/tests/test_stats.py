@@ -0,0 +1,55 @@
+import time
+import unittest
+from bob.store import Store, STATS_PATH, JOURNAL_PATH
+
+
+class TestStats(unittest.TestCase):
+
+    def test_disabled(self):
+        store = Store()
+        self.assertIsNone(store.stats())
+        self.assertNotIn("add", store.__dict__)
+        store.enableStats()
+        self.assertIn("add", store.__dict__)
+        store.disableStats()
+        self.assertNotIn("add", store.__dict__)
+        self.assertIsNone(store.stats())
+
+    def test_counters(self):
+        store = Store()
+        store.enableStats(depth=2)
+        store.add("a.b.c", "x" * 100)
+        store.add("a.b.c", "y" * 100)
+        store.add("a.d", 1)
+        store.get("a.b.c")
+        store.getLasts("a.d", 1)
+
+        prefixes = store.stats()["prefixes"]
+        ab = prefixes["a.b"]
+        self.assertEqual(ab["operations"]["add"]["count"], 2)
+        self.assertEqual(ab["operations"]["get"]["count"], 1)
+        self.assertEqual(sum(ab["operations"]["add"]["histogram"]), 2)
+        self.assertNotIn("put", ab["operations"])  # accounted to add
+        self.assertEqual(ab["written_bytes"], 200)
+        self.assertEqual(ab["entries"], 2)
+        self.assertGreaterEqual(ab["bytes"], 200)
+        self.assertEqual(prefixes["a.d"]["operations"]["getLasts"]["count"],
+                         1)
+        self.assertEqual(prefixes[JOURNAL_PATH]["entries"], 3)
+
+    def test_interval(self):
+        store = Store()
+        store.enableStats(interval=0.01, max_entries=2)
+        store.add("a", 1)
+        time.sleep(0.1)
+        store.close()
+        stats = store.get(STATS_PATH)
+        self.assertEqual(len(stats), 2)
+        self.assertEqual(stats[-1]["prefixes"]["a"]["entries"], 1)
+        journaled = [block["metadata"]["path"]
+                     for block in store.get(JOURNAL_PATH)]
+        self.assertEqual(journaled, ["a"])
+
+
+if __name__ == '__main__':
+    unittest.main()
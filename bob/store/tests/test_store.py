@@ -1,4 +1,7 @@
+import json
 import unittest
+import threading
+import time
 from bob.blockchain import blockutil_U as B
 from bob.store import Store, JOURNAL_PATH
 from bob.store import MAX_PATH_LENGTH, PUT_METHOD, ADD_METHOD
@@ -22,6 +25,16 @@ class TestStore(unittest.TestCase):
             store.put(key, val)
             self.assertEqual(store.get(key), val)
 
+    def test_get_parent(self):
+        store = Store()
+        store.addAll("t1.a", [1, 2])
+        store.add("t1.b.c", "x")
+        parent = store.get("t1")
+        self.assertEqual(parent, {"a": [1, 2], "b": {"c": ["x"]}})
+        self.assertEqual(json.loads(json.dumps(parent)), parent)
+        parent["a"].append(3)  # a copy
+        self.assertEqual(store.get("t1.a"), [1, 2])
+
     def test_clear(self):
         store = Store()
         store.put("t1.t2", [1])
@@ -67,6 +80,14 @@ class TestStore(unittest.TestCase):
         store.addAll("t1.t2", ["A", 3])
         self.assertEqual(store.get("t1.t2"), [1, None, "A", 3])
 
+    def test_add_notChannel(self):
+        store = Store()
+        store.add("t1.t2", 1)
+        with self.assertRaises(TypeError):
+            store.add("t1", 2)
+        with self.assertRaises(TypeError):
+            store.add("t1.t2.t3", 2)
+
     def test_get_filter(self):
         store = Store()
         store.put("t1", [1, 2, 3, 4])
@@ -98,13 +119,17 @@ class TestStore(unittest.TestCase):
         self.assertEqual(journal[0][B.DATA], ["a"])
         self.assertEqual(journal[0][B.METADATA], {
             "method": PUT_METHOD,
-            "path": "t1"
+            "path": "t1",
+            "time": journal[0][B.METADATA]["time"]
         })
         self.assertEqual(journal[1][B.DATA], "b")
         self.assertEqual(journal[1][B.METADATA], {
             "method": ADD_METHOD,
-            "path": "t1"
+            "path": "t1",
+            "time": journal[1][B.METADATA]["time"]
         })
+        self.assertLessEqual(journal[0][B.METADATA]["time"],
+                             journal[1][B.METADATA]["time"])
 
     def test_processBlock_add(self):
         store = Store()
@@ -133,3 +158,88 @@ class TestStore(unittest.TestCase):
             block_serialized = B.serialize(journal)
             storeB.processBlock(block_serialized)
         self.assertEqual(storeB.get("t1"), [1, 2, 3, 4])
+
+    def test_subscribe(self):
+        store = Store()
+        calls = []
+        def callback(method, path, data): calls.append((method, path, data))
+        store.subscribe("t1", callback)
+        store.add("t1.t2", 1)
+        store.put("t1.t3", [2])
+        store.add("t10", 3)
+        self.assertEqual(calls, [
+            (ADD_METHOD, "t1.t2", 1),
+            (PUT_METHOD, "t1.t3", [2])
+        ])
+
+        store.unsubscribe("t1", callback)
+        store.add("t1.t2", 4)
+        self.assertEqual(len(calls), 2)
+        with self.assertRaises(ValueError):
+            store.unsubscribe("t1", callback)
+
+    def test_subscribe_failingCallback(self):
+        store = Store()
+        def callback(method, path, data): raise RuntimeError()
+        store.subscribe("", callback)
+        store.add("t1", 1)
+        self.assertEqual(store.get("t1"), [1])
+
+    def test_waitFor(self):
+        store = Store()
+        cursor = store.cursor("t1")
+        self.assertFalse(store.waitFor(cursor, timeout=0.01))
+
+        threading.Timer(0.05, lambda: store.add("t1", 1)).start()
+        started_at = time.time()
+        self.assertTrue(store.waitFor(cursor, timeout=5))
+        self.assertLess(time.time() - started_at, 1)
+        self.assertEqual(list(cursor.readNew()), [1])
+
+    def test_waitFor_otherPaths(self):
+        store = Store()
+        cursor = store.cursor("t1.a")
+        checks = []
+        has_new = cursor.hasNew
+        cursor.hasNew = lambda: checks.append(1) or has_new()
+
+        def write():
+            for i in range(100):
+                store.add("t2", i)
+                store.add("t1.b", i)
+            store.clear("t1")
+
+        threading.Timer(0.05, write).start()
+        self.assertFalse(store.waitFor(cursor, timeout=0.5))
+        self.assertLessEqual(len(checks), 3)  # start, clear("t1"), timeout
+
+        threading.Timer(0.05, lambda: store.add("t1.a", 1)).start()
+        self.assertTrue(store.waitFor([store.cursor("t3"), cursor], 5))
+        self.assertEqual(store._waiters, {})
+
+    def test_threads_noLostWrites(self):
+        store = Store()
+        thread_count = 8
+        add_count = 500
+
+        def writer(thread_id):
+            for i in range(add_count):
+                store.add("shared", [thread_id, i])
+                store.add("t%d.own" % thread_id, i)
+
+        threads = [threading.Thread(target=writer, args=(i,))
+                   for i in range(thread_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        shared = store.get("shared")
+        self.assertEqual(len(shared), thread_count * add_count)
+        for thread_id in range(thread_count):
+            self.assertEqual(store.get("t%d.own" % thread_id),
+                             list(range(add_count)))
+            own_order = [i for (t, i) in shared if t == thread_id]
+            self.assertEqual(own_order, list(range(add_count)))
+        journal = store.get(JOURNAL_PATH)
+        self.assertEqual(len(journal), 2 * thread_count * add_count)